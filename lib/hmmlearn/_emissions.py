@@ -4,11 +4,14 @@ import warnings
 
 import numpy as np
 from scipy import special
-from scipy.stats import multinomial, poisson
+from scipy.stats import multinomial
 from sklearn.utils import check_random_state
 
+from . import _hmmc, _utils
 from .base import BaseHMM, _AbstractHMM
-from .stats import log_multivariate_normal_density
+from .stats import (
+    _cholesky, _log_multivariate_normal_density_cholesky,
+    log_multivariate_normal_density)
 from .utils import fill_covars, log_normalize
 
 
@@ -23,6 +26,25 @@ format.
 """
 
 
+# The hooks which, if overridden outside of hmmlearn, customize the E-step of
+# a categorical model, so that the fused categorical kernels are not used.
+_CATEGORICAL_ESTEP_HOOKS = [
+    "_compute_likelihood",
+    "_compute_log_likelihood",
+    "_compute_subnorm_likelihood",
+    "_compute_subnorm_log_likelihood",
+    "_compute_estep_likelihood",
+    "_get_estep_parameters",
+    "_fit_scaling",
+    "_fit_log",
+    "_accumulate_sufficient_statistics",
+    "_accumulate_sufficient_statistics_scaling",
+    "_accumulate_sufficient_statistics_log",
+]
+_HMMLEARN_MODULES = [
+    "hmmlearn.base", "hmmlearn._emissions", "hmmlearn.hmm", "hmmlearn.vhmm"]
+
+
 def _make_wrapper(func):
     return functools.wraps(func)(lambda *args, **kwargs: func(*args, **kwargs))
 
@@ -81,7 +103,64 @@ class BaseCategoricalHMM(_AbstractHMM):
             warnings.warn("Inputs of shape other than (n_samples, 1) are "
                           "deprecated.", DeprecationWarning)
             X = np.concatenate(X)[:, None]
-        return self.emissionprob_[:, X.squeeze(1)].T
+        # Gather rows of the transposed emission probabilities, so that the
+        # frame probabilities are C-contiguous, as expected by the kernels.
+        return self.emissionprob_.T.take(X.squeeze(1), axis=0)
+
+    def _get_estep_emission(self):
+        """
+        Return the emission probabilities (for the scaling implementation)
+        or log-probabilities (for the log implementation) of each symbol in
+        each state used in the E-step, with shape (n_components, n_features).
+        """
+        if self.implementation == "log":
+            with np.errstate(divide="ignore"):
+                return np.log(self.emissionprob_)
+        return self.emissionprob_
+
+    def _use_fused_estep(self, X):
+        """
+        Whether the E-step on *X* can use the fused categorical kernels,
+        i.e., unless *X* has a deprecated shape, or the E-step is customized
+        by overriding one of its hooks.
+        """
+        return X.shape[1] == 1 and all(
+            getattr(type(self), name).__module__ in _HMMLEARN_MODULES
+            for name in _CATEGORICAL_ESTEP_HOOKS
+            if hasattr(type(self), name))
+
+    def _do_estep_sequences(self, stats, X, lengths):
+        # The fused categorical kernels read the frame probabilities of each
+        # sample from the emission probabilities of its symbol (rather than
+        # from a gathered frame matrix), and accumulate the emission counts
+        # in the same pass as the forward-backward algorithm.
+        if not self._use_fused_estep(X):
+            return super()._do_estep_sequences(stats, X, lengths)
+        startprob, transmat, _ = self._get_estep_parameters()
+        emission = np.ascontiguousarray(self._get_estep_emission().T)
+        if self.implementation == "log":
+            kernel = _hmmc.forward_backward_categorical_log_multi
+            emission = self._as_dtype(emission)
+            kwargs = self._get_log_parameters(startprob, transmat)
+        else:
+            kernel = _hmmc.forward_backward_categorical_scaling_multi
+            kwargs = {}
+        counts = stats['obs'] if 'e' in self.params else None
+        curr_logprob = 0
+        for sub_X, offsets in self._split_X_blocks(X, lengths):
+            if self._use_checkpoints(offsets):
+                curr_logprob += self._do_estep_checkpoint(stats, sub_X)
+                continue
+            log_probs, posteriors, xi_sum = kernel(
+                startprob, transmat, emission, sub_X[:, 0], offsets,
+                't' in self.params, counts, **kwargs)
+            stats['nobs'] += len(offsets) - 1
+            if 's' in self.params:
+                stats['start'] += posteriors[offsets[:-1]].sum(axis=0)
+            if 't' in self.params:
+                stats['trans'] += xi_sum
+            curr_logprob += log_probs.sum()
+        return curr_logprob
 
     def _initialize_sufficient_statistics(self):
         stats = super()._initialize_sufficient_statistics()
@@ -101,13 +180,20 @@ class BaseCategoricalHMM(_AbstractHMM):
                 warnings.warn("Inputs of shape other than (n_samples, 1) are "
                               "deprecated.", DeprecationWarning)
                 X = np.concatenate(X)[:, None]
-            np.add.at(stats['obs'].T, X.squeeze(1), posteriors)
+            _hmmc.add_categorical_counts(
+                stats['obs'], X.squeeze(1), posteriors)
 
     def _generate_sample_from_state(self, state, random_state=None):
         cdf = np.cumsum(self.emissionprob_[state, :])
         random_state = check_random_state(random_state)
         return [(cdf > random_state.rand()).argmax()]
 
+    def _generate_state_samples(self, state, n_samples, random_state):
+        cdf = np.cumsum(self.emissionprob_[state])
+        u = random_state.rand(n_samples)
+        return np.minimum(np.searchsorted(cdf, u, side="right"),
+                          self.n_features - 1)[:, None]
+
 
 class BaseGaussianHMM(_AbstractHMM):
 
@@ -127,9 +213,47 @@ class BaseGaussianHMM(_AbstractHMM):
         }
 
     def _compute_log_likelihood(self, X):
+        if self.covariance_type in ("full", "tied"):
+            cv_chols, cv_log_dets = self._get_covars_cholesky()
+            if self.covariance_type == "tied":
+                # Pass the shared factor, to whiten the samples only once.
+                cv_chols = cv_chols[0]
+            return _log_multivariate_normal_density_cholesky(
+                X, self.means_, cv_chols, cv_log_dets)
         return log_multivariate_normal_density(
             X, self.means_, self._covars_, self.covariance_type)
 
+    def _precompute(self):
+        super()._precompute()
+        if self.covariance_type in ("full", "tied"):
+            self._get_covars_cholesky()
+
+    def _get_covars_cholesky(self):
+        """
+        Return the lower Cholesky factors of the (full or tied) covariances,
+        with shape (n_components, n_features, n_features), and their
+        log-determinants.
+
+        As for `_get_log_parameters`, the factors are cached, and only
+        recomputed when the covariances differ from those of the previous
+        call, e.g. after each M-step, or after they are assigned.
+        """
+        cache = getattr(self, "_covars_cholesky", None)
+        if (cache is None
+                or cache[0] != self.covariance_type
+                or not np.array_equal(cache[1], self._covars_)):
+            covars = np.array(self._covars_, dtype=float)
+            if self.covariance_type == "tied":
+                cv_chol, cv_log_det = _cholesky(covars[np.newaxis])
+                nc, nf = self.n_components, len(covars)
+                factors = (np.broadcast_to(cv_chol, (nc, nf, nf)),
+                           np.broadcast_to(cv_log_det, (nc,)))
+            else:
+                factors = _cholesky(covars)
+            cache = self._covars_cholesky = (
+                self.covariance_type, covars, factors)
+        return cache[2]
+
     def _initialize_sufficient_statistics(self):
         stats = super()._initialize_sufficient_statistics()
         stats['post'] = np.zeros(self.n_components)
@@ -180,6 +304,11 @@ class BaseGaussianHMM(_AbstractHMM):
             self.means_[state], self.covars_[state]
         )
 
+    def _generate_state_samples(self, state, n_samples, random_state):
+        factor = _utils.psd_factor(self.covars_[state])
+        z = random_state.standard_normal((n_samples, self.n_features))
+        return self.means_[state] + z @ factor.T
+
 
 class BaseGMMHMM(BaseHMM):
 
@@ -200,24 +329,70 @@ class BaseGMMHMM(BaseHMM):
             "w": nm - 1,
         }
 
-    def _compute_log_weighted_gaussian_densities(self, X, i_comp):
-        cur_means = self.means_[i_comp]
-        cur_covs = self.covars_[i_comp]
-        if self.covariance_type == 'spherical':
-            cur_covs = cur_covs[:, None]
-        log_cur_weights = np.log(self.weights_[i_comp])
-
-        return log_multivariate_normal_density(
-            X, cur_means, cur_covs, self.covariance_type
-        ) + log_cur_weights
+    def _compute_log_weighted_gaussian_densities(self, X, i_comp=None):
+        """
+        Return the log weighted densities of the mixture components of the
+        state *i_comp*, with shape (n_samples, n_mix), or of all states if
+        *i_comp* is None, with shape (n_samples, n_components, n_mix).
+        """
+        if i_comp is not None:
+            cur_means = self.means_[i_comp]
+            cur_covs = self.covars_[i_comp]
+            if self.covariance_type == 'spherical':
+                cur_covs = cur_covs[:, None]
+            log_cur_weights = np.log(self.weights_[i_comp])
+
+            return log_multivariate_normal_density(
+                X, cur_means, cur_covs, self.covariance_type
+            ) + log_cur_weights
+
+        nc, nm, nf = self.n_components, self.n_mix, self.n_features
+        log_denses = np.empty((len(X), nc, nm))
+        if self.covariance_type == 'tied':
+            # The mixture components of each state share their covariance,
+            # so the samples are whitened once per state.
+            cv_chols, cv_log_dets = _cholesky(self.covars_)
+            for c in range(nc):
+                _log_multivariate_normal_density_cholesky(
+                    X, self.means_[c], cv_chols[c],
+                    np.broadcast_to(cv_log_dets[c], (nm,)),
+                    out=log_denses[:, c])
+        else:
+            # All the (state, mixture) pairs at once.
+            log_multivariate_normal_density(
+                X, self.means_.reshape((nc * nm, nf)),
+                self.covars_.reshape((nc * nm,) + self.covars_.shape[2:]),
+                self.covariance_type, out=log_denses.reshape((-1, nc * nm)))
+        log_denses += np.log(self.weights_)
+        return log_denses
 
     def _compute_log_likelihood(self, X):
-        logprobs = np.empty((len(X), self.n_components))
-        for i in range(self.n_components):
-            log_denses = self._compute_log_weighted_gaussian_densities(X, i)
-            with np.errstate(under="ignore"):
-                logprobs[:, i] = special.logsumexp(log_denses, axis=1)
-        return logprobs
+        log_denses = self._compute_log_weighted_gaussian_densities(X)
+        with np.errstate(under="ignore"):
+            return special.logsumexp(log_denses, axis=2)
+
+    def _compute_estep_likelihood(self, X):
+        # The mixture posteriors are a byproduct of the frame likelihood;
+        # they are passed on to `_accumulate_sufficient_statistics`, rather
+        # than computed again from the densities.
+        log_denses = self._compute_log_weighted_gaussian_densities(X)
+        with np.errstate(under="ignore"):
+            logprobs = special.logsumexp(log_denses, axis=2)
+            log_denses -= logprobs[:, :, None]
+            post_mix = np.exp(log_denses)
+            frameprob = (np.exp(logprobs) if self.implementation == "scaling"
+                         else logprobs)
+        return frameprob, {"post_mix": post_mix}
+
+    def _compute_post_mix(self, X):
+        """
+        Return the posteriors of the mixture components of each state given
+        the samples *X*, with shape (n_samples, n_components, n_mix).
+        """
+        log_denses = self._compute_log_weighted_gaussian_densities(X)
+        log_normalize(log_denses, axis=-1)
+        with np.errstate(under="ignore"):
+            return np.exp(log_denses)
 
     def _initialize_sufficient_statistics(self):
         stats = super()._initialize_sufficient_statistics()
@@ -240,54 +415,54 @@ class BaseGMMHMM(BaseHMM):
         return stats
 
     def _accumulate_sufficient_statistics(self, stats, X, lattice,
-                                          post_comp, fwdlattice, bwdlattice):
+                                          post_comp, fwdlattice, bwdlattice,
+                                          post_mix=None):
         super()._accumulate_sufficient_statistics(
             stats, X, lattice, post_comp, fwdlattice, bwdlattice
         )
 
         n_samples, _ = X.shape
+        nc, nm, nf = self.n_components, self.n_mix, self.n_features
 
         # Statistics shapes:
         # post_comp_mix     (n_samples, n_components, n_mix)
         # samples           (n_samples, n_features)
-        # centered          (n_samples, n_components, n_mix, n_features)
-
-        post_mix = np.zeros((n_samples, self.n_components, self.n_mix))
-        for p in range(self.n_components):
-            log_denses = self._compute_log_weighted_gaussian_densities(X, p)
-            log_normalize(log_denses, axis=-1)
-            with np.errstate(under="ignore"):
-                post_mix[:, p, :] = np.exp(log_denses)
 
+        if post_mix is None:
+            post_mix = self._compute_post_mix(X)
         with np.errstate(under="ignore"):
             post_comp_mix = post_comp[:, :, None] * post_mix
 
         stats['post_mix_sum'] += post_comp_mix.sum(axis=0)
         stats['post_sum'] += post_comp.sum(axis=0)
 
+        # The statistics of all (state, mixture) pairs are computed as
+        # products by the (n_samples, n_components * n_mix) weights.
+        weights = post_comp_mix.reshape((n_samples, nc * nm))
         if 'm' in self.params:  # means stats
-            stats['m_n'] += np.einsum('ijk,il->jkl', post_comp_mix, X)
+            with np.errstate(under="ignore"):
+                stats['m_n'] += (weights.T @ X).reshape((nc, nm, nf))
 
         if 'c' in self.params:  # covariance stats
-            centered = X[:, None, None, :] - self.means_
-
-            def outer_f(x):  # Outer product over features.
-                return x[..., :, None] * x[..., None, :]
-
-            if self.covariance_type == 'full':
-                centered_dots = outer_f(centered)
-                c_n = np.einsum('ijk,ijklm->jklm', post_comp_mix,
-                                centered_dots)
-            elif self.covariance_type == 'diag':
-                centered2 = np.square(centered, out=centered)  # reuse
-                c_n = np.einsum('ijk,ijkl->jkl', post_comp_mix, centered2)
+            # The weighted scatter matrices around the means,
+            # sum_t w_t (x_t - mu) (x_t - mu)^T, are computed as weighted
+            # matrix products of the samples centered on each mean in turn
+            # (rather than expanded into moments, which cancel badly).
+            means = self.means_.reshape((nc * nm, nf))
+            full = self.covariance_type in ('full', 'tied')
+            c_n = np.empty((nc * nm, nf, nf) if full else (nc * nm, nf))
+            with np.errstate(under="ignore"):
+                for k in range(nc * nm):
+                    centered = X - means[k]
+                    if full:
+                        c_n[k] = (weights[:, k, None] * centered).T @ centered
+                    else:
+                        c_n[k] = weights[:, k] @ centered ** 2
+            c_n = c_n.reshape((nc, nm) + c_n.shape[1:])
+            if self.covariance_type == 'tied':
+                c_n = c_n.sum(axis=1)
             elif self.covariance_type == 'spherical':
-                # Faster than (x**2).sum(-1).
-                centered_norm2 = np.einsum('...i,...i', centered, centered)
-                c_n = np.einsum('ijk,ijk->jk', post_comp_mix, centered_norm2)
-            elif self.covariance_type == 'tied':
-                centered_dots = outer_f(centered)
-                c_n = np.einsum('ijk,ijklm->jlm', post_comp_mix, centered_dots)
+                c_n = c_n.sum(axis=-1)
 
             stats['c_n'] += c_n
 
@@ -306,6 +481,27 @@ class BaseGMMHMM(BaseHMM):
             self.means_[state, i_gauss], covs[state]
         )
 
+    def _generate_state_samples(self, state, n_samples, random_state):
+        X = np.empty((n_samples, self.n_features))
+        if self.covariance_type == 'tied':
+            # Shared by the mixture components of each state, as above.
+            factors = np.repeat(
+                _utils.psd_factor(self.covars_[state])[None], self.n_mix,
+                axis=0)
+        else:
+            factors = _utils.psd_factor(
+                fill_covars(self.covars_[state], self.covariance_type,
+                            self.n_mix, self.n_features))
+        u = random_state.rand(n_samples)
+        i_gausses = np.minimum(
+            np.searchsorted(np.cumsum(self.weights_[state]), u, side="right"),
+            self.n_mix - 1)
+        for i_gauss, indices in enumerate(
+                _utils.split_by_state(i_gausses, self.n_mix)):
+            z = random_state.standard_normal((len(indices), self.n_features))
+            X[indices] = self.means_[state, i_gauss] + z @ factors[i_gauss].T
+        return X
+
 
 class BaseMultinomialHMM(BaseHMM):
 
@@ -332,20 +528,15 @@ class BaseMultinomialHMM(BaseHMM):
             "e": nc * (nf - 1),
         }
 
-    def _compute_likelihood(self, X):
-        probs = np.empty((len(X), self.n_components))
-        n_trials = X.sum(axis=1)
-        for c in range(self.n_components):
-            probs[:, c] = multinomial.pmf(
-                X, n=n_trials, p=self.emissionprob_[c, :])
-        return probs
-
     def _compute_log_likelihood(self, X):
-        logprobs = np.empty((len(X), self.n_components))
-        n_trials = X.sum(axis=1)
-        for c in range(self.n_components):
-            logprobs[:, c] = multinomial.logpmf(
-                X, n=n_trials, p=self.emissionprob_[c, :])
+        # Closed form of multinomial.logpmf for all states at once; the
+        # terms depending only on X are computed once.
+        logprobs = _utils.xlogy_sum(X, self.emissionprob_)
+        with np.errstate(invalid="ignore"):
+            logprobs += (_utils.log_factorial(X.sum(axis=1))
+                         - _utils.log_factorial(X).sum(axis=1))[:, None]
+        # Negative and non-integer counts have zero probability.
+        logprobs[_utils.invalid_counts(X)] = -np.inf
         return logprobs
 
     def _initialize_sufficient_statistics(self):
@@ -368,6 +559,14 @@ class BaseMultinomialHMM(BaseHMM):
         return multinomial.rvs(n=n_trials, p=self.emissionprob_[state, :],
                                random_state=random_state)
 
+    def _generate_state_samples(self, state, n_samples, random_state):
+        try:
+            n_trials, = np.unique(self.n_trials)
+        except ValueError:
+            raise ValueError("For sampling, a single n_trials must be given")
+        return random_state.multinomial(
+            n_trials, self.emissionprob_[state], size=n_samples)
+
 
 class BasePoissonHMM(BaseHMM):
 
@@ -380,16 +579,14 @@ class BasePoissonHMM(BaseHMM):
             "l": nc * nf,
         }
 
-    def _compute_likelihood(self, X):
-        probs = np.empty((len(X), self.n_components))
-        for c in range(self.n_components):
-            probs[:, c] = poisson.pmf(X, self.lambdas_[c]).prod(axis=1)
-        return probs
-
     def _compute_log_likelihood(self, X):
-        logprobs = np.empty((len(X), self.n_components))
-        for c in range(self.n_components):
-            logprobs[:, c] = poisson.logpmf(X, self.lambdas_[c]).sum(axis=1)
+        # Closed form of poisson.logpmf, summed over features, for all
+        # states at once; the terms depending only on X are computed once.
+        logprobs = _utils.xlogy_sum(X, self.lambdas_)
+        logprobs -= self.lambdas_.sum(axis=1)
+        logprobs -= _utils.log_factorial(X).sum(axis=1)[:, None]
+        # Negative and non-integer counts have zero probability.
+        logprobs[_utils.invalid_counts(X)] = -np.inf
         return logprobs
 
     def _initialize_sufficient_statistics(self):
@@ -408,3 +605,7 @@ class BasePoissonHMM(BaseHMM):
 
     def _generate_sample_from_state(self, state, random_state):
         return random_state.poisson(self.lambdas_[state])
+
+    def _generate_state_samples(self, state, n_samples, random_state):
+        return random_state.poisson(
+            self.lambdas_[state], size=(n_samples, self.n_features))
@@ -1,8 +1,13 @@
 """Private utilities."""
 
+import os
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
+from scipy import special
+
+from . import _hmmc
 
 
 def logdet(a):
@@ -14,16 +19,212 @@ def logdet(a):
         return logdet
 
 
+def log_factorial(X):
+    """
+    Return ``log(X!)`` elementwise, for an array *X* of integers, looked up
+    in a table of log factorials if the largest of them is small compared to
+    the size of *X*.  As for `scipy.special.gammaln`, negative integers map
+    to ``inf``.
+    """
+    X = np.asarray(X)
+    if np.issubdtype(X.dtype, np.integer) and X.size:
+        n_max = max(X.max(), 0)
+        if n_max <= X.size:
+            table = special.gammaln(np.arange(1, n_max + 2))
+            return np.where(X < 0, np.inf, table[np.maximum(X, 0)])
+    return special.gammaln(X + 1)
+
+
+def invalid_counts(X):
+    """
+    Return a boolean mask of the rows of *X* which contain negative or
+    non-integer counts, and thus have zero probability.
+    """
+    invalid = (X < 0).any(axis=1)
+    if not np.issubdtype(X.dtype, np.integer):
+        invalid |= (X != np.floor(X)).any(axis=1)
+    return invalid
+
+
+def xlogy_sum(X, p):
+    """
+    Return ``sum_f xlogy(X[:, f], p[c, f])`` for all rows ``c`` of *p*, with
+    shape (n_samples, n_rows), as a single matrix product.
+
+    As for `scipy.special.xlogy`, the terms where *p* is zero are zero if *X*
+    is also zero, and ``-inf`` otherwise.
+    """
+    zero = p == 0
+    log_p = np.log(np.where(zero, 1, p))
+    result = X @ log_p.T
+    if zero.any():
+        result[(X > 0) @ zero.T] = -np.inf
+    return result
+
+
 def split_X_lengths(X, lengths):
     if lengths is None:
         return [X]
     else:
-        cs = np.cumsum(lengths)
-        n_samples = len(X)
-        if cs[-1] != n_samples:
+        return SequenceIndex(X, lengths).split(X)
+
+
+def lengths_to_offsets(X, lengths):
+    """
+    Convert *lengths* (or a `SequenceIndex`) to an array of ``n_sequences +
+    1`` offsets into *X*, such that the k-th sequence spans
+    ``X[offsets[k]:offsets[k + 1]]``.
+    """
+    n_samples = len(X)
+    if isinstance(lengths, SequenceIndex):
+        if lengths.offsets[-1] != n_samples:
             raise ValueError(
-                f"lengths array {lengths} doesn't sum to {n_samples} samples")
-        return np.split(X, cs)[:-1]
+                f"SequenceIndex of {lengths.offsets[-1]} samples used for "
+                f"{n_samples} samples")
+        return lengths.offsets
+    if lengths is None:
+        return np.array([0, n_samples], dtype=np.intp)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.intp)
+    np.cumsum(lengths, out=offsets[1:])
+    if offsets[-1] != n_samples:
+        raise ValueError(
+            f"lengths array {lengths} doesn't sum to {n_samples} samples")
+    return offsets
+
+
+class SequenceIndex:
+    """
+    The offsets of the sequences of a feature matrix, validated once (e.g.,
+    by `fit`, rather than at each EM iteration), together with the groupings
+    of the sequences into blocks and chunks, computed on first use and
+    cached.
+
+    Wherever *lengths* are accepted internally, a SequenceIndex can be passed
+    instead.  Its *offsets* are a C-contiguous intp array, which the native
+    batch kernels use without conversion.
+    """
+
+    def __init__(self, X, lengths):
+        self._set_offsets(lengths_to_offsets(X, lengths))
+
+    def _set_offsets(self, offsets):
+        self.offsets = offsets
+        self._blocks = {}
+        self._chunks = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def split(self, X):
+        """Return the list of the sequences of *X*, as views."""
+        bounds = self.offsets.tolist()
+        return [X[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def blocks(self, max_size):
+        """
+        Group consecutive sequences into blocks of at most *max_size* samples
+        (a longer sequence forms a block on its own), and return, for each
+        block, the ``(start, stop)`` range of its samples, and its offsets
+        relative to *start*.
+        """
+        if max_size not in self._blocks:
+            offsets = self.offsets
+            blocks = []
+            i = 0
+            while i < len(self):
+                j = np.searchsorted(
+                    offsets, offsets[i] + max_size, side="right") - 1
+                j = min(max(j, i + 1), len(self))
+                blocks.append((int(offsets[i]), int(offsets[j]),
+                               offsets[i:j + 1] - offsets[i]))
+                i = j
+            self._blocks[max_size] = blocks
+        return self._blocks[max_size]
+
+    def chunks(self, n_chunks):
+        """
+        Split the sequences into (at most) *n_chunks* ranges of consecutive
+        sequences, and return, for each chunk, the ``(start, stop)`` range of
+        its samples, and its own SequenceIndex.
+        """
+        if n_chunks not in self._chunks:
+            chunks = []
+            for seqs in np.array_split(np.arange(len(self)), n_chunks):
+                if not len(seqs):
+                    continue
+                offsets = self.offsets[seqs[0]:seqs[-1] + 2]
+                index = SequenceIndex.__new__(SequenceIndex)
+                index._set_offsets(offsets - offsets[0])
+                chunks.append((int(offsets[0]), int(offsets[-1]), index))
+            self._chunks[n_chunks] = chunks
+        return self._chunks[n_chunks]
+
+
+def as_sequence_index(X, lengths):
+    """
+    Return the `SequenceIndex` of the sequences of *X* of lengths *lengths*,
+    or *lengths* itself if it is already a SequenceIndex (for *X*).
+    """
+    if isinstance(lengths, SequenceIndex):
+        lengths_to_offsets(X, lengths)  # Check that it matches X.
+        return lengths
+    return SequenceIndex(X, lengths)
+
+
+def split_by_state(state_sequence, n_components):
+    """
+    Return, for each of the *n_components* states, the (increasing) indices
+    of the samples of *state_sequence* in that state.
+    """
+    order = np.argsort(state_sequence, kind="stable")
+    bounds = np.searchsorted(
+        state_sequence[order], np.arange(1, n_components))
+    return np.split(order, bounds)
+
+
+def psd_factor(a):
+    """
+    Return a factor ``L`` of each positive semidefinite matrix of *a*, such
+    that ``a = L @ L.T``: its Cholesky factor, or, for singular matrices, the
+    scaled eigenvectors.
+    """
+    try:
+        return np.linalg.cholesky(a)
+    except np.linalg.LinAlgError:
+        w, v = np.linalg.eigh(a)
+        return v * np.sqrt(np.clip(w, 0, None))[..., None, :]
+
+
+def effective_n_jobs(n_jobs):
+    """
+    Convert *n_jobs* to a number of workers, following joblib's convention
+    that ``None`` means 1 and negative values count down from the number of
+    processors (``-1`` means all of them).
+    """
+    if n_jobs is None:
+        return 1
+    elif n_jobs == 0:
+        raise ValueError("n_jobs == 0 has no meaning")
+    elif n_jobs < 0:
+        return max((os.cpu_count() or 1) + 1 + n_jobs, 1)
+    else:
+        return n_jobs
+
+
+def thread_pool(n_jobs):
+    """
+    Return a thread pool of *n_jobs* workers, which share the OpenMP threads
+    available to the calling thread (each worker getting at least one), so
+    that the multithreaded kernels run by the workers do not oversubscribe
+    the processors.
+    """
+    n_threads = max(_hmmc.get_num_threads() // n_jobs, 1)
+    return ThreadPoolExecutor(
+        n_jobs, initializer=_hmmc.set_num_threads, initargs=(n_threads,))
 
 
 # Copied from scikit-learn 0.19.
@@ -1,21 +1,29 @@
+import inspect
 import logging
 import string
 import sys
+import warnings
 from collections import deque
 
 import numpy as np
-from scipy import linalg, special
+from scipy import linalg, sparse, special
 from sklearn.base import BaseEstimator
+from sklearn.exceptions import NotFittedError
 from sklearn.utils.validation import (
     check_array, check_is_fitted, check_random_state)
 
 from . import _hmmc, _kl_divergence as _kl, _utils
+from .compiled import CompiledHMM
 from .utils import normalize, log_normalize
 
 
 _log = logging.getLogger(__name__)
 #: Supported decoder algorithms.
 DECODER_ALGORITHMS = frozenset(("viterbi", "map"))
+# Maximum number of lattice entries (samples times components) processed in a
+# single call to the batched forward-backward kernels, to bound the memory
+# used for the lattices when there are many sequences.
+_BLOCK_SIZE = 2 ** 20
 
 
 class ConvergenceMonitor:
@@ -133,7 +141,8 @@ class _AbstractHMM(BaseEstimator):
     """
 
     def __init__(self, n_components, algorithm, random_state, n_iter,
-                 tol, verbose, params, init_params, implementation):
+                 tol, verbose, params, init_params, implementation,
+                 n_jobs=None, memory="full", dtype=np.float64):
         """
         Parameters
         ----------
@@ -162,6 +171,24 @@ class _AbstractHMM(BaseEstimator):
             logarithms ("log"), or using scaling ("scaling").  The default is
             to use logarithms for backwards compatability.  However, the
             scaling implementation is generally faster.
+        n_jobs : int, optional
+            Number of threads used to process multiple sequences in
+            parallel during the E-step and in `decode`.  ``None`` means 1
+            and ``-1`` means using all processors.
+        memory : {"full", "checkpoint"}, optional
+            Memory usage of the forward-backward algorithm.  With "full" (the
+            default), the whole forward lattice of each sequence is kept in
+            memory.  With "checkpoint", sequences too long to be processed in a
+            single block only keep their forward probabilities at about
+            ``sqrt(n_samples)`` checkpoints, and the forward lattice is
+            recomputed segment by segment during the backward pass, trading
+            extra computation for memory that grows as ``sqrt(n_samples)``.
+        dtype : {numpy.float64, numpy.float32}, optional
+            Floating point type of the frame log probabilities, of the
+            forward and backward lattices, and of the posteriors.  float32
+            halves their memory footprint, at the cost of precision, and is
+            only supported by the "log" implementation (whose kernels still
+            carry out all sums in double precision).
         """
 
         self.n_components = n_components
@@ -172,6 +199,9 @@ class _AbstractHMM(BaseEstimator):
         self.tol = tol
         self.verbose = verbose
         self.implementation = implementation
+        self.n_jobs = n_jobs
+        self.memory = memory
+        self.dtype = dtype
         self.random_state = random_state
 
     def score_samples(self, X, lengths=None):
@@ -180,11 +210,14 @@ class _AbstractHMM(BaseEstimator):
 
         Parameters
         ----------
-        X : array-like, shape (n_samples, n_features)
-            Feature matrix of individual samples.
+        X : array-like, shape (n_samples, n_features), or callable
+            Feature matrix of individual samples, or a callable returning an
+            iterable of ``(X, lengths)`` batches of sequences, for data that
+            does not fit in memory.
         lengths : array-like of integers, shape (n_sequences, ), optional
             Lengths of the individual sequences in ``X``. The sum of
-            these should be ``n_samples``.
+            these should be ``n_samples``.  Must be None if ``X`` is a
+            callable.
 
         Returns
         -------
@@ -206,11 +239,14 @@ class _AbstractHMM(BaseEstimator):
 
         Parameters
         ----------
-        X : array-like, shape (n_samples, n_features)
-            Feature matrix of individual samples.
+        X : array-like, shape (n_samples, n_features), or callable
+            Feature matrix of individual samples, or a callable returning an
+            iterable of ``(X, lengths)`` batches of sequences, for data that
+            does not fit in memory.
         lengths : array-like of integers, shape (n_sequences, ), optional
             Lengths of the individual sequences in ``X``. The sum of
-            these should be ``n_samples``.
+            these should be ``n_samples``.  Must be None if ``X`` is a
+            callable.
 
         Returns
         -------
@@ -236,13 +272,40 @@ class _AbstractHMM(BaseEstimator):
         check_is_fitted(self, "startprob_")
         self._check()
 
-        X = check_array(X)
         impl = {
             "scaling": self._score_scaling,
             "log": self._score_log,
         }[self.implementation]
-        return impl(
-            X=X, lengths=lengths, compute_posteriors=compute_posteriors)
+        log_prob = 0
+        sub_posteriors = [
+            np.empty((0, self.n_components), dtype=self._get_dtype())]
+        for sub_X, sub_lengths in self._iter_batches(X, lengths):
+            sub_log_prob, posteriors = impl(
+                X=sub_X, lengths=sub_lengths,
+                compute_posteriors=compute_posteriors)
+            log_prob += sub_log_prob
+            sub_posteriors.append(posteriors)
+        return log_prob, np.concatenate(sub_posteriors)
+
+    def _iter_batches(self, X, lengths):
+        """
+        Yield the validated ``(X, lengths)`` batches of *X*, which is either a
+        feature matrix (forming a single batch) or a callable returning an
+        iterable of batches.
+        """
+        if not callable(X):
+            batches = [(X, lengths)]
+        elif lengths is not None:
+            raise ValueError("lengths must be None when X is a callable")
+        else:
+            batches = X()
+        for sub_X, sub_lengths in batches:
+            # check_array does not copy memory-mapped arrays of the right
+            # dtype and layout.
+            sub_X = check_array(sub_X)
+            if sub_lengths is None:
+                sub_lengths = np.asarray([sub_X.shape[0]])
+            yield sub_X, sub_lengths
 
     def _score_log(self, X, lengths=None, *, compute_posteriors):
         """
@@ -251,50 +314,212 @@ class _AbstractHMM(BaseEstimator):
         for the latter).
         """
         log_prob = 0
-        sub_posteriors = [np.empty((0, self.n_components))]
-        for sub_X in _utils.split_X_lengths(X, lengths):
-            log_frameprob = self._compute_log_likelihood(sub_X)
-            log_probij, fwdlattice = _hmmc.forward_log(
-                self.startprob_, self.transmat_, log_frameprob)
-            log_prob += log_probij
+        dtype = self._get_dtype()
+        sub_posteriors = [np.empty((0, self.n_components), dtype=dtype)]
+        for sub_X, offsets in self._split_X_blocks(X, lengths):
+            if self._use_checkpoints(offsets):
+                sub_log_prob, posteriors, _ = (
+                    self._forward_backward_checkpoint(
+                        sub_X, self.startprob_, self.transmat_,
+                        lambda X: (self._compute_log_likelihood(X), {}),
+                        compute_posteriors=compute_posteriors,
+                        compute_xi=False))
+                log_prob += sub_log_prob
+                if compute_posteriors:
+                    sub_posteriors.append(posteriors)
+                continue
+            log_frameprob = self._as_dtype(
+                self._compute_log_likelihood(sub_X))
+            log_params = self._get_log_parameters(
+                self.startprob_, self.transmat_)
             if compute_posteriors:
-                bwdlattice = _hmmc.backward_log(
-                    self.startprob_, self.transmat_, log_frameprob)
-                sub_posteriors.append(
-                    self._compute_posteriors_log(fwdlattice, bwdlattice))
+                log_probs, posteriors, _ = _hmmc.forward_backward_log_multi(
+                    self.startprob_, self.transmat_, log_frameprob, offsets,
+                    False, **log_params)
+                sub_posteriors.append(posteriors)
+            else:
+                log_probs, _ = _hmmc.forward_log_multi(
+                    self.startprob_, self.transmat_, log_frameprob, offsets,
+                    **log_params)
+            log_prob += log_probs.sum()
         return log_prob, np.concatenate(sub_posteriors)
 
     def _score_scaling(self, X, lengths=None, *, compute_posteriors):
         log_prob = 0
         sub_posteriors = [np.empty((0, self.n_components))]
-        for sub_X in _utils.split_X_lengths(X, lengths):
+        for sub_X, offsets in self._split_X_blocks(X, lengths):
+            if self._use_checkpoints(offsets):
+                sub_log_prob, posteriors, _ = (
+                    self._forward_backward_checkpoint(
+                        sub_X, self.startprob_, self.transmat_,
+                        lambda X: (self._compute_likelihood(X), {}),
+                        compute_posteriors=compute_posteriors,
+                        compute_xi=False))
+                log_prob += sub_log_prob
+                if compute_posteriors:
+                    sub_posteriors.append(posteriors)
+                continue
             frameprob = self._compute_likelihood(sub_X)
-            log_probij, fwdlattice, scaling_factors = _hmmc.forward_scaling(
-                self.startprob_, self.transmat_, frameprob)
-            log_prob += log_probij
             if compute_posteriors:
-                bwdlattice = _hmmc.backward_scaling(
-                    self.startprob_, self.transmat_,
-                    frameprob, scaling_factors)
-                sub_posteriors.append(
-                    self._compute_posteriors_scaling(fwdlattice, bwdlattice))
+                log_probs, posteriors, _ = (
+                    _hmmc.forward_backward_scaling_multi(
+                        self.startprob_, self.transmat_, frameprob, offsets,
+                        False))
+                sub_posteriors.append(posteriors)
+            else:
+                log_probs, _, _ = _hmmc.forward_scaling_multi(
+                    self.startprob_, self.transmat_, frameprob, offsets)
+            log_prob += log_probs.sum()
 
         return log_prob, np.concatenate(sub_posteriors)
 
-    def _decode_viterbi(self, X):
-        log_frameprob = self._compute_log_likelihood(X)
-        return _hmmc.viterbi(self.startprob_, self.transmat_, log_frameprob)
+    def _split_X_blocks(self, X, lengths):
+        """
+        Group the sequences of *X* into blocks of consecutive sequences,
+        each of which can be processed by a single call to the batched
+        forward-backward kernels, and yield each block and its offsets.
+
+        *lengths* may be a `_utils.SequenceIndex`, whose blocks are cached.
+        """
+        index = _utils.as_sequence_index(X, lengths)
+        max_size = max(_BLOCK_SIZE // self.n_components, 1)
+        for start, stop, offsets in index.blocks(max_size):
+            yield X[start:stop], offsets
 
-    def _decode_map(self, X):
-        _, posteriors = self.score_samples(X)
-        log_prob = np.max(posteriors, axis=1).sum()
+    def _use_checkpoints(self, offsets):
+        """
+        Whether the block of sequences delimited by *offsets* (as yielded by
+        `_split_X_blocks`) should be processed with checkpointing.
+        """
+        if self.memory not in ("full", "checkpoint"):
+            raise ValueError(
+                f"memory must be 'full' or 'checkpoint', got {self.memory!r}")
+        # Blocks of more than one sequence always fit within _BLOCK_SIZE.
+        return (self.memory == "checkpoint" and len(offsets) == 2
+                and offsets[-1] * self.n_components > _BLOCK_SIZE)
+
+    def _forward_backward_checkpoint(
+            self, X, startprob, transmat, compute_frameprob, *,
+            compute_posteriors, compute_xi, accumulate=None):
+        """
+        Run the forward-backward algorithm on the single sequence *X*,
+        splitting it into about ``sqrt(len(X))`` segments.
+
+        The forward pass only stores the forward probabilities at the end of
+        each segment; the backward pass then goes through the segments in
+        reverse order, recomputing the frame probabilities (using
+        *compute_frameprob*, which must match the implementation) and the
+        forward lattice of each segment from the stored checkpoints.  The
+        results are identical to those of the non-checkpointed kernels.
+        The frame probabilities are cast to the model's dtype.
+
+        *compute_frameprob* returns, as `_compute_estep_likelihood`, the
+        frame probabilities and a dict of per-sample arrays.  If
+        *accumulate* is given, it is called for each segment (last one
+        first) with the segment's bounds, frame probabilities, posteriors,
+        and that dict.
+
+        Return the log probability of *X*, its posteriors if
+        *compute_posteriors* is True (otherwise None), and the sum of the
+        transition posteriors if *compute_xi* is True (otherwise None).
+        """
+        n_samples = len(X)
+        size = int(np.ceil(np.sqrt(n_samples)))
+        starts = range(0, n_samples, size)
+        scaling = self.implementation == "scaling"
+        dtype = self._get_dtype()
+        log_params = (
+            {} if scaling else self._get_log_parameters(startprob, transmat))
+
+        def forward(frameprob, fwd_prev, log_prob):
+            if scaling:
+                return _hmmc.forward_scaling_segment(
+                    startprob, transmat, frameprob, fwd_prev, log_prob)
+            else:
+                return _hmmc.forward_log_segment(
+                    startprob, transmat, frameprob, fwd_prev, **log_params)
+
+        checkpoints = [None]
+        log_prob = 0
+        for start in starts:
+            frameprob, _ = compute_frameprob(X[start:start + size])
+            frameprob = self._as_dtype(frameprob)
+            log_prob, fwdlattice, *_ = forward(
+                frameprob, checkpoints[-1], log_prob)
+            # Copy the last row, so as not to keep the whole segment's
+            # lattice alive.
+            checkpoints.append(fwdlattice[-1].copy())
+        if not compute_posteriors and accumulate is None:
+            return log_prob, None, None
+
+        posteriors = (np.empty((n_samples, self.n_components), dtype=dtype)
+                      if compute_posteriors else None)
+        xi_sum = (np.zeros((self.n_components, self.n_components))
+                  if compute_xi else None)
+        next_frameprob = bwd_next = None
+        for k in reversed(range(len(starts))):
+            start = starts[k]
+            stop = min(start + size, n_samples)
+            frameprob, estep_kwargs = compute_frameprob(X[start:stop])
+            frameprob = self._as_dtype(frameprob)
+            if scaling:
+                _, fwdlattice, scaling_factors = forward(
+                    frameprob, checkpoints[k], 0)
+                sub_posteriors, bwd_next, xi_sum = (
+                    _hmmc.backward_scaling_segment(
+                        startprob, transmat, frameprob, fwdlattice,
+                        scaling_factors, next_frameprob, bwd_next, xi_sum))
+            else:
+                _, fwdlattice = forward(frameprob, checkpoints[k], 0)
+                sub_posteriors, bwd_next, xi_sum = (
+                    _hmmc.backward_log_segment(
+                        startprob, transmat, frameprob, fwdlattice, log_prob,
+                        next_frameprob, bwd_next, xi_sum, **log_params))
+            next_frameprob = frameprob[0]
+            if compute_posteriors:
+                posteriors[start:stop] = sub_posteriors
+            if accumulate is not None:
+                accumulate(start, stop, frameprob, sub_posteriors,
+                           estep_kwargs)
+        return log_prob, posteriors, xi_sum
+
+    def _decode_viterbi(self, X, offsets):
+        log_frameprob = self._as_dtype(self._compute_log_likelihood(X))
+        return _hmmc.viterbi_multi(
+            self.startprob_, self.transmat_, log_frameprob, offsets,
+            **self._get_log_parameters(self.startprob_, self.transmat_))
+
+    def _decode_map(self, X, offsets):
+        impl = {
+            "scaling": self._score_scaling,
+            "log": self._score_log,
+        }[self.implementation]
+        _, posteriors = impl(X, np.diff(offsets), compute_posteriors=True)
+        log_probs = np.add.reduceat(np.max(posteriors, axis=1), offsets[:-1])
         state_sequence = np.argmax(posteriors, axis=1)
-        return log_prob, state_sequence
+        return log_probs, state_sequence
+
+    def _decode_sequences(self, X, lengths, decoder):
+        """
+        Decode the sequences of *X* with *decoder* (`_decode_viterbi` or
+        `_decode_map`), one block of sequences at a time, and return the
+        per-sequence log probabilities and the concatenated state sequences.
+        """
+        log_probs = [np.empty(0)]
+        state_sequences = [np.empty(0, dtype=np.intp)]
+        for sub_X, offsets in self._split_X_blocks(X, lengths):
+            sub_log_probs, sub_state_sequence = decoder(sub_X, offsets)
+            log_probs.append(sub_log_probs)
+            state_sequences.append(sub_state_sequence)
+        return np.concatenate(log_probs), np.concatenate(state_sequences)
 
-    def decode(self, X, lengths=None, algorithm=None):
+    def decode(self, X, lengths=None, algorithm=None, *,
+               per_sequence=False):
         """
         Find most likely state sequence corresponding to ``X``.
 
+        Sequences are decoded in parallel if ``n_jobs > 1``.
+
         Parameters
         ----------
         X : array-like, shape (n_samples, n_features)
@@ -305,11 +530,15 @@ class _AbstractHMM(BaseEstimator):
         algorithm : string
             Decoder algorithm. Must be one of "viterbi" or "map".
             If not given, :attr:`decoder` is used.
+        per_sequence : bool, optional
+            Whether to return the log probability of the state sequence of
+            each sequence, rather than their sum.
 
         Returns
         -------
-        log_prob : float
-            Log probability of the produced state sequence.
+        log_prob : float, or array of shape (n_sequences, )
+            Log probability of the produced state sequence (of each sequence
+            if ``per_sequence`` is True).
         state_sequence : array, shape (n_samples, )
             Labels for each sample from ``X`` obtained via a given
             decoder ``algorithm``.
@@ -322,7 +551,17 @@ class _AbstractHMM(BaseEstimator):
         """
         check_is_fitted(self, "startprob_")
         self._check()
+        log_probs, state_sequence = self._decode(
+            check_array(X), lengths, algorithm)
+        return (log_probs if per_sequence else log_probs.sum()), state_sequence
+
+    def _decode(self, X, lengths, algorithm):
+        """
+        Helper for `decode`, on a validated model and feature matrix.
 
+        Return the per-sequence log probabilities and the concatenated state
+        sequences.
+        """
         algorithm = algorithm or self.algorithm
         if algorithm not in DECODER_ALGORITHMS:
             raise ValueError(f"Unknown decoder {algorithm!r}")
@@ -332,16 +571,25 @@ class _AbstractHMM(BaseEstimator):
             "map": self._decode_map
         }[algorithm]
 
-        X = check_array(X)
-        log_prob = 0
-        sub_state_sequences = []
-        for sub_X in _utils.split_X_lengths(X, lengths):
-            # XXX decoder works on a single sample at a time!
-            sub_log_prob, sub_state_sequence = decoder(sub_X)
-            log_prob += sub_log_prob
-            sub_state_sequences.append(sub_state_sequence)
-
-        return log_prob, np.concatenate(sub_state_sequences)
+        index = _utils.as_sequence_index(X, lengths)
+        n_jobs = min(_utils.effective_n_jobs(self.n_jobs), len(index))
+        if n_jobs == 1:
+            log_probs, state_sequence = self._decode_sequences(
+                X, index, decoder)
+        else:
+            # As in the E-step, each worker decodes a contiguous range of
+            # sequences, with kernels that release the GIL.
+            with _utils.thread_pool(n_jobs) as executor:
+                futures = [
+                    executor.submit(
+                        self._decode_sequences, X[start:stop], sub_index,
+                        decoder)
+                    for start, stop, sub_index in index.chunks(n_jobs)]
+            results = [future.result() for future in futures]
+            log_probs = np.concatenate([result[0] for result in results])
+            state_sequence = np.concatenate(
+                [result[1] for result in results])
+        return log_probs, state_sequence
 
     def predict(self, X, lengths=None):
         """
@@ -383,25 +631,120 @@ class _AbstractHMM(BaseEstimator):
         _, posteriors = self.score_samples(X, lengths)
         return posteriors
 
-    def sample(self, n_samples=1, random_state=None, currstate=None):
+    def compile(self):
+        """
+        Validate the model once, and return a `.CompiledHMM` for fast
+        repeated inference with its current parameters.
+
+        The compiled model holds a copy of this model, with the arrays derived
+        from its parameters (e.g. their logs, or Cholesky factors of
+        covariances) precomputed; its ``score``, ``decode`` and
+        ``predict_proba`` methods skip the validation of the parameters (and
+        most of the validation of the samples) performed by this model's
+        methods, which dominates their run time on small inputs.  Later
+        changes to this model (e.g. refitting it) do not affect the compiled
+        model, which, unlike this model, can be used concurrently by
+        multiple threads.
+
+        Returns
+        -------
+        compiled : CompiledHMM
+            The compiled model.
+        """
+        return CompiledHMM(self)
+
+    def filter_init(self):
+        """
+        Start filtering a new stream of samples.
+
+        The samples are then fed in chunks to `filter_update`, which computes
+        the filtered state probabilities of each sample, i.e. conditioned on
+        the samples seen so far, carrying the normalized forward probabilities
+        of the last sample over between calls.
+
+        See Also
+        --------
+        filter_update : Update the filter with the next samples.
+        """
+        check_is_fitted(self, "startprob_")
+        self._check()
+        self._filter_fwd = None
+
+    def filter_update(self, X):
+        """
+        Update the filter started by `filter_init` with the next samples.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The next samples of the stream.
+
+        Returns
+        -------
+        log_prob : float
+            Log likelihood of ``X``, conditioned on the previous samples of the
+            stream.
+        filtered : array, shape (n_samples, n_components)
+            State-membership probabilities for each sample from ``X``,
+            conditioned on the samples up to it.
+
+        See Also
+        --------
+        filter_init : Start filtering a new stream of samples.
+        """
+        if not hasattr(self, "_filter_fwd"):
+            raise ValueError("filter_init must be called before filter_update")
+        X = check_array(X, ensure_min_samples=0)
+        dtype = self._get_dtype()
+        if not len(X):
+            return 0., np.empty((0, self.n_components), dtype=dtype)
+        if self.implementation == "scaling":
+            log_prob, fwdlattice, _ = _hmmc.forward_scaling_segment(
+                self.startprob_, self.transmat_, self._compute_likelihood(X),
+                self._filter_fwd, 0)
+            self._filter_fwd = fwdlattice[-1]
+            return log_prob, fwdlattice
+        elif self.implementation == "log":
+            # The carried message is the log of the normalized forward
+            # probabilities, so that the returned log_prob is incremental.
+            log_prob, fwdlattice = _hmmc.forward_log_segment(
+                self.startprob_, self.transmat_,
+                self._as_dtype(self._compute_log_likelihood(X)),
+                self._filter_fwd,
+                **self._get_log_parameters(self.startprob_, self.transmat_))
+            with np.errstate(under="ignore"):
+                fwdlattice -= special.logsumexp(
+                    fwdlattice, axis=1, keepdims=True)
+                self._filter_fwd = fwdlattice[-1]
+                return log_prob, np.exp(fwdlattice)
+        else:
+            raise ValueError(
+                f"Unknown implementation {self.implementation!r}")
+
+    def sample(self, n_samples=1, random_state=None, currstate=None, *,
+               n_sequences=1):
         """
         Generate random samples from the model.
 
         Parameters
         ----------
         n_samples : int
-            Number of samples to generate.
+            Number of samples to generate (per sequence).
         random_state : RandomState or an int seed
             A random number generator instance. If ``None``, the object's
             ``random_state`` is used.
         currstate : int
             Current state, as the initial state of the samples.
+        n_sequences : int, optional
+            Number of independent sequences to generate.
 
         Returns
         -------
-        X : array, shape (n_samples, n_features)
-            Feature matrix.
-        state_sequence : array, shape (n_samples, )
+        X : array, shape (n_sequences * n_samples, n_features)
+            Feature matrix, with the samples of each sequence following
+            each other, i.e. sequences of lengths ``[n_samples] *
+            n_sequences``.
+        state_sequence : array, shape (n_sequences * n_samples, )
             State sequence produced by the model.
 
         Examples
@@ -419,24 +762,19 @@ class _AbstractHMM(BaseEstimator):
             random_state = self.random_state
         random_state = check_random_state(random_state)
 
-        transmat_cdf = np.cumsum(self.transmat_, axis=1)
-
         if currstate is None:
             startprob_cdf = np.cumsum(self.startprob_)
-            currstate = (startprob_cdf > random_state.rand()).argmax()
-
-        state_sequence = [currstate]
-        X = [self._generate_sample_from_state(
-            currstate, random_state=random_state)]
-
-        for t in range(n_samples - 1):
-            currstate = (
-                (transmat_cdf[currstate] > random_state.rand()).argmax())
-            state_sequence.append(currstate)
-            X.append(self._generate_sample_from_state(
-                currstate, random_state=random_state))
-
-        return np.atleast_2d(X), np.array(state_sequence, dtype=int)
+        else:
+            startprob_cdf = (
+                np.arange(self.n_components) >= currstate).astype(float)
+        transmat_cdf = np.cumsum(self.transmat_, axis=1)
+        # The state sequences are drawn first, then the emissions, so that
+        # the samples of each state can be generated at once.
+        state_sequence = _hmmc.sample_states(
+            startprob_cdf, transmat_cdf,
+            random_state.rand(n_sequences, n_samples)).ravel().astype(int)
+        X = self._generate_samples(state_sequence, random_state)
+        return X, state_sequence
 
     def fit(self, X, lengths=None):
         """
@@ -447,30 +785,44 @@ class _AbstractHMM(BaseEstimator):
         the parameters, pass proper ``init_params`` keyword argument
         to estimator's constructor.
 
+        Data that does not fit in memory can be passed as a memory-mapped
+        array, which is not copied, or as a callable returning an iterable of
+        ``(X, lengths)`` batches of sequences, which is called, and its
+        batches streamed through the E-step, once per EM iteration; the
+        initialization step then only uses the first batch.
+
         Parameters
         ----------
-        X : array-like, shape (n_samples, n_features)
-            Feature matrix of individual samples.
+        X : array-like, shape (n_samples, n_features), or callable
+            Feature matrix of individual samples, or a callable returning an
+            iterable of ``(X, lengths)`` batches.
         lengths : array-like of integers, shape (n_sequences, )
             Lengths of the individual sequences in ``X``. The sum of
-            these should be ``n_samples``.
+            these should be ``n_samples``.  Must be None if ``X`` is a
+            callable.
 
         Returns
         -------
         self : object
             Returns self.
         """
-        X = check_array(X)
-
-        if lengths is None:
-            lengths = np.asarray([X.shape[0]])
-
-        self._init(X, lengths)
+        # Later calls to `partial_fit` start over from the fitted parameters.
+        for name in ["n_batch_iter_", "_running_stats"]:
+            self.__dict__.pop(name, None)
+        stats = None
+        if not callable(X):
+            X, lengths = next(self._iter_batches(X, lengths))
+            self._init(X, lengths)
+            # Validate and group the sequences once for all iterations.
+            lengths = _utils.SequenceIndex(X, lengths)
+        else:
+            # Initialize from the first batch.
+            self._init(*next(self._iter_batches(X, lengths)))
         self._check()
         self.monitor_._reset()
 
         for iter in range(self.n_iter):
-            stats, curr_logprob = self._do_estep(X, lengths)
+            stats, curr_logprob, n_samples = self._do_estep(X, lengths)
 
             # Compute lower bound before updating model parameters
             lower_bound = self._compute_lower_bound(curr_logprob)
@@ -485,20 +837,132 @@ class _AbstractHMM(BaseEstimator):
             if (self.transmat_.sum(axis=1) == 0).any():
                 _log.warning("Some rows of transmat_ have zero sum because no "
                              "transition from the state was ever observed.")
+        if stats is not None:
+            # The statistics of the last E-step, from which the M-step
+            # computed the fitted parameters, seed those of `partial_fit`,
+            # the fitted samples counting as one batch.
+            self._running_stats = (
+                self._per_sample_stats(stats, n_samples), n_samples, 1)
         return self
 
-    def _fit_scaling(self, X):
+    def _get_estep_parameters(self):
+        """
+        Return the start probabilities, the transition matrix, and the
+        function computing the frame probabilities (for the scaling
+        implementation) or log-probabilities (for the log implementation),
+        used by the forward-backward algorithm in the E-step.
+        """
         raise NotImplementedError("Must be overridden in subclass")
 
-    def _fit_log(self, X):
-        raise NotImplementedError("Must be overridden in subclass")
+    def _compute_estep_likelihood(self, X):
+        """
+        Return the frame (log-)probabilities of *X* used in the E-step (see
+        `_get_estep_parameters`), and a dict of arrays of length
+        ``len(X)``, passed on (restricted to each sequence) as additional
+        keyword arguments to `_accumulate_sufficient_statistics`.
+
+        Subclasses can override this to reuse intermediate results of the
+        frame probabilities in the sufficient statistics.
+        """
+        _, _, compute_frameprob = self._get_estep_parameters()
+        return compute_frameprob(X), {}
+
+    def _get_log_parameters(self, startprob, transmat):
+        """
+        Return the logs of the start probabilities *startprob* and of the
+        transition matrix *transmat*, as keyword arguments for the log space
+        kernels.
+
+        The logs are cached, and only recomputed when the probabilities
+        differ from those of the previous call, e.g. after each M-step, or
+        after they are assigned or modified in place.
+        """
+        cache = getattr(self, "_log_parameters", None)
+        if (cache is None
+                or not np.array_equal(cache[0], startprob)
+                or not np.array_equal(cache[1], transmat)):
+            startprob = np.array(startprob, dtype=float)
+            transmat = np.array(transmat, dtype=float)
+            with np.errstate(divide="ignore"):
+                cache = self._log_parameters = (
+                    startprob, transmat,
+                    {"log_startprob": np.log(startprob),
+                     "log_transmat": np.log(transmat)})
+        return cache[2]
+
+    def _precompute(self):
+        """
+        Compute and cache the arrays derived from the parameters that
+        inference uses, which are otherwise computed (and cached) on first
+        use, e.g. before compiling the model.
+        """
+        self._get_log_parameters(self.startprob_, self.transmat_)
+
+    def _get_dtype(self):
+        """
+        Validate and return the dtype of the frame log probabilities, of the
+        lattices and of the posteriors.
+        """
+        dtype = np.dtype(self.dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError(
+                f"dtype must be float32 or float64, got {self.dtype!r}")
+        if dtype == np.float32 and self.implementation != "log":
+            raise ValueError(
+                "dtype=float32 is only supported with implementation='log'")
+        return dtype
+
+    def _as_dtype(self, frameprob):
+        """
+        Return the frame (log-)probabilities *frameprob* as a C-contiguous
+        array of the model's dtype, as expected by the kernels.
+        """
+        return np.ascontiguousarray(frameprob, dtype=self._get_dtype())
+
+    def _fit_scaling(self, X, offsets):
+        """
+        Run the forward-backward algorithm (with scaling) on the sequences
+        of *X* delimited by *offsets*, and return the frame probabilities,
+        the per-sequence log probabilities, the posteriors, the sum of the
+        transition posteriors over all sequences, and the per-sample arrays
+        returned by `_compute_estep_likelihood`.
+        """
+        startprob, transmat, _ = self._get_estep_parameters()
+        frameprob, estep_kwargs = self._compute_estep_likelihood(X)
+        log_probs, posteriors, xi_sum = _hmmc.forward_backward_scaling_multi(
+            startprob, transmat, frameprob, offsets, 't' in self.params)
+        return frameprob, log_probs, posteriors, xi_sum, estep_kwargs
+
+    def _fit_log(self, X, offsets):
+        """
+        Run the forward-backward algorithm (in log space) on the sequences
+        of *X* delimited by *offsets*, and return the frame log
+        probabilities, the per-sequence log probabilities, the posteriors,
+        the sum of the transition posteriors over all sequences, and the
+        per-sample arrays returned by `_compute_estep_likelihood`.
+        """
+        startprob, transmat, _ = self._get_estep_parameters()
+        log_frameprob, estep_kwargs = self._compute_estep_likelihood(X)
+        log_frameprob = self._as_dtype(log_frameprob)
+        log_probs, posteriors, xi_sum = _hmmc.forward_backward_log_multi(
+            startprob, transmat, log_frameprob, offsets, 't' in self.params,
+            **self._get_log_parameters(startprob, transmat))
+        return log_frameprob, log_probs, posteriors, xi_sum, estep_kwargs
 
     def _compute_posteriors_scaling(self, fwdlattice, bwdlattice):
+        warnings.warn(
+            "_compute_posteriors_scaling is deprecated and will be removed in "
+            "a future version; the posteriors are computed by the "
+            "forward-backward kernels.", DeprecationWarning, stacklevel=2)
         posteriors = fwdlattice * bwdlattice
         normalize(posteriors, axis=1)
         return posteriors
 
     def _compute_posteriors_log(self, fwdlattice, bwdlattice):
+        warnings.warn(
+            "_compute_posteriors_log is deprecated and will be removed in a "
+            "future version; the posteriors are computed by the "
+            "forward-backward kernels.", DeprecationWarning, stacklevel=2)
         # gamma is guaranteed to be correctly normalized by log_prob at
         # all frames, unless we do approximate inference using pruning.
         # So, we will normalize each frame explicitly in case we
@@ -609,6 +1073,80 @@ class _AbstractHMM(BaseEstimator):
         else:
             raise NotImplementedError("Must be overridden in subclass")
 
+    def _generate_samples(self, state_sequence, random_state):
+        """
+        Generate random samples from the states of *state_sequence*.
+
+        The samples of each state are generated at once, by
+        `_generate_state_samples`.  If a subclass overrides
+        `_generate_sample_from_state` (but not `_generate_state_samples`),
+        that method is called for each sample instead, in order.
+
+        Parameters
+        ----------
+        state_sequence : array, shape (n_samples, )
+            Index of the component to condition each sample on.
+        random_state: RandomState
+            A random number generator instance.  (`sample` is the only caller
+            for this method and already normalizes *random_state*.)
+
+        Returns
+        -------
+        X : array, shape (n_samples, n_features)
+            Random samples from the emission distributions corresponding
+            to the given components.
+        """
+        def defining_class(name):
+            return next(cls for cls in type(self).__mro__
+                        if name in vars(cls))
+
+        per_sample = defining_class("_generate_sample_from_state")
+        per_state = defining_class("_generate_state_samples")
+        if per_sample is not per_state and issubclass(per_sample, per_state):
+            return np.atleast_2d([
+                self._generate_sample_from_state(
+                    state, random_state=random_state)
+                for state in state_sequence])
+        X = None
+        for state, indices in enumerate(
+                _utils.split_by_state(state_sequence, self.n_components)):
+            if not len(indices):
+                continue
+            sub_X = self._generate_state_samples(
+                state, len(indices), random_state)
+            if X is None:
+                X = np.empty((len(state_sequence),) + sub_X.shape[1:],
+                             dtype=sub_X.dtype)
+            X[indices] = sub_X
+        return X
+
+    def _generate_state_samples(self, state, n_samples, random_state):
+        """
+        Generate random samples from a given component.
+
+        The default implementation calls `_generate_sample_from_state`
+        *n_samples* times; subclasses should override it to generate the
+        samples at once.
+
+        Parameters
+        ----------
+        state : int
+            Index of the component to condition on.
+        n_samples : int
+            Number of samples to generate.
+        random_state: RandomState
+            A random number generator instance.
+
+        Returns
+        -------
+        X : array, shape (n_samples, n_features)
+            Random samples from the emission distribution corresponding
+            to a given component.
+        """
+        return np.atleast_2d([
+            self._generate_sample_from_state(state, random_state=random_state)
+            for _ in range(n_samples)])
+
     def _generate_sample_from_state(self, state, random_state):
         """
         Generate a random sample from a given component.
@@ -658,6 +1196,9 @@ class _AbstractHMM(BaseEstimator):
         """
         Update sufficient statistics from a given sample.
 
+        During the E-step, the arrays returned by `_compute_estep_likelihood`
+        for the samples of *X* are passed as additional keyword arguments.
+
         Parameters
         ----------
         stats : dict
@@ -677,7 +1218,11 @@ class _AbstractHMM(BaseEstimator):
             of the model states.
 
         fwdlattice, bwdlattice : array, shape (n_samples, n_components)
-            forward and backward probabilities.
+            forward and backward probabilities, used to compute the
+            transition statistics; None if the transition statistics were
+            already accumulated from the fused forward-backward kernel (as is
+            the case during `fit`, unless `_fit_scaling` or `_fit_log` are
+            overridden with their deprecated single-sequence signature).
         """
 
         impl = {
@@ -688,23 +1233,31 @@ class _AbstractHMM(BaseEstimator):
         return impl(stats=stats, X=X, lattice=lattice, posteriors=posteriors,
                     fwdlattice=fwdlattice, bwdlattice=bwdlattice)
 
+    def _needs_xi_sum(self, lattice, fwdlattice):
+        """
+        Return whether `_accumulate_sufficient_statistics` must compute the
+        transition statistics of a sequence from its lattices.
+        """
+        # When the sample is of length 1, it contains no transitions so
+        # there is no reason to update our trans. matrix estimate; without
+        # lattices, the transitions were already accounted for by the fused
+        # forward-backward kernel.
+        return ('t' in self.params and len(lattice) > 1
+                and fwdlattice is not None)
+
     def _accumulate_sufficient_statistics_scaling(
             self, stats, X, lattice, posteriors, fwdlattice, bwdlattice):
         """
         Implementation of `_accumulate_sufficient_statistics`
-        for ``implementation = "log"``.
+        for ``implementation = "scaling"``.
         """
         stats['nobs'] += 1
         if 's' in self.params:
             stats['start'] += posteriors[0]
-        if 't' in self.params:
-            n_samples, n_components = lattice.shape
-            # when the sample is of length 1, it contains no transitions
-            # so there is no reason to update our trans. matrix estimate
-            if n_samples <= 1:
-                return
+        if self._needs_xi_sum(lattice, fwdlattice):
+            _, transmat, _ = self._get_estep_parameters()
             xi_sum = _hmmc.compute_scaling_xi_sum(
-                fwdlattice, self.transmat_, bwdlattice, lattice)
+                fwdlattice, transmat, bwdlattice, lattice)
             stats['trans'] += xi_sum
 
     def _accumulate_sufficient_statistics_log(
@@ -716,14 +1269,12 @@ class _AbstractHMM(BaseEstimator):
         stats['nobs'] += 1
         if 's' in self.params:
             stats['start'] += posteriors[0]
-        if 't' in self.params:
-            n_samples, n_components = lattice.shape
-            # when the sample is of length 1, it contains no transitions
-            # so there is no reason to update our trans. matrix estimate
-            if n_samples <= 1:
-                return
+        if self._needs_xi_sum(lattice, fwdlattice):
+            startprob, transmat, _ = self._get_estep_parameters()
             log_xi_sum = _hmmc.compute_log_xi_sum(
-                fwdlattice, self.transmat_, bwdlattice, lattice)
+                fwdlattice, transmat, bwdlattice, lattice,
+                self._get_log_parameters(
+                    startprob, transmat)["log_transmat"])
             with np.errstate(under="ignore"):
                 stats['trans'] += np.exp(log_xi_sum)
 
@@ -738,24 +1289,155 @@ class _AbstractHMM(BaseEstimator):
         """
 
     def _do_estep(self, X, lengths):
+        """
+        Run the E-step on *X* (a feature matrix, or a callable returning
+        ``(X, lengths)`` batches, see `fit`), and return the sufficient
+        statistics, the total log probability, and the number of samples.
+        """
+        stats = self._initialize_sufficient_statistics()
+        self._estep_begin()
+        # Arrays are validated once by the caller, not at each iteration.
+        batches = (self._iter_batches(X, lengths) if callable(X)
+                   else [(X, lengths)])
+        curr_logprob = 0
+        n_samples = 0
+        for sub_X, sub_lengths in batches:
+            curr_logprob += self._do_estep_batch(stats, sub_X, sub_lengths)
+            n_samples += len(sub_X)
+        return stats, curr_logprob, n_samples
+
+    def _per_sample_stats(self, stats, n_samples):
+        """
+        Return the sufficient statistics *stats* of *n_samples* samples
+        divided by *n_samples*, leaving out their initial values (e.g.,
+        prior terms), see `_initialize_sufficient_statistics`.
+        """
+        initial = self._initialize_sufficient_statistics()
+        return {key: (value - initial[key]) / n_samples
+                for key, value in stats.items()}
+
+    def _do_estep_batch(self, stats, X, lengths):
+        """
+        Run the E-step on the sequences of *X*, in parallel if ``n_jobs > 1``,
+        accumulating sufficient statistics into *stats*, and return the total
+        log probability.
+        """
+        index = _utils.as_sequence_index(X, lengths)
+        n_jobs = min(_utils.effective_n_jobs(self.n_jobs), len(index))
+        if n_jobs == 1:
+            return self._do_estep_sequences(stats, X, index)
+        # The _hmmc kernels release the GIL, so sequences can be processed
+        # by a thread pool.  Sufficient statistics are additive: each worker
+        # accumulates into its own zeroed copy of *stats*, and the copies are
+        # summed back (in a fixed order, for reproducibility) afterwards.
+        all_sub_stats = [{key: np.zeros_like(value)
+                          for key, value in stats.items()}
+                         for _ in range(n_jobs)]
+        # Each worker gets a contiguous range of sequences.
+        with _utils.thread_pool(n_jobs) as executor:
+            futures = [
+                executor.submit(
+                    self._do_estep_sequences, sub_stats, X[start:stop],
+                    sub_index)
+                for sub_stats, (start, stop, sub_index) in zip(
+                    all_sub_stats, index.chunks(n_jobs))]
+        curr_logprob = 0
+        for sub_stats, future in zip(all_sub_stats, futures):
+            curr_logprob += future.result()
+            for key, value in sub_stats.items():
+                stats[key] += value
+        return curr_logprob
+
+    def _do_estep_sequences(self, stats, X, lengths):
+        """
+        Run the E-step on the sequences of *X*, accumulating sufficient
+        statistics into *stats*, and return the total log probability.
+        """
         impl = {
             "scaling": self._fit_scaling,
             "log": self._fit_log,
         }[self.implementation]
+        if len(inspect.signature(impl).parameters) == 1:
+            return self._do_estep_legacy(stats, impl, X, lengths)
 
-        stats = self._initialize_sufficient_statistics()
-        self._estep_begin()
         curr_logprob = 0
-        for sub_X in _utils.split_X_lengths(X, lengths):
-            lattice, logprob, posteriors, fwdlattice, bwdlattice = impl(sub_X)
-            # Derived HMM classes will implement the following method to
-            # update their probability distributions, so keep
-            # a single call to this method for simplicity.
+        for sub_X, offsets in self._split_X_blocks(X, lengths):
+            if self._use_checkpoints(offsets):
+                curr_logprob += self._do_estep_checkpoint(stats, sub_X)
+                continue
+            lattice, log_probs, posteriors, xi_sum, estep_kwargs = impl(
+                sub_X, offsets)
+            # The transition statistics are computed by the fused
+            # forward-backward kernels, so no forward and backward lattices
+            # are passed below.
+            if 't' in self.params:
+                stats['trans'] += xi_sum
+            bounds = offsets.tolist()
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                # Derived HMM classes will implement the following method to
+                # update their probability distributions, so keep
+                # a single call to this method for simplicity.
+                self._accumulate_sufficient_statistics(
+                    stats, sub_X[start:stop], lattice[start:stop],
+                    posteriors[start:stop], None, None,
+                    **{key: value[start:stop]
+                       for key, value in estep_kwargs.items()})
+            curr_logprob += log_probs.sum()
+        return curr_logprob
+
+    def _do_estep_legacy(self, stats, impl, X, lengths):
+        """
+        Run the E-step with an override *impl* of `_fit_scaling` or
+        `_fit_log` taking a single sequence and returning its frame
+        probabilities, log probability, posteriors, and forward and backward
+        lattices (as in hmmlearn 0.2.8), which are passed on to
+        `_accumulate_sufficient_statistics`.
+        """
+        warnings.warn(
+            f"Overriding {impl.__name__} with a single-sequence signature is "
+            f"deprecated and will be removed in a future version; override "
+            f"{impl.__name__}(X, offsets) instead.", DeprecationWarning)
+        curr_logprob = 0
+        for sub_X in _utils.as_sequence_index(X, lengths).split(X):
+            lattice, log_prob, posteriors, fwdlattice, bwdlattice = impl(
+                sub_X)
             self._accumulate_sufficient_statistics(
-                stats, sub_X, lattice, posteriors, fwdlattice,
-                bwdlattice)
-            curr_logprob += logprob
-        return stats, curr_logprob
+                stats, sub_X, lattice, posteriors, fwdlattice, bwdlattice)
+            curr_logprob += log_prob
+        return curr_logprob
+
+    def _do_estep_checkpoint(self, stats, X):
+        """
+        Run the E-step on the single sequence *X* with checkpointing,
+        accumulating sufficient statistics into *stats*, and return its log
+        probability.
+        """
+        startprob, transmat, _ = self._get_estep_parameters()
+
+        def accumulate(start, stop, lattice, posteriors, estep_kwargs):
+            if start == 0:
+                self._accumulate_sufficient_statistics(
+                    stats, X[start:stop], lattice, posteriors, None, None,
+                    **estep_kwargs)
+                return
+            # Only the first segment starts the sequence, so the other ones
+            # must not contribute to the 'nobs' and 'start' statistics.
+            sub_stats = {key: np.zeros_like(value)
+                         for key, value in stats.items()}
+            self._accumulate_sufficient_statistics(
+                sub_stats, X[start:stop], lattice, posteriors, None, None,
+                **estep_kwargs)
+            for key, value in sub_stats.items():
+                if key not in ('nobs', 'start'):
+                    stats[key] += value
+
+        log_prob, _, xi_sum = self._forward_backward_checkpoint(
+            X, startprob, transmat, self._compute_estep_likelihood,
+            compute_posteriors=False, compute_xi='t' in self.params,
+            accumulate=accumulate)
+        if 't' in self.params:
+            stats['trans'] += xi_sum
+        return log_prob
 
     def _estep_begin(self):
         pass
@@ -778,7 +1460,14 @@ class BaseHMM(_AbstractHMM):
     startprob_ : array, shape (n_components, )
         Initial state occupation distribution.
     transmat_ : array, shape (n_components, n_components)
-        Matrix of transition probabilities between states.
+        Matrix of transition probabilities between states.  It may also be
+        set to a scipy sparse matrix, which is converted to a dense array
+        when the model is checked.  Zero transitions are skipped by the
+        inference kernels (and remain zero during EM), so that sparse
+        topologies, e.g. left-right models, are decoded and fitted faster.
+    n_batch_iter_ : int
+        Number of batches processed by `partial_fit` (since the last call to
+        `fit`, if any); subclasses have this attribute as well.
 
     Notes
     -----
@@ -795,7 +1484,8 @@ class BaseHMM(_AbstractHMM):
                  n_iter=10, tol=1e-2, verbose=False,
                  params=string.ascii_letters,
                  init_params=string.ascii_letters,
-                 implementation="log"):
+                 implementation="log", n_jobs=None, memory="full",
+                 learning_decay=0.7, learning_offset=10., dtype=np.float64):
         """
         Parameters
         ----------
@@ -830,14 +1520,34 @@ class BaseHMM(_AbstractHMM):
             logarithms ("log"), or using scaling ("scaling").  The default is
             to use logarithms for backwards compatability.  However, the
             scaling implementation is generally faster.
+        n_jobs : int, optional
+            Number of threads used to process multiple sequences in parallel,
+            see :class:`~hmmlearn.base._AbstractHMM`.
+        memory : {"full", "checkpoint"}, optional
+            Memory usage of the forward-backward algorithm, see
+            :class:`~hmmlearn.base._AbstractHMM`.
+        learning_decay : float, optional
+            Exponent of the step size schedule of `partial_fit`: the
+            sufficient statistics of the k-th batch are blended into the
+            running ones with weight ``(learning_offset + k) **
+            -learning_decay``.  Values in ``(0.5, 1]`` ensure convergence.
+        learning_offset : float, optional
+            Offset of the step size schedule of `partial_fit`; larger values
+            downweight the first batches.
+        dtype : {numpy.float64, numpy.float32}, optional
+            Floating point type of the lattices and posteriors, see
+            :class:`~hmmlearn.base._AbstractHMM`.
         """
         super().__init__(
             n_components=n_components, algorithm=algorithm,
             random_state=random_state, n_iter=n_iter, tol=tol,
             verbose=verbose, params=params, init_params=init_params,
-            implementation=implementation)
+            implementation=implementation, n_jobs=n_jobs,
+            memory=memory, dtype=dtype)
         self.startprob_prior = startprob_prior
         self.transmat_prior = transmat_prior
+        self.learning_decay = learning_decay
+        self.learning_offset = learning_offset
         self.monitor_ = ConvergenceMonitor(self.tol, self.n_iter, self.verbose)
 
     def get_stationary_distribution(self):
@@ -850,23 +1560,76 @@ class BaseHMM(_AbstractHMM):
         eigvec = np.real_if_close(eigvecs[:, np.argmax(eigvals)])
         return eigvec / eigvec.sum()
 
-    def _fit_scaling(self, X):
-        frameprob = self._compute_likelihood(X)
-        log_prob, fwdlattice, scaling_factors = _hmmc.forward_scaling(
-            self.startprob_, self.transmat_, frameprob)
-        bwdlattice = _hmmc.backward_scaling(
-            self.startprob_, self.transmat_, frameprob, scaling_factors)
-        posteriors = self._compute_posteriors_scaling(fwdlattice, bwdlattice)
-        return frameprob, log_prob, posteriors, fwdlattice, bwdlattice
-
-    def _fit_log(self, X):
-        log_frameprob = self._compute_log_likelihood(X)
-        log_prob, fwdlattice = _hmmc.forward_log(
-            self.startprob_, self.transmat_, log_frameprob)
-        bwdlattice = _hmmc.backward_log(
-            self.startprob_, self.transmat_, log_frameprob)
-        posteriors = self._compute_posteriors_log(fwdlattice, bwdlattice)
-        return log_frameprob, log_prob, posteriors, fwdlattice, bwdlattice
+    def partial_fit(self, X, lengths=None):
+        """
+        Update model parameters from a batch of samples, using stochastic EM.
+
+        The first call initializes the model, as `fit` does, unless it is
+        already fitted, in which case it starts from the fitted parameters;
+        after `fit`, the running statistics start from those of the fitted
+        samples, which count as one batch.  Each call then runs the E-step
+        on the batch, blends the resulting sufficient statistics, averaged
+        per sample, into running statistics (with a weight following the
+        schedule set by ``learning_decay`` and ``learning_offset``), and runs
+        the M-step on the running statistics, scaled by the similarly
+        blended batch size.  Batches of different sizes are thus weighted
+        consistently.  The memory used only depends on the size of the
+        batches, not on the number of samples seen.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Feature matrix of individual samples.
+        lengths : array-like of integers, shape (n_sequences, )
+            Lengths of the individual sequences in ``X``. The sum of
+            these should be ``n_samples``.
+
+        Returns
+        -------
+        self : object
+            Returns self.
+        """
+        X = check_array(X)
+
+        if lengths is None:
+            lengths = np.asarray([X.shape[0]])
+
+        if not hasattr(self, "n_batch_iter_"):
+            try:
+                check_is_fitted(self, "startprob_")
+            except NotFittedError:
+                self._init(X, lengths)
+            self.n_batch_iter_ = 0
+        self._check()
+
+        stats, _, n_samples = self._do_estep(X, lengths)
+        # The running statistics are averages per sample, so that batches of
+        # different sizes are weighted consistently; they are scaled back
+        # by the (similarly averaged) batch size for the M-step.
+        stats = self._per_sample_stats(stats, n_samples)
+        if hasattr(self, "_running_stats"):
+            running, running_n_samples, n_batches = self._running_stats
+            step_size = ((self.learning_offset + n_batches)
+                         ** -self.learning_decay)
+            stats = {key: (1 - step_size) * value + step_size * stats[key]
+                     for key, value in running.items()}
+            n_samples = ((1 - step_size) * running_n_samples
+                         + step_size * n_samples)
+        else:
+            n_batches = 0
+        self._running_stats = stats, n_samples, n_batches + 1
+        initial = self._initialize_sufficient_statistics()
+        self._do_mstep({key: initial[key] + n_samples * value
+                        for key, value in stats.items()})
+        self.n_batch_iter_ += 1
+        return self
+
+    def _get_estep_parameters(self):
+        compute_frameprob = {
+            "scaling": self._compute_likelihood,
+            "log": self._compute_log_likelihood,
+        }[self.implementation]
+        return self.startprob_, self.transmat_, compute_frameprob
 
     def _do_mstep(self, stats):
         """
@@ -943,12 +1706,17 @@ class BaseHMM(_AbstractHMM):
             If any of the parameters are invalid, e.g. if :attr:`startprob_`
             don't sum to 1.
         """
-        self.startprob_ = np.asarray(self.startprob_)
+        self._get_dtype()
+        # The parameters are made C-contiguous float64 arrays, as expected by
+        # the float32 overloads of the log space kernels.
+        self.startprob_ = np.ascontiguousarray(self.startprob_, dtype=float)
         if len(self.startprob_) != self.n_components:
             raise ValueError("startprob_ must have length n_components")
         self._check_sum_1("startprob_")
 
-        self.transmat_ = np.asarray(self.transmat_)
+        if sparse.issparse(self.transmat_):
+            self.transmat_ = self.transmat_.toarray()
+        self.transmat_ = np.ascontiguousarray(self.transmat_, dtype=float)
         if self.transmat_.shape != (self.n_components, self.n_components):
             raise ValueError(
                 "transmat_ must have shape (n_components, n_components)")
@@ -1012,12 +1780,14 @@ class VariationalBaseHMM(_AbstractHMM):
                  algorithm="viterbi", random_state=None,
                  n_iter=100, tol=1e-6, verbose=False,
                  params="ste", init_params="ste",
-                 implementation="log"):
+                 implementation="log", n_jobs=None, memory="full",
+                 dtype=np.float64):
         super().__init__(
             n_components=n_components, algorithm=algorithm,
             random_state=random_state, n_iter=n_iter, tol=tol,
             verbose=verbose, params=params, init_params=init_params,
-            implementation=implementation)
+            implementation=implementation, n_jobs=n_jobs,
+            memory=memory, dtype=dtype)
 
         self.startprob_prior = startprob_prior
         self.transmat_prior = transmat_prior
@@ -1075,25 +1845,13 @@ class VariationalBaseHMM(_AbstractHMM):
 
     # For Variational Inference, we compute the forward/backward algorithm
     # using subnormalized probabilities.
-    def _fit_scaling(self, X):
-        frameprob = self._compute_subnorm_likelihood(X)
-        logprob, fwdlattice, scaling_factors = _hmmc.forward_scaling(
-            self.startprob_subnorm_, self.transmat_subnorm_, frameprob)
-
-        bwdlattice = _hmmc.backward_scaling(
-            self.startprob_subnorm_, self.transmat_subnorm_,
-            frameprob, scaling_factors)
-        posteriors = self._compute_posteriors_scaling(fwdlattice, bwdlattice)
-        return frameprob, logprob, posteriors, fwdlattice, bwdlattice
-
-    def _fit_log(self, X):
-        framelogprob = self._compute_subnorm_log_likelihood(X)
-        logprob, fwdlattice = _hmmc.forward_log(
-            self.startprob_subnorm_, self.transmat_subnorm_, framelogprob)
-        bwdlattice = _hmmc.backward_log(
-            self.startprob_subnorm_, self.transmat_subnorm_, framelogprob)
-        posteriors = self._compute_posteriors_log(fwdlattice, bwdlattice)
-        return framelogprob, logprob, posteriors, fwdlattice, bwdlattice
+    def _get_estep_parameters(self):
+        compute_frameprob = {
+            "scaling": self._compute_subnorm_likelihood,
+            "log": self._compute_subnorm_log_likelihood,
+        }[self.implementation]
+        return (self.startprob_subnorm_, self.transmat_subnorm_,
+                compute_frameprob)
 
     def _check(self):
         """
@@ -1105,6 +1863,7 @@ class VariationalBaseHMM(_AbstractHMM):
             If any of the parameters are invalid, e.g. if :attr:`startprob_`
             don't sum to 1.
         """
+        self._get_dtype()
         nc = self.n_components
 
         self.startprob_prior_ = np.asarray(self.startprob_prior_)
@@ -1138,49 +1897,6 @@ class VariationalBaseHMM(_AbstractHMM):
         else:
             raise NotImplementedError("Must be overridden in subclass")
 
-    def _accumulate_sufficient_statistics_scaling(
-            self, stats, X, lattice, posteriors, fwdlattice, bwdlattice):
-        """
-        Implementation of `_accumulate_sufficient_statistics`
-        for ``implementation = "log"``.
-        """
-        stats['nobs'] += 1
-        if 's' in self.params:
-            stats['start'] += posteriors[0]
-        if 't' in self.params:
-            n_samples, n_components = lattice.shape
-            # when the sample is of length 1, it contains no transitions
-            # so there is no reason to update our trans. matrix estimate
-            if n_samples <= 1:
-                return
-
-            xi_sum = _hmmc.compute_scaling_xi_sum(fwdlattice,
-                                                  self.transmat_subnorm_,
-                                                  bwdlattice, lattice)
-            stats['trans'] += xi_sum
-
-    def _accumulate_sufficient_statistics_log(
-            self, stats, X, lattice, posteriors, fwdlattice, bwdlattice):
-        """
-        Implementation of `_accumulate_sufficient_statistics`
-        for ``implementation = "log"``.
-        """
-        stats['nobs'] += 1
-        if 's' in self.params:
-            stats['start'] += posteriors[0]
-        if 't' in self.params:
-            n_samples, n_components = lattice.shape
-            # when the sample is of length 1, it contains no transitions
-            # so there is no reason to update our trans. matrix estimate
-            if n_samples <= 1:
-                return
-
-            log_xi_sum = _hmmc.compute_log_xi_sum(
-                fwdlattice, self.transmat_subnorm_, bwdlattice,
-                lattice)
-            with np.errstate(under="ignore"):
-                stats['trans'] += np.exp(log_xi_sum)
-
     def _estep_begin(self):
         """
         Update the subnormalized model parameters.  Called at the beginning of
@@ -0,0 +1,203 @@
+"""
+The :mod:`hmmlearn.compiled` module implements fast repeated inference with
+fitted hidden Markov models, validated once.
+"""
+
+import copy
+
+import numpy as np
+from sklearn.utils.validation import check_array, check_is_fitted
+
+
+__all__ = ["CompiledHMM"]
+
+
+class CompiledHMM:
+    """
+    Validated, frozen hidden Markov model, for fast repeated inference.
+
+    Usually obtained by calling ``model.compile()``.  The parameters of the
+    model are validated once, and a copy of the model is kept, with the
+    arrays derived from its parameters precomputed, so that later changes to
+    the model do not affect the compiled model.  The arrays of the copy are
+    made read-only, and inference never sets any attribute of the compiled
+    model or of its copy.
+
+    The methods of the compiled model return the same results as those of
+    the model, but skip the validation of its parameters.  Samples passed as
+    two-dimensional numeric arrays are used as is; in particular, they are
+    not checked for NaNs or infinities.  Other inputs are validated as by
+    the model.  Unlike the model's methods, ``X`` cannot be a callable
+    returning batches of samples.
+
+    Unlike models, whose methods may set attributes (e.g. ``_check``
+    normalizes the types of the parameters), a compiled model can be shared
+    by multiple threads, which may call its methods concurrently, e.g. from
+    a thread pool serving requests.  The kernels release the GIL, so that
+    such calls run in parallel.
+
+    Parameters
+    ----------
+    model : _AbstractHMM
+        A fitted model.
+
+    Examples
+    --------
+    >>> compiled = model.compile()
+    >>> for X in requests:
+    ...     log_prob, state_sequence = compiled.decode(X)
+    """
+
+    def __init__(self, model):
+        check_is_fitted(model, "startprob_")
+        model._check()
+        model = copy.deepcopy(model)
+        model._precompute()
+        _freeze(vars(model))
+        self._model = model
+        self._score_impl = {
+            "scaling": model._score_scaling,
+            "log": model._score_log,
+        }[model.implementation]
+
+    @property
+    def n_components(self):
+        """Number of states in the model."""
+        return self._model.n_components
+
+    @staticmethod
+    def _validate_X(X):
+        """Return *X* unchanged if a nonempty numeric matrix, else check it."""
+        if (isinstance(X, np.ndarray) and X.ndim == 2 and len(X)
+                and X.dtype.kind in "fiu"):
+            return X
+        return check_array(X)
+
+    def score_samples(self, X, lengths=None):
+        """
+        Compute the log probability under the model and compute posteriors.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Feature matrix of individual samples.
+        lengths : array-like of integers, shape (n_sequences, ), optional
+            Lengths of the individual sequences in ``X``. The sum of
+            these should be ``n_samples``.
+
+        Returns
+        -------
+        log_prob : float
+            Log likelihood of ``X``.
+        posteriors : array, shape (n_samples, n_components)
+            State-membership probabilities for each sample in ``X``.
+        """
+        return self._score_impl(
+            self._validate_X(X), lengths, compute_posteriors=True)
+
+    def score(self, X, lengths=None):
+        """
+        Compute the log probability under the model.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Feature matrix of individual samples.
+        lengths : array-like of integers, shape (n_sequences, ), optional
+            Lengths of the individual sequences in ``X``. The sum of
+            these should be ``n_samples``.
+
+        Returns
+        -------
+        log_prob : float
+            Log likelihood of ``X``.
+        """
+        return self._score_impl(
+            self._validate_X(X), lengths, compute_posteriors=False)[0]
+
+    def decode(self, X, lengths=None, algorithm=None, *,
+               per_sequence=False):
+        """
+        Find most likely state sequence corresponding to ``X``.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Feature matrix of individual samples.
+        lengths : array-like of integers, shape (n_sequences, ), optional
+            Lengths of the individual sequences in ``X``. The sum of
+            these should be ``n_samples``.
+        algorithm : string
+            Decoder algorithm. Must be one of "viterbi" or "map".
+            If not given, the model's ``algorithm`` is used.
+        per_sequence : bool, optional
+            Whether to return the log probability of the state sequence of
+            each sequence, rather than their sum.
+
+        Returns
+        -------
+        log_prob : float, or array of shape (n_sequences, )
+            Log probability of the produced state sequence (of each sequence
+            if ``per_sequence`` is True).
+        state_sequence : array, shape (n_samples, )
+            Labels for each sample from ``X`` obtained via a given
+            decoder ``algorithm``.
+        """
+        log_probs, state_sequence = self._model._decode(
+            self._validate_X(X), lengths, algorithm)
+        return (log_probs if per_sequence else log_probs.sum()), state_sequence
+
+    def predict(self, X, lengths=None):
+        """
+        Find most likely state sequence corresponding to ``X``.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Feature matrix of individual samples.
+        lengths : array-like of integers, shape (n_sequences, ), optional
+            Lengths of the individual sequences in ``X``. The sum of
+            these should be ``n_samples``.
+
+        Returns
+        -------
+        state_sequence : array, shape (n_samples, )
+            Labels for each sample from ``X``.
+        """
+        _, state_sequence = self.decode(X, lengths)
+        return state_sequence
+
+    def predict_proba(self, X, lengths=None):
+        """
+        Compute the posterior probability for each state in the model.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Feature matrix of individual samples.
+        lengths : array-like of integers, shape (n_sequences, ), optional
+            Lengths of the individual sequences in ``X``. The sum of
+            these should be ``n_samples``.
+
+        Returns
+        -------
+        posteriors : array, shape (n_samples, n_components)
+            State-membership probabilities for each sample from ``X``.
+        """
+        _, posteriors = self.score_samples(X, lengths)
+        return posteriors
+
+
+def _freeze(obj):
+    """
+    Make the arrays in *obj*, and (recursively) in the tuples, lists and
+    dicts it contains, read-only.
+    """
+    if isinstance(obj, np.ndarray):
+        obj.setflags(write=False)
+    elif isinstance(obj, (tuple, list)):
+        for item in obj:
+            _freeze(item)
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            _freeze(value)
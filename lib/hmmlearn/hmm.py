@@ -56,7 +56,9 @@ class CategoricalHMM(_emissions.BaseCategoricalHMM, BaseHMM):
                  n_features=None, algorithm="viterbi",
                  random_state=None, n_iter=10, tol=1e-2,
                  verbose=False, params="ste", init_params="ste",
-                 implementation="log"):
+                 implementation="log", n_jobs=None, memory="full",
+                 learning_decay=0.7, learning_offset=10.,
+                 dtype=np.float64):
         """
         Parameters
         ----------
@@ -107,6 +109,22 @@ class CategoricalHMM(_emissions.BaseCategoricalHMM, BaseHMM):
             Determines if the forward-backward algorithm is implemented with
             logarithms ("log"), or using scaling ("scaling").  The default is
             to use logarithms for backwards compatability.
+
+        n_jobs : int, optional
+            Number of threads used to process multiple sequences in parallel,
+            see :class:`~hmmlearn.base._AbstractHMM`.
+
+        memory : {"full", "checkpoint"}, optional
+            Memory usage of the forward-backward algorithm, see
+            :class:`~hmmlearn.base._AbstractHMM`.
+
+        learning_decay, learning_offset : float, optional
+            Exponent and offset of the step size schedule of `partial_fit`,
+            see :class:`~hmmlearn.base.BaseHMM`.
+
+        dtype : {numpy.float64, numpy.float32}, optional
+            Floating point type of the lattices and posteriors, see
+            :class:`~hmmlearn.base._AbstractHMM`.
         """
         BaseHMM.__init__(self, n_components,
                          startprob_prior=startprob_prior,
@@ -115,7 +133,11 @@ class CategoricalHMM(_emissions.BaseCategoricalHMM, BaseHMM):
                          random_state=random_state,
                          n_iter=n_iter, tol=tol, verbose=verbose,
                          params=params, init_params=init_params,
-                         implementation=implementation)
+                         implementation=implementation, n_jobs=n_jobs,
+                         memory=memory,
+                         learning_decay=learning_decay,
+                         learning_offset=learning_offset,
+                         dtype=dtype)
         self.emissionprob_prior = emissionprob_prior
         self.n_features = n_features
 
@@ -195,7 +217,9 @@ class GaussianHMM(_emissions.BaseGaussianHMM, BaseHMM):
                  algorithm="viterbi", random_state=None,
                  n_iter=10, tol=1e-2, verbose=False,
                  params="stmc", init_params="stmc",
-                 implementation="log"):
+                 implementation="log", n_jobs=None, memory="full",
+                 learning_decay=0.7, learning_offset=10.,
+                 dtype=np.float64):
         """
         Parameters
         ----------
@@ -264,6 +288,22 @@ class GaussianHMM(_emissions.BaseGaussianHMM, BaseHMM):
             Determines if the forward-backward algorithm is implemented with
             logarithms ("log"), or using scaling ("scaling").  The default is
             to use logarithms for backwards compatability.
+
+        n_jobs : int, optional
+            Number of threads used to process multiple sequences in parallel,
+            see :class:`~hmmlearn.base._AbstractHMM`.
+
+        memory : {"full", "checkpoint"}, optional
+            Memory usage of the forward-backward algorithm, see
+            :class:`~hmmlearn.base._AbstractHMM`.
+
+        learning_decay, learning_offset : float, optional
+            Exponent and offset of the step size schedule of `partial_fit`,
+            see :class:`~hmmlearn.base.BaseHMM`.
+
+        dtype : {numpy.float64, numpy.float32}, optional
+            Floating point type of the lattices and posteriors, see
+            :class:`~hmmlearn.base._AbstractHMM`.
         """
         super().__init__(n_components,
                          startprob_prior=startprob_prior,
@@ -271,7 +311,11 @@ class GaussianHMM(_emissions.BaseGaussianHMM, BaseHMM):
                          random_state=random_state, n_iter=n_iter,
                          tol=tol, params=params, verbose=verbose,
                          init_params=init_params,
-                         implementation=implementation)
+                         implementation=implementation, n_jobs=n_jobs,
+                         memory=memory,
+                         learning_decay=learning_decay,
+                         learning_offset=learning_offset,
+                         dtype=dtype)
         self.covariance_type = covariance_type
         self.min_covar = min_covar
         self.means_prior = means_prior
@@ -415,7 +459,9 @@ class GMMHMM(_emissions.BaseGMMHMM):
                  random_state=None, n_iter=10, tol=1e-2,
                  verbose=False, params="stmcw",
                  init_params="stmcw",
-                 implementation="log"):
+                 implementation="log", n_jobs=None, memory="full",
+                 learning_decay=0.7, learning_offset=10.,
+                 dtype=np.float64):
         """
         Parameters
         ----------
@@ -495,6 +541,22 @@ class GMMHMM(_emissions.BaseGMMHMM):
             Determines if the forward-backward algorithm is implemented with
             logarithms ("log"), or using scaling ("scaling").  The default is
             to use logarithms for backwards compatability.
+
+        n_jobs : int, optional
+            Number of threads used to process multiple sequences in parallel,
+            see :class:`~hmmlearn.base._AbstractHMM`.
+
+        memory : {"full", "checkpoint"}, optional
+            Memory usage of the forward-backward algorithm, see
+            :class:`~hmmlearn.base._AbstractHMM`.
+
+        learning_decay, learning_offset : float, optional
+            Exponent and offset of the step size schedule of `partial_fit`,
+            see :class:`~hmmlearn.base.BaseHMM`.
+
+        dtype : {numpy.float64, numpy.float32}, optional
+            Floating point type of the lattices and posteriors, see
+            :class:`~hmmlearn.base._AbstractHMM`.
         """
         BaseHMM.__init__(self, n_components,
                          startprob_prior=startprob_prior,
@@ -502,7 +564,11 @@ class GMMHMM(_emissions.BaseGMMHMM):
                          algorithm=algorithm, random_state=random_state,
                          n_iter=n_iter, tol=tol, verbose=verbose,
                          params=params, init_params=init_params,
-                         implementation=implementation)
+                         implementation=implementation, n_jobs=n_jobs,
+                         memory=memory,
+                         learning_decay=learning_decay,
+                         learning_offset=learning_offset,
+                         dtype=dtype)
         self.covariance_type = covariance_type
         self.min_covar = min_covar
         self.n_mix = n_mix
@@ -822,7 +888,9 @@ class MultinomialHMM(_emissions.BaseMultinomialHMM):
                  algorithm="viterbi", random_state=None,
                  n_iter=10, tol=1e-2, verbose=False,
                  params="ste", init_params="ste",
-                 implementation="log"):
+                 implementation="log", n_jobs=None, memory="full",
+                 learning_decay=0.7, learning_offset=10.,
+                 dtype=np.float64):
         """
         Parameters
         ----------
@@ -869,6 +937,22 @@ class MultinomialHMM(_emissions.BaseMultinomialHMM):
             Determines if the forward-backward algorithm is implemented with
             logarithms ("log"), or using scaling ("scaling").  The default is
             to use logarithms for backwards compatability.
+
+        n_jobs : int, optional
+            Number of threads used to process multiple sequences in parallel,
+            see :class:`~hmmlearn.base._AbstractHMM`.
+
+        memory : {"full", "checkpoint"}, optional
+            Memory usage of the forward-backward algorithm, see
+            :class:`~hmmlearn.base._AbstractHMM`.
+
+        learning_decay, learning_offset : float, optional
+            Exponent and offset of the step size schedule of `partial_fit`,
+            see :class:`~hmmlearn.base.BaseHMM`.
+
+        dtype : {numpy.float64, numpy.float32}, optional
+            Floating point type of the lattices and posteriors, see
+            :class:`~hmmlearn.base._AbstractHMM`.
         """
         BaseHMM.__init__(self, n_components,
                          startprob_prior=startprob_prior,
@@ -877,7 +961,11 @@ class MultinomialHMM(_emissions.BaseMultinomialHMM):
                          random_state=random_state,
                          n_iter=n_iter, tol=tol, verbose=verbose,
                          params=params, init_params=init_params,
-                         implementation=implementation)
+                         implementation=implementation, n_jobs=n_jobs,
+                         memory=memory,
+                         learning_decay=learning_decay,
+                         learning_offset=learning_offset,
+                         dtype=dtype)
         self.n_trials = n_trials
 
         _log.warning(
@@ -944,7 +1032,9 @@ class PoissonHMM(_emissions.BasePoissonHMM):
                  algorithm="viterbi", random_state=None,
                  n_iter=10, tol=1e-2, verbose=False,
                  params="stl", init_params="stl",
-                 implementation="log"):
+                 implementation="log", n_jobs=None, memory="full",
+                 learning_decay=0.7, learning_offset=10.,
+                 dtype=np.float64):
         """
         Parameters
         ----------
@@ -992,6 +1082,22 @@ class PoissonHMM(_emissions.BasePoissonHMM):
             Determines if the forward-backward algorithm is implemented with
             logarithms ("log"), or using scaling ("scaling").  The default is
             to use logarithms for backwards compatability.
+
+        n_jobs : int, optional
+            Number of threads used to process multiple sequences in parallel,
+            see :class:`~hmmlearn.base._AbstractHMM`.
+
+        memory : {"full", "checkpoint"}, optional
+            Memory usage of the forward-backward algorithm, see
+            :class:`~hmmlearn.base._AbstractHMM`.
+
+        learning_decay, learning_offset : float, optional
+            Exponent and offset of the step size schedule of `partial_fit`,
+            see :class:`~hmmlearn.base.BaseHMM`.
+
+        dtype : {numpy.float64, numpy.float32}, optional
+            Floating point type of the lattices and posteriors, see
+            :class:`~hmmlearn.base._AbstractHMM`.
         """
         BaseHMM.__init__(self, n_components,
                          startprob_prior=startprob_prior,
@@ -1000,7 +1106,11 @@ class PoissonHMM(_emissions.BasePoissonHMM):
                          random_state=random_state,
                          n_iter=n_iter, tol=tol, verbose=verbose,
                          params=params, init_params=init_params,
-                         implementation=implementation)
+                         implementation=implementation, n_jobs=n_jobs,
+                         memory=memory,
+                         learning_decay=learning_decay,
+                         learning_offset=learning_offset,
+                         dtype=dtype)
         self.lambdas_prior = lambdas_prior
         self.lambdas_weight = lambdas_weight
 
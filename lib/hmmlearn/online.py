@@ -0,0 +1,379 @@
+"""
+The :mod:`hmmlearn.online` module implements online inference with fitted
+hidden Markov models, on streams of samples fed in chunks.
+"""
+
+import numpy as np
+from sklearn.utils.validation import check_array, check_is_fitted
+
+from . import _hmmc
+
+
+__all__ = ["FixedLagSmoother", "StreamingDecoder"]
+
+
+class StreamingDecoder:
+    """
+    Online Viterbi decoder.
+
+    Samples are fed in chunks of arbitrary sizes with `push`, which returns
+    the states of the most likely state sequence as soon as they are
+    determined, i.e. once the best paths ending in all states at the last
+    sample go through the same state.  As long as the best paths converge
+    within *max_lag* samples, the states returned by successive calls to
+    `push` and by the final `flush` are exactly those found by
+    ``model.decode(X, algorithm="viterbi")`` on the concatenation of the
+    chunks.
+
+    Parameters
+    ----------
+    model : _AbstractHMM
+        A fitted model, which must not be modified while decoding.
+    max_lag : int or None, optional
+        Maximum number of samples whose state may remain pending (1000 by
+        default).  When paths do not converge within that lag, the states of
+        the oldest pending samples are taken from the currently most likely
+        path, and the paths that disagree with them are discarded; the
+        decoded states are then consistent, but may differ from the offline
+        Viterbi path.  The backpointers of the pending samples take
+        ``O((max_lag + chunk_size) * n_components)`` memory, whatever the
+        length of the stream.  If None, the lag, and thus memory use, are
+        unbounded.
+
+    Examples
+    --------
+    >>> decoder = StreamingDecoder(model, max_lag=100)
+    >>> for X_chunk in stream:
+    ...     states = decoder.push(X_chunk)
+    >>> states = decoder.flush()
+    """
+
+    def __init__(self, model, max_lag=1000):
+        check_is_fitted(model, "startprob_")
+        model._check()
+        if max_lag is not None and max_lag < 0:
+            raise ValueError(f"max_lag must be nonnegative, got {max_lag}")
+        self.model = model
+        self.max_lag = max_lag
+        self.reset()
+
+    @property
+    def n_pending(self):
+        """Number of samples pushed whose state was not returned yet."""
+        return self._n_pending
+
+    @property
+    def _backpointers(self):
+        """Backpointers of the pending samples."""
+        return self._buffer[self._offset:self._offset + self._n_pending]
+
+    def reset(self):
+        """Discard all pending samples, and start decoding a new stream."""
+        # Last row of the Viterbi lattice.
+        self._viterbi = None
+        # Backpointers of the pending samples, in rows [offset, offset +
+        # n_pending) of a buffer grown geometrically; the first row points to
+        # the last decided sample.
+        self._buffer = np.empty((0, self.model.n_components), dtype=np.intp)
+        self._offset = self._n_pending = 0
+        # States, at the first pending sample, of the best paths ending in
+        # each state at the last sample; all paths have converged there if
+        # they are all equal.
+        self._roots = None
+
+    def push(self, X):
+        """
+        Feed a chunk of samples to the decoder.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The next samples of the stream.
+
+        Returns
+        -------
+        state_sequence : array, shape (n_decided, )
+            The states of the samples (pushed by this or previous calls) that
+            got decided, in order, possibly none.
+        """
+        X = check_array(X, ensure_min_samples=0)
+        if len(X):
+            log_frameprob = self.model._as_dtype(
+                self.model._compute_log_likelihood(X))
+            self._viterbi, backpointers = _hmmc.viterbi_segment(
+                self.model.startprob_, self.model.transmat_, log_frameprob,
+                self._viterbi, **self.model._get_log_parameters(
+                    self.model.startprob_, self.model.transmat_))
+            self._append(backpointers)
+        n_decided, state, roots = self._find_converged()
+        if (self.max_lag is not None
+                and self.n_pending - n_decided > self.max_lag):
+            n_decided, state = self._force_decision(
+                self.n_pending - self.max_lag)
+            roots = None
+        return self._pop(n_decided, state, roots)
+
+    def flush(self):
+        """
+        Signal the end of the stream, and reset the decoder.
+
+        Returns
+        -------
+        state_sequence : array, shape (n_pending, )
+            The states of all pending samples, taken from the most likely
+            path.
+        """
+        if self.n_pending:
+            state_sequence = self._pop(
+                self.n_pending, np.argmax(self._viterbi))
+        else:
+            state_sequence = np.empty(0, dtype=np.intp)
+        self.reset()
+        return state_sequence
+
+    def _append(self, backpointers):
+        """
+        Append the *backpointers* of new samples to the pending ones, and
+        update the roots of the best paths accordingly.
+        """
+        n_old, n_new = self._n_pending, len(backpointers)
+        stop = self._offset + n_old
+        if stop + n_new > len(self._buffer):
+            # Move the pending rows to the start of the buffer, which is
+            # reallocated (doubling its size) if it is more than half full.
+            pending = self._backpointers
+            if 2 * (n_old + n_new) > len(self._buffer):
+                self._buffer = np.empty(
+                    (2 * (n_old + n_new), self.model.n_components),
+                    dtype=np.intp)
+            self._buffer[:n_old] = pending
+            self._offset, stop = 0, n_old
+        self._buffer[stop:stop + n_new] = backpointers
+        self._n_pending += n_new
+        # Only follow the best paths through the new samples, down to the
+        # previous last sample, whose roots are already known.
+        if n_old:
+            self._roots = self._roots[self._trace(n_old - 1)]
+        else:
+            self._roots = self._trace(0)
+
+    def _trace(self, index):
+        """
+        Return the states, at the *index*-th pending sample, of the best paths
+        ending in each state at the last sample.
+        """
+        backpointers = self._backpointers
+        ancestors = np.arange(self.model.n_components)
+        for t in range(self.n_pending - 1, index, -1):
+            ancestors = backpointers[t, ancestors]
+        return ancestors
+
+    def _find_converged(self):
+        """
+        Return the number of pending samples through which all best paths
+        go, the state of the last one of them, and the roots of the best
+        paths at the next sample (None if it is computed by `_pop`).
+
+        Unless all best paths go through the first pending sample (as
+        tracked when appending samples), no sample needs to be visited.
+        """
+        if not self.n_pending or (self._roots != self._roots[0]).any():
+            return 0, None, None
+        # Find the last sample through which all paths go, at or after the
+        # first pending one.
+        backpointers = self._backpointers
+        ancestors = np.arange(self.model.n_components)
+        roots = None
+        for t in range(self.n_pending - 1, 0, -1):
+            if (ancestors == ancestors[0]).all():
+                return t + 1, ancestors[0], roots
+            roots = ancestors
+            ancestors = backpointers[t, ancestors]
+        return 1, self._roots[0], roots
+
+    def _force_decision(self, n_decided):
+        """
+        Decide the *n_decided* oldest pending samples from the currently
+        most likely path, discarding the paths that disagree with it; return
+        *n_decided* and the state of the last decided sample.
+        """
+        ancestors = self._trace(n_decided - 1)
+        state = ancestors[np.argmax(self._viterbi)]
+        self._viterbi[ancestors != state] = -np.inf
+        return n_decided, state
+
+    def _pop(self, n_decided, state, roots=None):
+        """
+        Trace back the best path from *state* at the *n_decided*-th pending
+        sample, remove the corresponding samples, and return their states.
+
+        The roots of the best paths at the remaining pending samples are set
+        to *roots*, or recomputed if not given.
+        """
+        backpointers = self._backpointers
+        state_sequence = np.empty(n_decided, dtype=np.intp)
+        for t in range(n_decided - 1, -1, -1):
+            state_sequence[t] = state
+            state = backpointers[t, state]
+        if n_decided:
+            self._offset += n_decided
+            self._n_pending -= n_decided
+            if not self._n_pending:
+                self._roots = None
+            elif roots is not None:
+                self._roots = roots
+            else:
+                self._roots = self._trace(0)
+        return state_sequence
+
+
+class FixedLagSmoother:
+    """
+    Online fixed-lag smoother.
+
+    Samples are fed in chunks of arbitrary sizes with `push`, which returns,
+    for each sample ``t`` of the chunk, the posteriors of sample ``t - lag``
+    conditioned on the samples up to ``t``.  Only the forward and frame
+    probabilities of the last *lag* samples are kept, in circular buffers, so
+    that each sample costs ``O(lag * n_components**2)`` and memory use does
+    not depend on the length of the stream.  As for the model's own
+    inference, these probabilities are computed in log space if
+    ``model.implementation == "log"``, and with scaling otherwise.
+
+    Parameters
+    ----------
+    model : _AbstractHMM
+        A fitted model, which must not be modified while smoothing.
+    lag : int
+        Number of samples following each sample which its posteriors are
+        conditioned on.
+
+    Examples
+    --------
+    >>> smoother = FixedLagSmoother(model, lag=10)
+    >>> for X_chunk in stream:
+    ...     posteriors = smoother.push(X_chunk)
+    >>> posteriors = smoother.flush()
+    """
+
+    def __init__(self, model, lag):
+        check_is_fitted(model, "startprob_")
+        model._check()
+        if lag < 0:
+            raise ValueError(f"lag must be nonnegative, got {lag}")
+        self.model = model
+        self.lag = lag
+        self._log = model.implementation == "log"
+        if self._log:
+            with np.errstate(divide="ignore"):
+                self._log_startprob = np.log(model.startprob_)
+                self._log_transmat = np.log(model.transmat_)
+        self.reset()
+
+    @property
+    def n_pending(self):
+        """Number of samples pushed whose posteriors were not returned yet."""
+        return self._n_pending
+
+    def reset(self):
+        """Discard all pending samples, and start smoothing a new stream."""
+        n_components = self.model.n_components
+        # Forward (log-)probabilities of the last sample.
+        self._fwd_last = None
+        # Forward (log-)probabilities and (rescaled, or log) frame
+        # probabilities of the pending samples, in circular buffers, sample
+        # ``t`` of the stream being in row ``t % lag``; the oldest pending
+        # sample is in row *_head*.
+        self._fwdlattice = np.empty((self.lag, n_components))
+        self._frameprob = np.empty((self.lag, n_components))
+        self._head = 0
+        self._n_pending = 0
+
+    def _forward(self, X):
+        """
+        Return the frame (log-)probabilities of *X*, and its forward
+        (log-)probabilities, following those of the samples already pushed.
+        """
+        model = self.model
+        log_frameprob = model._compute_log_likelihood(X)
+        if self._log:
+            _, fwdlattice = _hmmc.forward_log_segment(
+                model.startprob_, model.transmat_, log_frameprob,
+                self._fwd_last, self._log_startprob, self._log_transmat)
+            return log_frameprob, fwdlattice
+        # Rescaling the frame probabilities of each sample leaves the
+        # normalized forward probabilities and the posteriors unchanged,
+        # but avoids underflows.
+        with np.errstate(under="ignore"):
+            frameprob = np.exp(
+                log_frameprob - log_frameprob.max(axis=1, keepdims=True))
+        _, fwdlattice, _ = _hmmc.forward_scaling_segment(
+            model.startprob_, model.transmat_, frameprob, self._fwd_last, 0)
+        return frameprob, fwdlattice
+
+    def _smooth(self, frameprob, fwdlattice, n_out):
+        """
+        Return the posteriors of the first *n_out* samples of the pending
+        samples followed by those of a chunk, given the frame and forward
+        (log-)probabilities of the chunk.
+        """
+        if self._log:
+            return _hmmc.fixed_lag_smoothing_log(
+                self.model.transmat_, self._frameprob, self._fwdlattice,
+                self._head, self._n_pending, frameprob, fwdlattice,
+                self.lag, n_out, self._log_transmat)
+        else:
+            return _hmmc.fixed_lag_smoothing_scaling(
+                self.model.transmat_, self._frameprob, self._fwdlattice,
+                self._head, self._n_pending, frameprob, fwdlattice,
+                self.lag, n_out)
+
+    def push(self, X):
+        """
+        Feed a chunk of samples to the smoother.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            The next samples of the stream.
+
+        Returns
+        -------
+        posteriors : array, shape (n_smoothed, n_components)
+            State-membership probabilities of the samples (pushed by this or
+            previous calls) that are followed by *lag* samples, in order.
+        """
+        X = check_array(X, ensure_min_samples=0)
+        if not len(X):
+            return np.empty((0, self.model.n_components))
+        frameprob, fwdlattice = self._forward(X)
+        self._fwd_last = fwdlattice[-1]
+        n_samples = self._n_pending + len(X)
+        n_out = max(n_samples - self.lag, 0)
+        posteriors = self._smooth(frameprob, fwdlattice, n_out)
+        # Only the last *lag* samples of the chunk are kept, overwriting the
+        # oldest pending samples (whose posteriors were just returned).
+        n_kept = min(len(X), self.lag)
+        if n_kept:
+            rows = (self._head + n_samples - n_kept
+                    + np.arange(n_kept)) % self.lag
+            self._fwdlattice[rows] = fwdlattice[len(X) - n_kept:]
+            self._frameprob[rows] = frameprob[len(X) - n_kept:]
+            self._head = (self._head + n_out) % self.lag
+        self._n_pending = n_samples - n_out
+        return posteriors
+
+    def flush(self):
+        """
+        Signal the end of the stream, and reset the smoother.
+
+        Returns
+        -------
+        posteriors : array, shape (n_pending, n_components)
+            State-membership probabilities of all pending samples,
+            conditioned on all samples of the stream.
+        """
+        empty = np.empty((0, self.model.n_components))
+        posteriors = self._smooth(empty, empty, self._n_pending)
+        self.reset()
+        return posteriors
@@ -2,7 +2,14 @@ import numpy as np
 from scipy import linalg
 
 
-def log_multivariate_normal_density(X, means, covars, covariance_type='diag'):
+# Maximum number of entries of the (n_samples, n_features) and (n_samples,
+# n_components) temporaries used by the diagonal densities, which process
+# the samples in chunks.
+_CHUNK_SIZE = 2 ** 18
+
+
+def log_multivariate_normal_density(X, means, covars, covariance_type='diag',
+                                    out=None):
     """
     Compute the log probability under a multivariate Gaussian distribution.
 
@@ -28,6 +35,9 @@ def log_multivariate_normal_density(X, means, covars, covariance_type='diag'):
     covariance_type : {"spherical", "diag", "full", "tied"}, optional
         The type of the covariance parameters.  Defaults to 'diag'.
 
+    out : array, shape (n_samples, n_components), optional
+        C-contiguous float array into which the result is written.
+
     Returns
     -------
     lpr : array_like, shape (n_samples, n_components)
@@ -40,59 +50,145 @@ def log_multivariate_normal_density(X, means, covars, covariance_type='diag'):
         'diag': _log_multivariate_normal_density_diag,
         'full': _log_multivariate_normal_density_full}
     return log_multivariate_normal_density_dict[covariance_type](
-        X, means, covars
+        X, means, covars, out=out
     )
 
 
-def _log_multivariate_normal_density_diag(X, means, covars):
+def _log_multivariate_normal_density_diag(X, means, covars, out=None):
     """Compute Gaussian log-density at X for a diagonal model."""
     # X: (ns, nf); means: (nc, nf); covars: (nc, nf) -> (ns, nc)
     nc, nf = means.shape
+    ns = len(X)
     # Avoid 0 log 0 = nan in degenerate covariance case.
-    covars = np.maximum(covars, np.finfo(float).tiny)
-    with np.errstate(over="ignore"):
-        return -0.5 * (nf * np.log(2 * np.pi)
-                       + np.log(covars).sum(axis=-1)
-                       + ((X[:, None, :] - means) ** 2 / covars).sum(axis=-1))
-
-
-def _log_multivariate_normal_density_spherical(X, means, covars):
+    tiny = np.finfo(float).tiny
+    degenerate = (np.asarray(covars) <= tiny).any(axis=-1)
+    covars = np.maximum(covars, tiny)
+    if out is None:
+        out = np.empty((ns, nc))
+    # Center the samples and the means on the average mean, so that the
+    # expansion below does not cancel catastrophically for means far from 0.
+    shift = means.mean(axis=0)
+    means = means - shift
+    with np.errstate(over="ignore", invalid="ignore"):
+        precisions = 1 / covars
+        # The squared Mahalanobis distances are expanded as
+        # X**2 @ precisions.T - 2 X @ (means * precisions).T
+        # + (means**2 * precisions).sum(-1), i.e. two matrix products.
+        const = -0.5 * (nf * np.log(2 * np.pi)
+                        + np.log(covars).sum(axis=-1)
+                        + (means ** 2 * precisions).sum(axis=-1))
+        size = max(_CHUNK_SIZE // max(nf, nc), 1)
+        for start in range(0, ns, size):
+            sub_X = X[start:start + size] - shift
+            sub_out = out[start:start + size]
+            np.matmul(sub_X ** 2, -0.5 * precisions.T, out=sub_out)
+            sub_out += sub_X @ (means * precisions).T
+            sub_out += const
+            # With degenerate covariances, the expansion cancels
+            # catastrophically or overflows to inf - inf = nan; use the
+            # direct formula for these states.
+            bad, = (degenerate | np.isnan(sub_out).any(axis=0)).nonzero()
+            if len(bad):
+                sub_out[:, bad] = -0.5 * (
+                    nf * np.log(2 * np.pi)
+                    + np.log(covars[bad]).sum(axis=-1)
+                    + ((sub_X[:, None, :] - means[bad]) ** 2
+                       / covars[bad]).sum(axis=-1))
+    return out
+
+
+def _log_multivariate_normal_density_spherical(X, means, covars, out=None):
     """Compute Gaussian log-density at X for a spherical model."""
     nc, nf = means.shape
     if covars.ndim == 1:
         covars = covars[:, np.newaxis]
     covars = np.broadcast_to(covars, (nc, nf))
-    return _log_multivariate_normal_density_diag(X, means, covars)
+    return _log_multivariate_normal_density_diag(X, means, covars, out=out)
 
 
-def _log_multivariate_normal_density_tied(X, means, covars):
+def _log_multivariate_normal_density_tied(X, means, covars, out=None):
     """Compute Gaussian log-density at X for a tied model."""
     nc, nf = means.shape
-    cv = np.broadcast_to(covars, (nc, nf, nf))
-    return _log_multivariate_normal_density_full(X, means, cv)
+    cv_chol, cv_log_det = _cholesky(covars[np.newaxis])
+    return _log_multivariate_normal_density_cholesky(
+        X, means, cv_chol[0], np.broadcast_to(cv_log_det, (nc,)), out=out)
 
 
-def _log_multivariate_normal_density_full(X, means, covars, min_covar=1.e-7):
+def _log_multivariate_normal_density_full(X, means, covars, min_covar=1.e-7,
+                                          out=None):
     """Log probability for full covariance matrices."""
-    nc, nf = means.shape
-    log_prob = []
-    for c, (mu, cv) in enumerate(zip(means, covars)):
+    return _log_multivariate_normal_density_cholesky(
+        X, means, *_cholesky(covars, min_covar), out=out)
+
+
+def _cholesky(covars, min_covar=1.e-7):
+    """
+    Return the lower Cholesky factors of the covariance matrices *covars*,
+    and their log-determinants.
+    """
+    nc, nf, _ = covars.shape
+    cv_chols = np.empty_like(covars, dtype=float)
+    for c, cv in enumerate(covars):
         try:
-            cv_chol = linalg.cholesky(cv, lower=True)
+            cv_chols[c] = linalg.cholesky(cv, lower=True)
         except linalg.LinAlgError:
             # The model is most probably stuck in a component with too
             # few observations, we need to reinitialize this components
             try:
-                cv_chol = linalg.cholesky(cv + min_covar * np.eye(nf),
-                                          lower=True)
+                cv_chols[c] = linalg.cholesky(cv + min_covar * np.eye(nf),
+                                              lower=True)
             except linalg.LinAlgError:
                 raise ValueError("'covars' must be symmetric, "
                                  "positive-definite")
+    cv_log_dets = 2 * np.sum(
+        np.log(np.diagonal(cv_chols, axis1=1, axis2=2)), axis=1)
+    return cv_chols, cv_log_dets
 
-        cv_log_det = 2 * np.sum(np.log(np.diagonal(cv_chol)))
-        cv_sol = linalg.solve_triangular(cv_chol, (X - mu).T, lower=True).T
-        log_prob.append(-.5 * (nf * np.log(2 * np.pi)
-                               + (cv_sol ** 2).sum(axis=1)
-                               + cv_log_det))
 
-    return np.transpose(log_prob)
+def _log_multivariate_normal_density_cholesky(X, means, cv_chols, cv_log_dets,
+                                              out=None):
+    """
+    Log probability for covariance matrices given by their lower Cholesky
+    factors *cv_chols* and their log-determinants *cv_log_dets*, as
+    returned by `_cholesky`.
+
+    *cv_chols* may also be a single factor, of shape (n_features,
+    n_features), shared by all components (tied covariances), in which case
+    the samples are whitened only once.
+    """
+    nc, nf = means.shape
+    ns = len(X)
+    if out is None:
+        out = np.empty((ns, nc))
+    const = -.5 * (nf * np.log(2 * np.pi) + cv_log_dets)
+    if cv_chols.ndim == 2:
+        # With whitened samples Y and means M, the squared Mahalanobis
+        # distances are |Y|**2 - 2 Y @ M + |M|**2, i.e. a matrix product;
+        # as for diagonal covariances, everything is first centered on the
+        # average mean.
+        shift = means.mean(axis=0)
+        means_sol = linalg.solve_triangular(
+            cv_chols, (means - shift).T, lower=True)
+        const = const - .5 * (means_sol ** 2).sum(axis=0)
+        size = max(_CHUNK_SIZE // max(nf, nc), 1)
+        for start in range(0, ns, size):
+            sub_out = out[start:start + size]
+            cv_sol = linalg.solve_triangular(
+                cv_chols, (X[start:start + size] - shift).T, lower=True).T
+            np.matmul(cv_sol, means_sol, out=sub_out)
+            sub_out -= .5 * (cv_sol ** 2).sum(axis=1)[:, np.newaxis]
+            sub_out += const
+    else:
+        # Whiten the samples, centered on the mean of each component, with
+        # one triangular solve per component, over chunks of samples to
+        # bound the (n_features, chunk) temporaries.
+        size = max(_CHUNK_SIZE // nf, 1)
+        for start in range(0, ns, size):
+            sub_X = X[start:start + size]
+            sub_out = out[start:start + size]
+            for c, (mu, cv_chol) in enumerate(zip(means, cv_chols)):
+                cv_sol = linalg.solve_triangular(
+                    cv_chol, (sub_X - mu).T, lower=True, check_finite=False)
+                sub_out[:, c] = (
+                    -.5 * np.einsum("ij,ij->j", cv_sol, cv_sol) + const[c])
+    return out
@@ -1,10 +1,15 @@
+import tracemalloc
+
 import numpy as np
-from numpy.testing import assert_allclose
+from numpy.testing import assert_allclose, assert_array_equal
 import pytest
-from scipy import special
+from scipy import sparse, special
+from threadpoolctl import threadpool_limits
 
 from hmmlearn.base import BaseHMM, ConvergenceMonitor
-from hmmlearn import _hmmc
+from hmmlearn import _hmmc, hmm
+
+from . import normalized
 
 
 class TestMonitor:
@@ -152,6 +157,477 @@ class TestBaseAgainstWikipedia:
         X, Z = self.hmm.sample(n_samples=10, currstate=Z0[-1])
         assert len(Z0) == len(Z) == 10 and Z[0] == Z0[-1]
 
+    def test_generate_samples_n_sequences(self):
+        X, Z = self.hmm.sample(n_samples=10, currstate=1, n_sequences=50,
+                               random_state=0)
+        assert X.shape == (500, 0) and Z.shape == (500,)
+        assert (Z.reshape(50, 10)[:, 0] == 1).all()
+        # Transitions with zero probability never occur.
+        self.hmm.transmat_ = [[0.5, 0.5], [0., 1.]]
+        _, Z = self.hmm.sample(n_samples=10, n_sequences=50, random_state=0)
+        assert (np.diff(Z.reshape(50, 10), axis=1) >= 0).all()
+
+    def test_generate_sample_from_state_override(self):
+        # Subclasses overriding only the per-sample hook keep using it, even
+        # when deriving from a model generating the samples of each state at
+        # once.
+        class CustomHMM(hmm.GaussianHMM):
+            def _generate_sample_from_state(self, state, random_state):
+                return [state, random_state.rand()]
+
+        h = CustomHMM(2)
+        h.startprob_ = self.hmm.startprob_
+        h.transmat_ = self.hmm.transmat_
+        h.means_ = np.zeros((2, 1))
+        h.covars_ = np.ones((2, 1))
+        X, Z = h.sample(n_samples=20, random_state=0)
+        assert X.shape == (20, 2)
+        assert_array_equal(X[:, 0], Z)
+
+
+class TestBatchedKernels:
+    def setup_method(self, method):
+        n_components = 3
+        self.lengths = [4, 1, 7, 2]
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        prng = np.random.RandomState(0)
+        self.startprob = prng.dirichlet(np.ones(n_components))
+        self.transmat = prng.dirichlet(np.ones(n_components), n_components)
+        self.frameprob = prng.random_sample(
+            (sum(self.lengths), n_components))
+        self.log_frameprob = np.log(self.frameprob)
+
+    def _split(self, a):
+        return np.split(a, self.offsets[1:-1])
+
+    def test_forward_backward_scaling_multi(self):
+        log_probs, fwdlattice, scaling = _hmmc.forward_scaling_multi(
+            self.startprob, self.transmat, self.frameprob, self.offsets)
+        bwdlattice = _hmmc.backward_scaling_multi(
+            self.startprob, self.transmat, self.frameprob, scaling,
+            self.offsets)
+        for k, frameprob in enumerate(self._split(self.frameprob)):
+            log_prob, ref_fwd, ref_scaling = _hmmc.forward_scaling(
+                self.startprob, self.transmat, frameprob)
+            ref_bwd = _hmmc.backward_scaling(
+                self.startprob, self.transmat, frameprob, ref_scaling)
+            assert log_probs[k] == log_prob
+            assert_allclose(self._split(fwdlattice)[k], ref_fwd)
+            assert_allclose(self._split(scaling)[k], ref_scaling)
+            assert_allclose(self._split(bwdlattice)[k], ref_bwd)
+
+    def test_forward_backward_log_multi(self):
+        log_probs, fwdlattice = _hmmc.forward_log_multi(
+            self.startprob, self.transmat, self.log_frameprob, self.offsets)
+        bwdlattice = _hmmc.backward_log_multi(
+            self.startprob, self.transmat, self.log_frameprob, self.offsets)
+        for k, log_frameprob in enumerate(self._split(self.log_frameprob)):
+            log_prob, ref_fwd = _hmmc.forward_log(
+                self.startprob, self.transmat, log_frameprob)
+            ref_bwd = _hmmc.backward_log(
+                self.startprob, self.transmat, log_frameprob)
+            assert log_probs[k] == log_prob
+            assert_allclose(self._split(fwdlattice)[k], ref_fwd)
+            assert_allclose(self._split(bwdlattice)[k], ref_bwd)
+
+    def test_fused_forward_backward_scaling_multi(self):
+        log_probs, posteriors, xi_sum = _hmmc.forward_backward_scaling_multi(
+            self.startprob, self.transmat, self.frameprob, self.offsets, True)
+        ref_xi_sum = np.zeros_like(self.transmat)
+        for k, frameprob in enumerate(self._split(self.frameprob)):
+            log_prob, fwd, scaling = _hmmc.forward_scaling(
+                self.startprob, self.transmat, frameprob)
+            bwd = _hmmc.backward_scaling(
+                self.startprob, self.transmat, frameprob, scaling)
+            assert log_probs[k] == log_prob
+            assert_allclose(self._split(posteriors)[k],
+                            normalized(fwd * bwd, axis=1))
+            ref_xi_sum += _hmmc.compute_scaling_xi_sum(
+                fwd, self.transmat, bwd, frameprob)
+        assert_allclose(xi_sum, ref_xi_sum)
+
+    def test_fused_forward_backward_log_multi(self):
+        log_probs, posteriors, xi_sum = _hmmc.forward_backward_log_multi(
+            self.startprob, self.transmat, self.log_frameprob, self.offsets,
+            True)
+        ref_xi_sum = np.zeros_like(self.transmat)
+        for k, log_frameprob in enumerate(self._split(self.log_frameprob)):
+            log_prob, fwd = _hmmc.forward_log(
+                self.startprob, self.transmat, log_frameprob)
+            bwd = _hmmc.backward_log(
+                self.startprob, self.transmat, log_frameprob)
+            assert log_probs[k] == log_prob
+            assert_allclose(self._split(posteriors)[k],
+                            normalized(np.exp(fwd + bwd), axis=1))
+            ref_xi_sum += np.exp(_hmmc.compute_log_xi_sum(
+                fwd, self.transmat, bwd, log_frameprob))
+        assert_allclose(xi_sum, ref_xi_sum)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_fused_forward_backward_multi_without_xi(self, implementation):
+        kernel = getattr(_hmmc, f"forward_backward_{implementation}_multi")
+        frameprob = {"scaling": self.frameprob,
+                     "log": self.log_frameprob}[implementation]
+        log_probs, posteriors, xi_sum = kernel(
+            self.startprob, self.transmat, frameprob, self.offsets, True)
+        log_probs_no_xi, posteriors_no_xi, xi_sum_no_xi = kernel(
+            self.startprob, self.transmat, frameprob, self.offsets, False)
+        assert_allclose(log_probs_no_xi, log_probs)
+        assert_allclose(posteriors_no_xi, posteriors)
+        assert (xi_sum_no_xi == 0).all()
+
+    def test_precomputed_logs(self):
+        log_params = {"log_startprob": np.log(self.startprob),
+                      "log_transmat": np.log(self.transmat)}
+        for kernel, args in [
+                (_hmmc.forward_log_multi, (self.offsets,)),
+                (_hmmc.backward_log_multi, (self.offsets,)),
+                (_hmmc.forward_backward_log_multi, (self.offsets, True)),
+                (_hmmc.viterbi, ())]:
+            results = kernel(
+                self.startprob, self.transmat, self.log_frameprob, *args)
+            results_precomputed = kernel(
+                self.startprob, self.transmat, self.log_frameprob, *args,
+                **log_params)
+            for result, result_precomputed in zip(
+                    results, results_precomputed):
+                assert_allclose(result_precomputed, result)
+        with pytest.raises(ValueError):
+            _hmmc.forward_log_multi(
+                self.startprob, self.transmat, self.log_frameprob,
+                self.offsets, log_transmat=np.log(self.transmat[:2]))
+
+    def test_log_parameters_cache(self):
+        h = StubHMM(3)
+        h.startprob_ = self.startprob
+        h.transmat_ = self.transmat.copy()
+        h.log_frameprob = self.log_frameprob
+        log_prob = h.score(self.log_frameprob, self.lengths)
+        log_params = h._get_log_parameters(h.startprob_, h.transmat_)
+        assert h._get_log_parameters(h.startprob_, h.transmat_) is log_params
+        # Modifying the parameters in place invalidates the cache.
+        h.transmat_[:] = h.transmat_[::-1]
+        assert h.score(self.log_frameprob, self.lengths) != log_prob
+        assert_allclose(
+            h._get_log_parameters(h.startprob_, h.transmat_)["log_transmat"],
+            np.log(h.transmat_))
+
+    def test_float32_kernels(self):
+        # Lattices and posteriors have the dtype of the frame log
+        # probabilities; the log probabilities and transition posteriors
+        # are always float64.
+        log_frameprob32 = self.log_frameprob.astype(np.float32)
+        f4, f8 = np.float32, np.float64
+        for kernel, args, dtypes in [
+                (_hmmc.forward_log_multi, (self.offsets,), [f8, f4]),
+                (_hmmc.backward_log_multi, (self.offsets,), [f4]),
+                (_hmmc.forward_backward_log_multi, (self.offsets, True),
+                 [f8, f4, f8]),
+                (_hmmc.forward_log_segment, (None,), [f8, f4]),
+                (_hmmc.viterbi, (), [f8, np.intp])]:
+            results = kernel(
+                self.startprob, self.transmat, self.log_frameprob, *args)
+            results32 = kernel(
+                self.startprob, self.transmat, log_frameprob32, *args)
+            if len(dtypes) == 1:
+                results, results32 = [results], [results32]
+            for result, result32, dtype in zip(results, results32, dtypes):
+                assert np.asarray(result32).dtype == dtype
+                assert_allclose(result32, result, rtol=1e-5, atol=1e-5)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_dtype(self, implementation):
+        h = StubHMM(3, implementation=implementation, dtype=np.float32)
+        h.startprob_ = self.startprob
+        h.transmat_ = self.transmat
+        h.log_frameprob = self.log_frameprob
+        if implementation == "scaling":
+            with pytest.raises(ValueError):
+                h.score(self.log_frameprob, self.lengths)
+            return
+        log_prob32, posteriors32 = h.score_samples(
+            self.log_frameprob, self.lengths)
+        h.dtype = np.float64
+        log_prob, posteriors = h.score_samples(
+            self.log_frameprob, self.lengths)
+        assert posteriors32.dtype == np.float32
+        assert_allclose(log_prob32, log_prob, rtol=1e-6)
+        assert_allclose(posteriors32, posteriors, atol=1e-6)
+        h.dtype = np.int32
+        with pytest.raises(ValueError):
+            h.score(self.log_frameprob, self.lengths)
+
+    @pytest.mark.parametrize("offsets", [[0, 4, 4, 14], [0, 13], [1, 14]])
+    def test_invalid_offsets(self, offsets):
+        with pytest.raises(ValueError):
+            _hmmc.forward_log_multi(
+                self.startprob, self.transmat, self.log_frameprob, offsets)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_score_samples_small_blocks(self, implementation, monkeypatch):
+        h = StubHMM(3, implementation=implementation)
+        h.startprob_ = self.startprob
+        h.transmat_ = self.transmat
+        # Look up the frame probabilities by sample index, so that they
+        # are correct for any block of samples.
+        log_frameprob = self.log_frameprob
+        h._compute_log_likelihood = lambda X: log_frameprob[X[:, 0]]
+        X = np.arange(len(log_frameprob))[:, None]
+        log_prob, posteriors = h.score_samples(X, self.lengths)
+        # Force one block per sequence.
+        monkeypatch.setattr("hmmlearn.base._BLOCK_SIZE", 1)
+        log_prob_blocks, posteriors_blocks = h.score_samples(X, self.lengths)
+        assert_allclose(log_prob_blocks, log_prob)
+        assert_allclose(posteriors_blocks, posteriors)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_memory_checkpoint(self, implementation, monkeypatch):
+        # One block per sequence, so that all sequences are checkpointed.
+        monkeypatch.setattr("hmmlearn.base._BLOCK_SIZE", 1)
+        log_frameprob = self.log_frameprob
+        X = np.arange(len(log_frameprob))[:, None]
+        results = []
+        for memory in ["full", "checkpoint"]:
+            h = StubHMM(3, implementation=implementation, memory=memory)
+            h.startprob_ = self.startprob
+            h.transmat_ = self.transmat
+            h._compute_log_likelihood = lambda X: log_frameprob[X[:, 0]]
+            log_prob, posteriors = h.score_samples(X, self.lengths)
+            stats, curr_log_prob, _ = h._do_estep(X, self.lengths)
+            results.append((log_prob, posteriors, curr_log_prob,
+                            stats["start"], stats["trans"]))
+        # Checkpointing gives exactly the same results.
+        for full, checkpoint in zip(*results):
+            assert_array_equal(checkpoint, full)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_memory_checkpoint_peak(self, implementation, monkeypatch):
+        monkeypatch.setattr("hmmlearn.base._BLOCK_SIZE", 1)
+        n_samples, n_components = 40000, 16
+        prng = np.random.RandomState(0)
+        log_frameprob = np.log(prng.rand(n_samples, n_components))
+        X = np.arange(n_samples)[:, None]
+        lattice_size = log_frameprob.nbytes
+        peaks = {}
+        for memory in ["full", "checkpoint"]:
+            h = StubHMM(n_components, implementation=implementation,
+                        memory=memory)
+            h.startprob_ = normalized(prng.rand(n_components))
+            h.transmat_ = normalized(
+                prng.rand(n_components, n_components), axis=1)
+            h._compute_log_likelihood = lambda X: log_frameprob[X[:, 0]]
+            h.params = "st"
+            tracemalloc.start()
+            try:
+                h.score(X)
+                h._do_estep(X, None)
+                peaks[memory] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        # Without checkpoints, the whole lattice is allocated; with them,
+        # only about sqrt(n_samples) rows of it at a time.
+        assert peaks["full"] > lattice_size
+        assert peaks["checkpoint"] < lattice_size / 10
+
+    def test_invalid_memory(self):
+        h = StubHMM(3, memory="none")
+        h.startprob_ = self.startprob
+        h.transmat_ = self.transmat
+        h.log_frameprob = self.log_frameprob
+        with pytest.raises(ValueError):
+            h.score(self.log_frameprob)
+
+
+class TestSparseTransitions:
+    def setup_method(self, method):
+        # A left-right model, whose transitions are mostly zero, so that the
+        # kernels only iterate over the nonzero ones.
+        n_components = 20
+        prng = np.random.RandomState(0)
+        self.startprob = normalized(prng.rand(n_components))
+        self.transmat = normalized(
+            np.triu(prng.rand(n_components, n_components))
+            * np.tri(n_components, k=2), axis=1)
+        self.log_frameprob = np.log(prng.rand(50, n_components))
+        self.frameprob = np.exp(self.log_frameprob)
+
+    def _forward_log(self):
+        with np.errstate(divide="ignore"):
+            log_transmat = np.log(self.transmat)
+            fwd = np.empty_like(self.log_frameprob)
+            fwd[0] = np.log(self.startprob) + self.log_frameprob[0]
+        for t in range(1, len(fwd)):
+            fwd[t] = (special.logsumexp(fwd[t - 1][:, None] + log_transmat,
+                                        axis=0)
+                      + self.log_frameprob[t])
+        return fwd
+
+    def test_forward(self):
+        ref_fwd = self._forward_log()
+        log_prob, fwd = _hmmc.forward_log(
+            self.startprob, self.transmat, self.log_frameprob)
+        assert_allclose(fwd, ref_fwd)
+        assert_allclose(log_prob, special.logsumexp(ref_fwd[-1]))
+        log_prob, fwd, scaling = _hmmc.forward_scaling(
+            self.startprob, self.transmat, self.frameprob)
+        assert_allclose(log_prob, special.logsumexp(ref_fwd[-1]))
+        assert_allclose(fwd, normalized(np.exp(ref_fwd), axis=1))
+
+    def test_posteriors(self):
+        ref_fwd = self._forward_log()
+        log_prob = special.logsumexp(ref_fwd[-1])
+        for implementation in ["scaling", "log"]:
+            h = StubHMM(len(self.startprob), implementation=implementation)
+            h.startprob_ = self.startprob
+            h.transmat_ = self.transmat
+            h.log_frameprob = self.log_frameprob
+            X = np.zeros((len(self.log_frameprob), 1))
+            score, posteriors = h.score_samples(X)
+            assert_allclose(score, log_prob)
+            # The posteriors of the last sample are the filtered ones.
+            assert_allclose(posteriors[-1], np.exp(ref_fwd[-1] - log_prob))
+            stats, _, _ = h._do_estep(X, None)
+            # Transitions which are impossible are never counted.
+            assert (stats["trans"][self.transmat == 0] == 0).all()
+            assert_allclose(stats["trans"].sum(), len(X) - 1)
+
+    def test_viterbi(self):
+        log_prob, state_sequence = _hmmc.viterbi(
+            self.startprob, self.transmat, self.log_frameprob)
+        assert (np.diff(state_sequence) >= 0).all()
+        assert (np.diff(state_sequence) <= 1).all()
+        with np.errstate(divide="ignore"):
+            ref_log_prob = (
+                np.log(self.startprob[state_sequence[0]])
+                + np.log(self.transmat[
+                    state_sequence[:-1], state_sequence[1:]]).sum()
+                + self.log_frameprob[
+                    np.arange(len(state_sequence)), state_sequence].sum())
+        assert_allclose(log_prob, ref_log_prob)
+
+    def test_sparse_transmat(self):
+        h = StubHMM(len(self.startprob))
+        h.startprob_ = self.startprob
+        h.transmat_ = sparse.csr_matrix(self.transmat)
+        h.log_frameprob = self.log_frameprob
+        X = np.zeros((len(self.log_frameprob), 1))
+        assert_allclose(h.score(X),
+                        special.logsumexp(self._forward_log()[-1]))
+        assert_array_equal(h.transmat_, self.transmat)
+
+
+@pytest.mark.parametrize("band", [None, 2])
+def test_log_kernels_extreme_frameprob(band):
+    # Frame log probabilities spanning many orders of magnitude, so that the
+    # forward and backward sums cannot be computed from probabilities shifted
+    # by their row maximum alone.
+    n_components = 12
+    prng = np.random.RandomState(0)
+    startprob = normalized(prng.rand(n_components))
+    transmat = prng.rand(n_components, n_components)
+    if band is not None:
+        transmat *= np.tri(n_components, k=band) * np.tri(
+            n_components, k=band).T
+    transmat = normalized(transmat, axis=1)
+    log_frameprob = np.log(prng.rand(40, n_components)) * 1000
+    with np.errstate(divide="ignore", under="ignore"):
+        log_transmat = np.log(transmat)
+        ref_fwd = np.empty_like(log_frameprob)
+        ref_fwd[0] = np.log(startprob) + log_frameprob[0]
+        for t in range(1, len(ref_fwd)):
+            ref_fwd[t] = special.logsumexp(
+                ref_fwd[t - 1][:, None] + log_transmat, axis=0)
+            ref_fwd[t] += log_frameprob[t]
+        ref_bwd = np.zeros_like(log_frameprob)
+        for t in range(len(ref_bwd) - 2, -1, -1):
+            ref_bwd[t] = special.logsumexp(
+                log_transmat + log_frameprob[t + 1] + ref_bwd[t + 1], axis=1)
+        ref_log_prob = special.logsumexp(ref_fwd[-1])
+        ref_posteriors = np.exp(ref_fwd + ref_bwd - ref_log_prob)
+        ref_xi_sum = np.exp(_hmmc.compute_log_xi_sum(
+            ref_fwd, transmat, ref_bwd, log_frameprob))
+    log_prob, fwd = _hmmc.forward_log(startprob, transmat, log_frameprob)
+    assert_allclose(fwd, ref_fwd)
+    assert_allclose(log_prob, ref_log_prob)
+    assert_allclose(
+        _hmmc.backward_log(startprob, transmat, log_frameprob), ref_bwd)
+    _, posteriors, xi_sum = _hmmc.forward_backward_log_multi(
+        startprob, transmat, log_frameprob, [0, len(log_frameprob)], True)
+    with np.errstate(under="ignore"):
+        assert_allclose(posteriors, ref_posteriors, atol=1e-12)
+        assert_allclose(xi_sum, ref_xi_sum, atol=1e-12)
+
+
+@pytest.mark.parametrize("implementation", ["scaling", "log"])
+@pytest.mark.parametrize("n_components", [256, 600])
+def test_kernels_thread_independent(implementation, n_components):
+    # Enough states for the loops over states to be multithreaded (if the
+    # extension was built with OpenMP support), and split into several (and
+    # partial) blocks of states.
+    prng = np.random.RandomState(0)
+    startprob = prng.dirichlet(np.ones(n_components))
+    transmat = prng.dirichlet(np.ones(n_components), n_components)
+    log_frameprob = np.log(prng.random_sample((20, n_components)))
+    frameprob = {"scaling": np.exp(log_frameprob),
+                 "log": log_frameprob}[implementation]
+    kernel = getattr(_hmmc, f"forward_backward_{implementation}_multi")
+    results = []
+    for n_threads in [1, 3]:
+        with threadpool_limits(limits=n_threads, user_api="openmp"):
+            results.append(kernel(
+                startprob, transmat, frameprob, [0, 10, 20], True))
+            if implementation == "log":
+                results[-1] += _hmmc.viterbi(
+                    startprob, transmat, log_frameprob)
+    for single, multi in zip(*results):
+        assert_array_equal(multi, single)
+
+
+class LegacyStubHMM(StubHMM):
+    """A StubHMM overriding `_fit_*` as in hmmlearn 0.2.8."""
+    def _fit_scaling(self, X):
+        frameprob = self._compute_likelihood(X)
+        log_prob, fwdlattice, scaling_factors = _hmmc.forward_scaling(
+            self.startprob_, self.transmat_, frameprob)
+        bwdlattice = _hmmc.backward_scaling(
+            self.startprob_, self.transmat_, frameprob, scaling_factors)
+        posteriors = self._compute_posteriors_scaling(fwdlattice, bwdlattice)
+        return frameprob, log_prob, posteriors, fwdlattice, bwdlattice
+
+    def _fit_log(self, X):
+        log_frameprob = self._compute_log_likelihood(X)
+        log_prob, fwdlattice = _hmmc.forward_log(
+            self.startprob_, self.transmat_, log_frameprob)
+        bwdlattice = _hmmc.backward_log(
+            self.startprob_, self.transmat_, log_frameprob)
+        posteriors = self._compute_posteriors_log(fwdlattice, bwdlattice)
+        return log_frameprob, log_prob, posteriors, fwdlattice, bwdlattice
+
+
+@pytest.mark.parametrize("implementation", ["scaling", "log"])
+def test_legacy_fit_override(implementation):
+    prng = np.random.RandomState(0)
+    startprob = normalized(prng.rand(3))
+    transmat = normalized(prng.rand(3, 3), axis=1)
+    log_frameprob = np.log(prng.rand(12, 3))
+    models = []
+    for cls in [StubHMM, LegacyStubHMM]:
+        h = cls(3, implementation=implementation)
+        h.startprob_ = startprob
+        h.transmat_ = transmat
+        h.log_frameprob = log_frameprob
+        models.append(h)
+    X = np.zeros((12, 1))
+    stats, log_prob, _ = models[0]._do_estep(X, [12])
+    # The single-sequence overrides still work, and their lattices are
+    # passed to _accumulate_sufficient_statistics, with deprecation
+    # warnings.
+    with pytest.warns(DeprecationWarning):
+        legacy_stats, legacy_log_prob, _ = models[1]._do_estep(X, [12])
+    assert_allclose(legacy_log_prob, log_prob)
+    for key, value in stats.items():
+        assert_allclose(legacy_stats[key], value)
+
 
 class TestBaseConsistentWithGMM:
     def setup_method(self, method):
@@ -1,6 +1,7 @@
 import numpy as np
 from numpy.testing import assert_allclose
 import pytest
+from sklearn.utils import check_random_state
 
 from hmmlearn import hmm
 
@@ -111,6 +112,48 @@ class TestCategoricalHMM:
         assert posteriors.shape == (n_samples, self.n_components)
         assert_allclose(posteriors.sum(axis=1), np.ones(n_samples))
 
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_accumulate_sufficient_statistics(self, implementation):
+        h = self.new_hmm(implementation)
+        X, _ = h.sample(100, random_state=0)
+        _, posteriors = h.score_samples(X)
+        frameprob = h._compute_likelihood(X)
+        assert frameprob.flags.c_contiguous
+        stats = h._initialize_sufficient_statistics()
+        h._accumulate_sufficient_statistics(
+            stats, X, frameprob, posteriors, None, None)
+        expected = np.zeros((self.n_components, self.n_features))
+        np.add.at(expected.T, X[:, 0], posteriors)
+        assert_allclose(stats['obs'], expected)
+        # Symbols are range-checked by the kernel.
+        with pytest.raises(ValueError):
+            h._accumulate_sufficient_statistics(
+                stats, X + self.n_features, frameprob, posteriors, None,
+                None)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_fused_estep(self, implementation):
+        class CustomHMM(hmm.CategoricalHMM):
+            # Overriding a hook of the E-step disables the fused kernels.
+            def _accumulate_sufficient_statistics(self, *args, **kwargs):
+                super()._accumulate_sufficient_statistics(*args, **kwargs)
+
+        h = self.new_hmm(implementation)
+        X, _ = h.sample(100, random_state=0)
+        lengths = [30, 1, 49, 20]
+        # The fused kernels do not gather the frame probabilities.
+        h._compute_likelihood = h._compute_log_likelihood = None
+        stats, log_prob, _ = h._do_estep(X, lengths)
+        custom = CustomHMM(self.n_components, implementation=implementation)
+        custom.set_params(**h.get_params())
+        custom.startprob_ = h.startprob_
+        custom.transmat_ = h.transmat_
+        custom.emissionprob_ = h.emissionprob_
+        expected, expected_log_prob, _ = custom._do_estep(X, lengths)
+        assert_allclose(log_prob, expected_log_prob)
+        for key, value in expected.items():
+            assert_allclose(stats[key], value, err_msg=key)
+
     @pytest.mark.parametrize("implementation", ["scaling", "log"])
     def test_sample(self, implementation, n_samples=1000):
         h = self.new_hmm(implementation)
@@ -156,6 +199,25 @@ class TestCategoricalHMM:
 
         assert_log_likelihood_increasing(h, X, lengths, n_iter)
 
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_partial_fit(self, implementation):
+        h = self.new_hmm(implementation)
+        random_state = check_random_state(0)
+        X_test, _ = h.sample(2000, random_state=random_state)
+
+        def batches(n_batches=30):
+            for _ in range(n_batches):
+                X, _ = h.sample(100, random_state=random_state)
+                yield X
+
+        model = hmm.CategoricalHMM(self.n_components, random_state=0,
+                                   implementation=implementation)
+        log_probs = [model.partial_fit(X, [50, 50]).score(X_test)
+                     for X in batches()]
+        assert model.n_batch_iter_ == 30
+        assert log_probs[-1] > log_probs[0]
+        assert log_probs[-1] > 1.02 * h.score(X_test)
+
     @pytest.mark.parametrize("implementation", ["scaling", "log"])
     def test__check_and_set_categorical_n_features(self, implementation):
         h = self.new_hmm(implementation)
@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+import pytest
+from sklearn.exceptions import NotFittedError
+
+from hmmlearn import hmm, vhmm
+from hmmlearn.compiled import CompiledHMM
+
+from . import make_covar_matrix, normalized
+
+
+def new_gaussian_hmm(covariance_type, implementation, prng):
+    h = hmm.GaussianHMM(3, covariance_type=covariance_type,
+                        implementation=implementation)
+    h.startprob_ = normalized(prng.rand(3))
+    h.transmat_ = normalized(prng.rand(3, 3) + 2 * np.eye(3), axis=1)
+    h.means_ = prng.randint(-10, 10, (3, 2))
+    h.covars_ = make_covar_matrix(covariance_type, 3, 2, random_state=prng)
+    return h
+
+
+def new_categorical_hmm(implementation, prng):
+    h = hmm.CategoricalHMM(3, implementation=implementation)
+    h.startprob_ = normalized(prng.rand(3))
+    h.transmat_ = normalized(prng.rand(3, 3), axis=1)
+    h.emissionprob_ = normalized(prng.rand(3, 4), axis=1)
+    return h
+
+
+def assert_same_inference(h, compiled, X, lengths):
+    assert_allclose(compiled.score(X, lengths), h.score(X, lengths))
+    for a, b in zip(compiled.score_samples(X, lengths),
+                    h.score_samples(X, lengths)):
+        assert_allclose(a, b)
+    assert_allclose(compiled.predict_proba(X, lengths),
+                    h.predict_proba(X, lengths))
+    for algorithm in ["viterbi", "map"]:
+        log_probs, state_sequence = compiled.decode(
+            X, lengths, algorithm=algorithm, per_sequence=True)
+        ref_log_probs, ref_state_sequence = h.decode(
+            X, lengths, algorithm=algorithm, per_sequence=True)
+        assert_allclose(log_probs, ref_log_probs)
+        assert_array_equal(state_sequence, ref_state_sequence)
+    assert_array_equal(compiled.predict(X, lengths), h.predict(X, lengths))
+
+
+@pytest.mark.parametrize("implementation", ["scaling", "log"])
+@pytest.mark.parametrize("covariance_type",
+                         ["spherical", "diag", "full", "tied"])
+def test_compiled_gaussian(covariance_type, implementation):
+    prng = np.random.RandomState(0)
+    h = new_gaussian_hmm(covariance_type, implementation, prng)
+    X, _ = h.sample(50, random_state=prng)
+    compiled = h.compile()
+    assert isinstance(compiled, CompiledHMM)
+    assert compiled.n_components == 3
+    assert_same_inference(h, compiled, X, None)
+    assert_same_inference(h, compiled, X, [20, 1, 29])
+    # Inputs that are not numeric matrices are still validated.
+    assert_allclose(compiled.score(X.tolist()), h.score(X))
+    with pytest.raises(ValueError):
+        compiled.score(X[:, 0])
+    with pytest.raises(ValueError):
+        compiled.score(X, [20, 20])
+
+
+@pytest.mark.parametrize("implementation", ["scaling", "log"])
+def test_compiled_categorical(implementation):
+    prng = np.random.RandomState(0)
+    h = new_categorical_hmm(implementation, prng)
+    X, _ = h.sample(50, random_state=prng)
+    assert_same_inference(h, h.compile(), X, [10, 40])
+
+
+def test_compiled_variational():
+    prng = np.random.RandomState(0)
+    X, _ = new_gaussian_hmm("full", "log", prng).sample(
+        200, random_state=prng)
+    h = vhmm.VariationalGaussianHMM(
+        3, covariance_type="full", n_iter=5, random_state=0).fit(X)
+    assert_same_inference(h, h.compile(), X, [100, 100])
+
+
+def test_compiled_frozen():
+    prng = np.random.RandomState(0)
+    h = new_gaussian_hmm("full", "log", prng)
+    X, _ = h.sample(50, random_state=prng)
+    log_prob = h.score(X)
+    compiled = h.compile()
+    # Later changes to the model do not affect the compiled model.
+    h.means_ = h.means_ + 1
+    h.transmat_[:] = 1 / 3
+    assert h.score(X) != log_prob
+    assert compiled.score(X) == log_prob
+    with pytest.raises(ValueError):  # The parameters are read-only.
+        compiled._model.transmat_[:] = 1 / 3
+    with pytest.raises(AttributeError):
+        compiled.n_components = 4
+
+
+def test_compile_validates():
+    h = hmm.GaussianHMM(3)
+    with pytest.raises(NotFittedError):
+        h.compile()
+    h = new_gaussian_hmm("diag", "log", np.random.RandomState(0))
+    h.startprob_ = np.full(3, .5)
+    with pytest.raises(ValueError):
+        h.compile()
+
+
+@pytest.mark.parametrize("implementation", ["scaling", "log"])
+def test_compiled_concurrent(implementation):
+    prng = np.random.RandomState(0)
+    h = new_gaussian_hmm("full", implementation, prng)
+    Xs = [h.sample(prng.randint(1, 200), random_state=prng)[0]
+          for _ in range(50)]
+    compiled = h.compile()
+    state = dict(vars(compiled._model))
+
+    def infer(X):
+        return (compiled.score(X), compiled.predict_proba(X),
+                compiled.decode(X, algorithm="viterbi"),
+                compiled.decode(X, algorithm="map"))
+
+    expected = [infer(X) for X in Xs]
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(infer, Xs * 4))
+    for result, ref in zip(results, expected * 4):
+        assert result[0] == ref[0]
+        assert_array_equal(result[1], ref[1])
+        for (log_prob, states), (ref_log_prob, ref_states) in zip(
+                result[2:], ref[2:]):
+            assert log_prob == ref_log_prob
+            assert_array_equal(states, ref_states)
+    # Inference did not set any attribute.
+    assert vars(compiled._model).keys() == state.keys()
+    assert all(value is state[key]
+               for key, value in vars(compiled._model).items())
@@ -1,3 +1,5 @@
+import copy
+
 import numpy as np
 from numpy.testing import assert_allclose
 import pytest
@@ -71,6 +73,26 @@ class GaussianHMMTestMixin:
         assert X.shape == (n, self.n_features)
         assert len(state_sequence) == n
 
+    def test_sample_n_sequences(self, n=1000, n_sequences=5):
+        h = hmm.GaussianHMM(self.n_components, self.covariance_type)
+        h.startprob_ = self.startprob
+        h.transmat_ = self.transmat
+        h.means_ = 20 * self.means
+        h.covars_ = np.maximum(self.covars, 0.1)
+
+        X, state_sequence = h.sample(
+            n, random_state=self.prng, n_sequences=n_sequences)
+        assert X.shape == (n * n_sequences, self.n_features)
+        assert state_sequence.shape == (n * n_sequences,)
+        # The samples of each state follow its emission distribution.
+        for state in range(self.n_components):
+            sub_X = X[state_sequence == state]
+            covars = h.covars_[state]
+            scale = np.sqrt(covars.diagonal().max())
+            assert_allclose(sub_X.mean(axis=0), h.means_[state],
+                            atol=0.2 * scale)
+            assert_allclose(np.cov(sub_X.T), covars, atol=0.2 * scale ** 2)
+
     @pytest.mark.parametrize("implementation", ["scaling", "log"])
     def test_fit(self, implementation, params='stmc', n_iter=5, **kwargs):
         h = hmm.GaussianHMM(self.n_components, self.covariance_type,
@@ -150,6 +172,253 @@ class GaussianHMMTestMixin:
         # ValueError: setting an array element with a sequence.
         h.fit(X, lengths=lengths)
 
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_fit_n_jobs(self, implementation):
+        lengths = [10, 8, 1, 12, 6]
+        X = self.prng.rand(sum(lengths), self.n_features)
+
+        h1 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0, implementation=implementation)
+        h2 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0, implementation=implementation,
+                             n_jobs=2)
+        h1.fit(X, lengths=lengths)
+        h2.fit(X, lengths=lengths)
+        assert_allclose(h1.monitor_.history, h2.monitor_.history)
+        assert_allclose(h1.transmat_, h2.transmat_)
+        assert_allclose(h1.means_, h2.means_)
+        assert_allclose(h1.covars_, h2.covars_)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    @pytest.mark.parametrize("algorithm", ["viterbi", "map"])
+    def test_decode_n_jobs(self, implementation, algorithm):
+        lengths = [10, 8, 1, 12, 6]
+        X = self.prng.rand(sum(lengths), self.n_features)
+        h = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                            random_state=0, implementation=implementation,
+                            algorithm=algorithm)
+        h.fit(X, lengths=lengths)
+
+        log_probs, state_sequence = h.decode(X, lengths, per_sequence=True)
+        assert log_probs.shape == (len(lengths),)
+        for sub_X, log_prob, sub_state_sequence in zip(
+                np.split(X, np.cumsum(lengths)[:-1]), log_probs,
+                np.split(state_sequence, np.cumsum(lengths)[:-1])):
+            expected_log_prob, expected_state_sequence = h.decode(sub_X)
+            assert_allclose(log_prob, expected_log_prob)
+            assert_allclose(sub_state_sequence, expected_state_sequence)
+        assert_allclose(h.decode(X, lengths)[0], log_probs.sum())
+
+        h.n_jobs = 2
+        log_probs_n_jobs, state_sequence_n_jobs = h.decode(
+            X, lengths, per_sequence=True)
+        assert_allclose(log_probs_n_jobs, log_probs)
+        assert_allclose(state_sequence_n_jobs, state_sequence)
+        assert_allclose(h.predict(X, lengths), state_sequence)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_memory_checkpoint(self, implementation, monkeypatch):
+        # Force checkpointing for all sequences of more than 4 samples.
+        monkeypatch.setattr(
+            "hmmlearn.base._BLOCK_SIZE", 4 * self.n_components)
+        lengths = [30, 3, 17]
+        X = self.prng.rand(sum(lengths), self.n_features)
+
+        h1 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0, implementation=implementation)
+        h2 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0, implementation=implementation,
+                             memory="checkpoint")
+        h1.fit(X, lengths=lengths)
+        h2.fit(X, lengths=lengths)
+        assert_allclose(h1.monitor_.history, h2.monitor_.history)
+        assert_allclose(h1.transmat_, h2.transmat_)
+        assert_allclose(h1.means_, h2.means_)
+        assert_allclose(h1.covars_, h2.covars_)
+
+        log_prob1, posteriors1 = h1.score_samples(X, lengths)
+        log_prob2, posteriors2 = h2.score_samples(X, lengths)
+        assert_allclose(log_prob1, log_prob2)
+        assert_allclose(posteriors1, posteriors2)
+        assert_allclose(h1.score(X, lengths), h2.score(X, lengths))
+
+    def test_fit_float32(self):
+        lengths = [30, 3, 17]
+        X = self.prng.rand(sum(lengths), self.n_features)
+        h1 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0)
+        h2 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0, dtype=np.float32)
+        h1.fit(X, lengths=lengths)
+        h2.fit(X, lengths=lengths)
+        assert_allclose(h1.monitor_.history, h2.monitor_.history, rtol=1e-5)
+        assert_allclose(h1.means_, h2.means_, rtol=1e-3)
+
+        log_prob1, posteriors1 = h1.score_samples(X, lengths)
+        log_prob2, posteriors2 = h2.score_samples(X, lengths)
+        assert posteriors2.dtype == np.float32
+        assert_allclose(log_prob1, log_prob2, rtol=1e-5)
+        assert_allclose(posteriors1, posteriors2, atol=1e-3)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_fit_out_of_core(self, implementation, tmp_path):
+        lengths = [10, 8, 1, 12, 6]
+        X = self.prng.rand(sum(lengths), self.n_features)
+        np.save(tmp_path / "X.npy", X)
+        X_mmap = np.load(tmp_path / "X.npy", mmap_mode="r")
+
+        def batches():
+            yield X_mmap[:18], lengths[:2]
+            yield X_mmap[18:], lengths[2:]
+
+        h1 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0, implementation=implementation)
+        h1.fit(X, lengths=lengths)
+        h2 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0, implementation=implementation)
+        h2.fit(X_mmap, lengths=lengths)
+        assert_allclose(h1.monitor_.history, h2.monitor_.history)
+        assert_allclose(h1.means_, h2.means_)
+        assert_allclose(h1.covars_, h2.covars_)
+
+        # Fitting on batches only initializes from the first batch; start
+        # both models from the initialization on the whole data instead.
+        h0 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0, implementation=implementation)
+        h0._init(X, lengths)
+        h0.init_params = ""
+        h3 = copy.deepcopy(h0)
+        h4 = copy.deepcopy(h0)
+        h3.fit(X, lengths=lengths)
+        h4.fit(batches)
+        assert_allclose(h3.monitor_.history, h4.monitor_.history)
+        assert_allclose(h3.transmat_, h4.transmat_)
+        assert_allclose(h3.means_, h4.means_)
+        assert_allclose(h3.covars_, h4.covars_)
+        assert_allclose(h3.score(X, lengths), h4.score(batches))
+        with pytest.raises(ValueError):
+            h4.fit(batches, lengths)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_partial_fit(self, implementation):
+        lengths = [10, 8, 1, 12, 6]
+        X = self.prng.rand(sum(lengths), self.n_features)
+
+        # Without decay, each call is an EM iteration on the batch.
+        h1 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             n_iter=5, tol=-np.inf, random_state=0,
+                             implementation=implementation)
+        h2 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             learning_decay=0, random_state=0,
+                             implementation=implementation)
+        h1.fit(X, lengths=lengths)
+        for _ in range(5):
+            h2.partial_fit(X, lengths=lengths)
+        assert h2.n_batch_iter_ == 5
+        assert_allclose(h1.startprob_, h2.startprob_)
+        assert_allclose(h1.transmat_, h2.transmat_)
+        assert_allclose(h1.means_, h2.means_)
+        assert_allclose(h1.covars_, h2.covars_)
+
+    def _assert_partial_fit_continues(self, h, X, lengths):
+        # partial_fit on a fitted model, without blending, runs one EM
+        # iteration from the fitted parameters.
+        h_ref = copy.deepcopy(h)
+        h_ref.init_params = ""
+        h_ref.n_iter = 1
+        h_ref.fit(X, lengths)
+        h.learning_decay = 0
+        h.partial_fit(X, lengths)
+        assert h.n_batch_iter_ == 1
+        assert_allclose(h.startprob_, h_ref.startprob_)
+        assert_allclose(h.transmat_, h_ref.transmat_)
+        assert_allclose(h.means_, h_ref.means_)
+        assert_allclose(h.covars_, h_ref.covars_)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_partial_fit_after_fit(self, implementation):
+        lengths = [10, 8, 1, 12, 6]
+        X = self.prng.rand(sum(lengths), self.n_features)
+        h = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                            n_iter=5, random_state=0,
+                            implementation=implementation)
+        h.fit(X, lengths)
+        self._assert_partial_fit_continues(h, X, lengths)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_partial_fit_after_fit_keeps_fit(self, implementation):
+        h = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                            init_params="")
+        h.startprob_ = self.startprob
+        h.transmat_ = self.transmat
+        h.means_ = 20 * self.means
+        h.covars_ = self.covars
+        X, _ = h.sample(500, random_state=self.prng)
+        h.implementation = implementation
+        h.fit(X)
+        means = h.means_.copy()
+        # A small batch barely moves the fitted means (rather than refitting
+        # them to that batch alone, which misses some states).
+        h.partial_fit(X[:5])
+        assert_allclose(h.means_, means, atol=1)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_partial_fit_batch_size(self, implementation):
+        # The statistics are blended per sample, so that repeating a batch
+        # (i.e., doubling its size) leaves the result unchanged, up to the
+        # covariance prior.
+        lengths = [10, 8, 1, 12, 6]
+        A = self.prng.rand(sum(lengths), self.n_features)
+        B = self.prng.rand(sum(lengths), self.n_features)
+        h1 = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                             random_state=0, implementation=implementation)
+        h2 = copy.deepcopy(h1)
+        h1.partial_fit(A, lengths)
+        h1.partial_fit(B, lengths)
+        h2.partial_fit(A, lengths)
+        h2.partial_fit(np.concatenate([B, B]), lengths + lengths)
+        assert_allclose(h1.startprob_, h2.startprob_)
+        assert_allclose(h1.transmat_, h2.transmat_)
+        assert_allclose(h1.means_, h2.means_)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_fit_resets_partial_fit(self, implementation):
+        lengths = [10, 8, 1, 12, 6]
+        A = self.prng.rand(sum(lengths), self.n_features)
+        B = self.prng.rand(sum(lengths), self.n_features) + 100
+        h = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                            n_iter=5, random_state=0,
+                            implementation=implementation)
+        h.partial_fit(A, lengths)
+        h.partial_fit(A, lengths)
+        h.fit(B, lengths)
+        assert not hasattr(h, "n_batch_iter_")
+        # The statistics of A are not blended into those of B.
+        self._assert_partial_fit_continues(h, B, lengths)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_filter(self, implementation):
+        h = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                            implementation=implementation)
+        h.startprob_ = self.startprob
+        h.transmat_ = self.transmat
+        h.means_ = self.means
+        h.covars_ = self.covars
+        X, _ = h.sample(50, random_state=self.prng)
+
+        h.filter_init()
+        log_probs, filtered = zip(*[
+            h.filter_update(X_chunk)
+            for X_chunk in np.split(X, [1, 1, 10, 30, 31])])
+        filtered = np.concatenate(filtered)
+        assert_allclose(sum(log_probs), h.score(X))
+        assert_allclose(filtered.sum(axis=1), 1)
+        # The filtered probabilities are the posteriors of the last sample
+        # of each prefix.
+        for t in [0, 9, 30, 49]:
+            assert_allclose(filtered[t], h.predict_proba(X[:t + 1])[-1],
+                            rtol=1e-6, atol=1e-12)
+
     @pytest.mark.parametrize("implementation", ["scaling", "log"])
     def test_fit_with_length_one_signal(self, implementation):
         lengths = [10, 8, 1]
@@ -341,9 +610,36 @@ class TestGaussianHMMWithDiagonalCovars(GaussianHMMTestMixin):
         assert np.isfinite(score)
 
 
-class TestGaussianHMMWithTiedCovars(GaussianHMMTestMixin):
+class CholeskyCacheTestMixin:
+    def test_covars_cholesky_cache(self):
+        h = hmm.GaussianHMM(self.n_components, self.covariance_type,
+                            init_params="")
+        h.startprob_ = self.startprob
+        h.transmat_ = self.transmat
+        h.means_ = self.means
+        h.covars_ = self.covars
+        X, _ = h.sample(200, random_state=self.prng)
+        log_prob = h.score(X)
+        factors = h._get_covars_cholesky()
+        assert h._get_covars_cholesky() is factors
+        cv_chols, cv_log_dets = factors
+        assert_allclose(cv_chols @ np.swapaxes(cv_chols, 1, 2), h.covars_)
+        assert_allclose(cv_log_dets, np.linalg.slogdet(h.covars_)[1])
+        # Assigning, or refitting, the covariances invalidates the cache.
+        h.covars_ = 2 * self.covars
+        assert h._get_covars_cholesky() is not factors
+        assert h.score(X) != log_prob
+        with np.errstate(under="ignore"):
+            h.fit(X)
+        assert_allclose(h._get_covars_cholesky()[1],
+                        np.linalg.slogdet(h.covars_)[1])
+
+
+class TestGaussianHMMWithTiedCovars(GaussianHMMTestMixin,
+                                   CholeskyCacheTestMixin):
     covariance_type = 'tied'
 
 
-class TestGaussianHMMWithFullCovars(GaussianHMMTestMixin):
+class TestGaussianHMMWithFullCovars(GaussianHMMTestMixin,
+                                   CholeskyCacheTestMixin):
     covariance_type = 'full'
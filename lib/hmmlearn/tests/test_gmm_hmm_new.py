@@ -177,6 +177,51 @@ class GMMHMMTestMixin:
         h = self.new_hmm(implementation)
         h.fit(X)
 
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    @pytest.mark.parametrize("estep", [False, True])
+    @pytest.mark.parametrize("spread", [1, 1e5])
+    def test_accumulate_sufficient_statistics(
+            self, implementation, estep, spread):
+        h = self.new_hmm(implementation)
+        # With means far apart (relative to the covariances), the covariance
+        # statistics must not cancel.
+        h.means_ = h.means_ * spread
+        X, _ = h.sample(50, random_state=0)
+        framelogprob = h._compute_log_likelihood(X)
+        _, posteriors = h.score_samples(X)
+        stats = h._initialize_sufficient_statistics()
+        # As in the E-step, the mixture posteriors may be passed along.
+        kwargs = {}
+        if estep:
+            _, estep_kwargs = h._compute_estep_likelihood(X)
+            kwargs = {key: value[10:] for key, value in estep_kwargs.items()}
+        h._accumulate_sufficient_statistics(
+            stats, X[10:], framelogprob[10:], posteriors[10:], None, None,
+            **kwargs)
+
+        # Direct computation, state by state.
+        with np.errstate(under="ignore"):
+            post_comp_mix = np.stack([
+                normalized(np.exp(
+                    h._compute_log_weighted_gaussian_densities(X[10:], i)),
+                    axis=1)
+                for i in range(self.n_components)], axis=1)
+            post_comp_mix *= posteriors[10:, :, None]
+        assert_allclose(stats['post_mix_sum'], post_comp_mix.sum(axis=0))
+        assert_allclose(
+            stats['m_n'] - h.means_weight[:, :, None] * h.means_prior,
+            np.einsum('ijk,il->jkl', post_comp_mix, X[10:]))
+        centered = X[10:, None, None, :] - h.means_
+        outer = centered[..., :, None] * centered[..., None, :]
+        c_n = {
+            'spherical': np.einsum('ijk,ijkl->jk', post_comp_mix,
+                                   centered ** 2),
+            'diag': np.einsum('ijk,ijkl->jkl', post_comp_mix, centered ** 2),
+            'full': np.einsum('ijk,ijklm->jklm', post_comp_mix, outer),
+            'tied': np.einsum('ijk,ijklm->jlm', post_comp_mix, outer),
+        }[self.covariance_type]
+        assert_allclose(stats['c_n'], c_n)
+
     @pytest.mark.parametrize("implementation", ["scaling", "log"])
     def test_criterion(self, implementation):
         random_state = check_random_state(2013)
@@ -1,6 +1,7 @@
 import numpy as np
 from numpy.testing import assert_allclose
 import pytest
+from scipy.stats import multinomial
 
 from hmmlearn import hmm
 
@@ -54,6 +55,22 @@ class TestMultinomialHMM:
         assert posteriors.shape == (n_samples, self.n_components)
         assert_allclose(posteriors.sum(axis=1), np.ones(n_samples))
 
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_compute_log_likelihood(self, implementation):
+        h = self.new_hmm(implementation)
+        h.emissionprob_ = np.array([[.5, .5, 0, 0], [.1, .1, .4, .4]])
+        X, _ = h.sample(100, random_state=0)
+        expected = np.stack([
+            multinomial.logpmf(X, self.n_trials, emissionprob)
+            for emissionprob in h.emissionprob_], axis=1)
+        assert np.isinf(expected).any()
+        assert_allclose(h._compute_log_likelihood(X), expected)
+        # Negative counts are impossible, even if they sum to n_trials.
+        X[0] = [self.n_trials + 1, -1, 0, 0]
+        expected[0] = -np.inf
+        assert_allclose(h._compute_log_likelihood(X), expected)
+        assert (h._compute_log_likelihood(-X) == -np.inf).all()
+
     @pytest.mark.parametrize("implementation", ["scaling", "log"])
     def test_sample(self, implementation, n_samples=1000):
         h = self.new_hmm(implementation)
@@ -0,0 +1,195 @@
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+import pytest
+
+from hmmlearn import _hmmc, hmm
+from hmmlearn.online import FixedLagSmoother, StreamingDecoder
+
+from . import normalized
+
+
+def new_gaussian_hmm(prng):
+    h = hmm.GaussianHMM(4, covariance_type="diag")
+    h.startprob_ = normalized(prng.rand(4))
+    h.transmat_ = normalized(prng.rand(4, 4) + 2 * np.eye(4), axis=1)
+    h.means_ = prng.randint(-10, 10, (4, 2))
+    h.covars_ = 4 * (1 + prng.rand(4, 2))
+    return h
+
+
+def push_chunks(decoder, X, prng):
+    bounds = np.sort(prng.randint(0, len(X) + 1, 20))
+    states = [decoder.push(X_chunk) for X_chunk in np.split(X, bounds)]
+    states.append(decoder.flush())
+    return np.concatenate(states)
+
+
+class TestStreamingDecoder:
+
+    def setup_method(self, method):
+        self.prng = np.random.RandomState(0)
+        self.h = new_gaussian_hmm(self.prng)
+        self.X, _ = self.h.sample(500, random_state=self.prng)
+
+    def test_viterbi_segment(self):
+        log_frameprob = self.h._compute_log_likelihood(self.X)
+        log_prob, state_sequence = _hmmc.viterbi(
+            self.h.startprob_, self.h.transmat_, log_frameprob)
+        viterbi = None
+        backpointers = []
+        for lfp in np.array_split(log_frameprob, 7):
+            viterbi, bp = _hmmc.viterbi_segment(
+                self.h.startprob_, self.h.transmat_, lfp, viterbi)
+            backpointers.append(bp)
+        backpointers = np.concatenate(backpointers)
+        assert_allclose(viterbi.max(), log_prob)
+        assert_array_equal(backpointers[0], -1)
+        state = state_sequence[-1]
+        for t in range(len(self.X) - 1, 0, -1):
+            state = backpointers[t, state]
+            assert state == state_sequence[t - 1]
+
+    def test_push(self):
+        _, state_sequence = self.h.decode(self.X)
+        decoder = StreamingDecoder(self.h)
+        for _ in range(3):  # Decoders are reusable after flush().
+            assert_array_equal(
+                push_chunks(decoder, self.X, self.prng), state_sequence)
+
+    def test_push_categorical(self):
+        h = hmm.CategoricalHMM(3)
+        h.startprob_ = normalized(self.prng.rand(3))
+        h.transmat_ = normalized(self.prng.rand(3, 3), axis=1)
+        h.emissionprob_ = normalized(self.prng.rand(3, 5), axis=1)
+        X, _ = h.sample(300, random_state=self.prng)
+        _, state_sequence = h.decode(X)
+        assert_array_equal(
+            push_chunks(StreamingDecoder(h), X, self.prng), state_sequence)
+
+    def test_push_decides_early(self):
+        decoder = StreamingDecoder(self.h)
+        n_decided = sum(len(decoder.push(X_chunk))
+                        for X_chunk in np.array_split(self.X, 50))
+        assert n_decided + decoder.n_pending == len(self.X)
+        assert decoder.n_pending < len(self.X) // 10
+
+    def test_push_never_converging(self):
+        # Without transitions between states, the best paths never converge,
+        # so that all samples stay pending; pushing them one at a time must
+        # not rescan all pending samples each time.
+        h = hmm.GaussianHMM(3, covariance_type="diag")
+        h.startprob_ = np.array([.5, .3, .2])
+        h.transmat_ = np.eye(3)
+        h.means_ = np.zeros((3, 1))
+        h.covars_ = np.ones((3, 1))
+        X = self.prng.randn(5000, 1)
+        decoder = StreamingDecoder(h, max_lag=None)
+        for x in X:
+            assert not len(decoder.push(x[None]))
+        assert decoder.n_pending == len(X)
+        assert_array_equal(decoder.flush(), h.decode(X)[1])
+
+    def test_push_bounded_memory(self):
+        # By default, the lag, and thus the backpointer buffer, are bounded
+        # even if the best paths never converge.
+        h = hmm.GaussianHMM(3, covariance_type="diag")
+        h.startprob_ = np.array([.5, .3, .2])
+        h.transmat_ = np.eye(3)
+        h.means_ = np.zeros((3, 1))
+        h.covars_ = np.ones((3, 1))
+        decoder = StreamingDecoder(h)
+        n_decided = 0
+        for X_chunk in np.array_split(self.prng.randn(5000, 1), 500):
+            n_decided += len(decoder.push(X_chunk))
+            assert decoder.n_pending <= decoder.max_lag
+            assert len(decoder._buffer) <= 2 * (decoder.max_lag + 10)
+        assert n_decided + decoder.n_pending == 5000
+
+    def test_push_float32(self):
+        h = new_gaussian_hmm(self.prng)
+        h.dtype = np.float32
+        _, state_sequence = h.decode(self.X)
+        assert_array_equal(
+            push_chunks(StreamingDecoder(h), self.X, self.prng),
+            state_sequence)
+
+    @pytest.mark.parametrize("max_lag", [0, 1, 5])
+    def test_max_lag(self, max_lag):
+        decoder = StreamingDecoder(self.h, max_lag=max_lag)
+        states = []
+        for X_chunk in np.array_split(self.X, 100):
+            states.append(decoder.push(X_chunk))
+            assert decoder.n_pending <= max_lag
+        states.append(decoder.flush())
+        state_sequence = np.concatenate(states)
+        assert len(state_sequence) == len(self.X)
+        # The decoded path must be feasible.
+        log_frameprob = self.h._compute_log_likelihood(self.X)
+        assert np.isfinite(
+            log_frameprob[np.arange(len(self.X)), state_sequence]).all()
+        assert (self.h.transmat_[
+            state_sequence[:-1], state_sequence[1:]] > 0).all()
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            StreamingDecoder(self.h, max_lag=-1)
+        with pytest.raises(ValueError):
+            _hmmc.viterbi_segment(
+                self.h.startprob_, self.h.transmat_, np.empty((0, 4)), None)
+
+
+class TestFixedLagSmoother:
+
+    def setup_method(self, method):
+        self.prng = np.random.RandomState(0)
+        self.h = new_gaussian_hmm(self.prng)
+        self.X, _ = self.h.sample(60, random_state=self.prng)
+
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    @pytest.mark.parametrize("lag", [0, 1, 7, 100])
+    def test_push(self, lag, implementation):
+        self.h.implementation = implementation
+        smoother = FixedLagSmoother(self.h, lag)
+        bounds = np.sort(self.prng.randint(0, len(self.X) + 1, 10))
+        posteriors = []
+        for X_chunk in np.split(self.X, bounds):
+            posteriors.extend(smoother.push(X_chunk))
+        assert len(posteriors) == max(len(self.X) - lag, 0)
+        # The posteriors of sample t are conditioned on the samples up to
+        # t + lag.
+        for t, post in enumerate(posteriors):
+            assert_allclose(
+                post, self.h.predict_proba(self.X[:t + lag + 1])[t])
+        assert smoother.n_pending == min(lag, len(self.X))
+        assert_allclose(
+            smoother.flush(),
+            self.h.predict_proba(self.X)[len(posteriors):])
+        assert smoother.n_pending == 0
+
+    def test_lag_zero_is_filtering(self):
+        self.h.filter_init()
+        _, filtered = self.h.filter_update(self.X)
+        smoother = FixedLagSmoother(self.h, 0)
+        assert_allclose(smoother.push(self.X), filtered)
+
+    def test_push_underflow(self):
+        # In a left-right model, the last sample can only be explained by a
+        # state whose frame probability underflows relative to the others
+        # (so that the forward pass with scaling fails); as for the model's
+        # own inference, the log implementation handles it.
+        h = hmm.GaussianHMM(3, covariance_type="diag")
+        h.startprob_ = np.array([1, 0, 0])
+        h.transmat_ = np.array([[.9, .1, 0], [0, .9, .1], [0, 0, 1]])
+        h.means_ = np.array([[0], [100], [200]])
+        h.covars_ = np.ones((3, 1))
+        X = np.array([[0], [0], [200], [200]])
+        smoother = FixedLagSmoother(h, 2)
+        posteriors = np.concatenate([smoother.push(X), smoother.flush()])
+        assert_allclose(posteriors, h.predict_proba(X))
+        h.implementation = "scaling"
+        with pytest.raises(ValueError, match="underflow"):
+            FixedLagSmoother(h, 2).push(X)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            FixedLagSmoother(self.h, lag=-1)
@@ -1,6 +1,7 @@
 import numpy as np
 from numpy.testing import assert_allclose
 import pytest
+from scipy.stats import poisson
 from sklearn.utils import check_random_state
 
 from hmmlearn import hmm
@@ -41,6 +42,24 @@ class TestPoissonHMM:
         assert posteriors.shape == (n_samples, self.n_components)
         assert_allclose(posteriors.sum(axis=1), np.ones(n_samples))
 
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_compute_log_likelihood(self, implementation):
+        h = self.new_hmm(implementation)
+        h.lambdas_[1, 0] = 0
+        X, _ = h.sample(100, random_state=0)
+        X[0, 0] = 1  # Impossible in the second state.
+        X[2, 0] = -1  # Negative counts are impossible.
+        expected = np.stack([poisson.logpmf(X, lambdas).sum(axis=1)
+                             for lambdas in h.lambdas_], axis=1)
+        assert_allclose(h._compute_log_likelihood(X), expected)
+        # Even if all counts are negative.
+        assert (h._compute_log_likelihood(-X - 1) == -np.inf).all()
+        # Non-integer counts are impossible.
+        X = X.astype(float)
+        X[1, 1] = .5
+        expected[1] = -np.inf
+        assert_allclose(h._compute_log_likelihood(X), expected)
+
     @pytest.mark.parametrize("implementation", ["scaling", "log"])
     def test_fit(self, implementation, params='stl', n_iter=5):
 
@@ -78,6 +97,25 @@ class TestPoissonHMM:
 
         assert_log_likelihood_increasing(h, X, lengths, n_iter)
 
+    @pytest.mark.parametrize("implementation", ["scaling", "log"])
+    def test_partial_fit(self, implementation):
+        h = self.new_hmm(implementation)
+        random_state = check_random_state(0)
+        X_test, _ = h.sample(2000, random_state=random_state)
+
+        def batches(n_batches=30):
+            for _ in range(n_batches):
+                X, _ = h.sample(100, random_state=random_state)
+                yield X
+
+        model = hmm.PoissonHMM(self.n_components, random_state=0,
+                               implementation=implementation)
+        log_probs = [model.partial_fit(X, [50, 50]).score(X_test)
+                     for X in batches()]
+        assert model.n_batch_iter_ == 30
+        assert log_probs[-1] > log_probs[0]
+        assert log_probs[-1] > 1.02 * h.score(X_test)
+
     @pytest.mark.parametrize("implementation", ["scaling", "log"])
     def test_criterion(self, implementation):
         random_state = check_random_state(412)
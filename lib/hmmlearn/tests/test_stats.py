@@ -0,0 +1,89 @@
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+from scipy import stats as sp_stats
+
+from hmmlearn.stats import log_multivariate_normal_density
+from hmmlearn.utils import fill_covars
+
+from . import make_covar_matrix
+
+
+@pytest.mark.parametrize("covariance_type",
+                         ["spherical", "diag", "full", "tied"])
+def test_log_multivariate_normal_density(covariance_type, monkeypatch):
+    n_samples, n_components, n_features = 30, 4, 3
+    prng = np.random.RandomState(0)
+    X = prng.randn(n_samples, n_features)
+    means = prng.randn(n_components, n_features)
+    covars = make_covar_matrix(
+        covariance_type, n_components, n_features, random_state=prng)
+    full_covars = fill_covars(
+        covars, covariance_type, n_components, n_features)
+    expected = np.column_stack([
+        sp_stats.multivariate_normal.logpdf(X, mean, cov)
+        for mean, cov in zip(means, full_covars)])
+    assert_allclose(
+        log_multivariate_normal_density(X, means, covars, covariance_type),
+        expected)
+    # Writing into a provided buffer, and processing small chunks of
+    # samples, give the same results.
+    monkeypatch.setattr("hmmlearn.stats._CHUNK_SIZE", 7)
+    out = np.empty((n_samples, n_components))
+    assert log_multivariate_normal_density(
+        X, means, covars, covariance_type, out=out) is out
+    assert_allclose(out, expected)
+
+
+@pytest.mark.parametrize("covariance_type",
+                         ["spherical", "diag", "full", "tied"])
+def test_log_multivariate_normal_density_large_offset(covariance_type):
+    # Expanding the squared distances must not cancel catastrophically
+    # when the data is far from the origin.
+    n_samples, n_components, n_features = 30, 4, 3
+    prng = np.random.RandomState(0)
+    offset = 1e6
+    X = prng.randn(n_samples, n_features) + offset
+    means = prng.randn(n_components, n_features) + offset
+    covars = make_covar_matrix(
+        covariance_type, n_components, n_features, random_state=prng)
+    expected = log_multivariate_normal_density(
+        X - offset, means - offset, covars, covariance_type)
+    assert_allclose(
+        log_multivariate_normal_density(X, means, covars, covariance_type),
+        expected, rtol=1e-6)
+
+
+def test_log_multivariate_normal_density_ill_conditioned():
+    # Full covariances with a large condition number, far from the origin.
+    n_samples, n_components, n_features = 20, 2, 3
+    prng = np.random.RandomState(0)
+    eigvecs = np.linalg.qr(prng.randn(n_features, n_features))[0]
+    eigvals = np.array([1e-8, 1e-4, 1])
+    covars = np.stack([eigvecs @ np.diag(eigvals) @ eigvecs.T]
+                      * n_components)
+    means = prng.randn(n_components, n_features) + 1e6
+    X = means[0] + 1e-3 * prng.randn(n_samples, n_features)
+    expected = -.5 * (
+        n_features * np.log(2 * np.pi) + np.log(eigvals).sum()
+        + (((X[:, None] - means) @ eigvecs) ** 2 / eigvals).sum(axis=-1))
+    assert_allclose(
+        log_multivariate_normal_density(X, means, covars, "full"),
+        expected, rtol=1e-7)
+
+
+def test_log_multivariate_normal_density_zero_variance():
+    X = np.array([[0., 1.], [1., 1.], [2., 2.]])
+    means = np.array([[1., 1.], [0., 0.]])
+    covars = np.array([[0., 1.], [1., 1.]])
+    with np.errstate(all="raise"):
+        log_prob = log_multivariate_normal_density(X, means, covars, "diag")
+    # Degenerate covariances are clamped, as in the direct formula.
+    clamped = np.maximum(covars, np.finfo(float).tiny)
+    with np.errstate(over="ignore"):
+        expected = -.5 * (2 * np.log(2 * np.pi)
+                          + np.log(clamped).sum(axis=-1)
+                          + ((X[:, None] - means) ** 2
+                             / clamped).sum(axis=-1))
+    assert not np.isnan(log_prob).any()
+    assert_allclose(log_prob, expected)
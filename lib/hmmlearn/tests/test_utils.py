@@ -1,6 +1,9 @@
 import numpy as np
-from numpy.testing import assert_allclose
+from numpy.testing import assert_allclose, assert_array_equal
+import pytest
+from threadpoolctl import threadpool_limits
 
+from hmmlearn import _hmmc, _utils
 from hmmlearn.utils import normalize, fill_covars
 
 
@@ -43,3 +46,49 @@ def test_fill_covars():
                          [[3, 0], [0, 3]]])
     np.testing.assert_equal(
         fill_covars(spherical, 'spherical', 3, 2), expected)
+
+
+def test_sequence_index():
+    X = np.arange(14)[:, None]
+    lengths = [4, 1, 7, 2]
+    index = _utils.SequenceIndex(X, lengths)
+    assert len(index) == 4
+    assert index.offsets.dtype == np.intp
+    assert_array_equal(index.lengths, lengths)
+    sequences = index.split(X)
+    assert [len(seq) for seq in sequences] == lengths
+    assert all(np.shares_memory(seq, X) for seq in sequences)
+
+    blocks = index.blocks(5)
+    assert [(start, stop) for start, stop, _ in blocks] == [
+        (0, 5), (5, 12), (12, 14)]
+    assert_array_equal(blocks[0][2], [0, 4, 5])
+    assert index.blocks(5) is blocks  # Cached.
+
+    chunks = index.chunks(3)
+    assert [(start, stop) for start, stop, _ in chunks] == [
+        (0, 5), (5, 12), (12, 14)]
+    assert_array_equal(chunks[0][2].offsets, [0, 4, 5])
+    assert_array_equal(chunks[1][2].offsets, [0, 7])
+    assert len(index.chunks(10)) == 4  # No empty chunks.
+
+    assert _utils.as_sequence_index(X, index) is index
+    assert_array_equal(_utils.lengths_to_offsets(X, index), index.offsets)
+    with pytest.raises(ValueError):
+        _utils.as_sequence_index(X[:-1], index)
+    with pytest.raises(ValueError):
+        _utils.SequenceIndex(X, [4, 1])
+
+
+def test_thread_pool():
+    with threadpool_limits(limits=4, user_api="openmp"):
+        if _hmmc.get_num_threads() != 4:
+            pytest.skip("_hmmc was built without OpenMP support")
+        # The workers share the OpenMP threads of the calling thread.
+        for n_jobs, n_threads in [(2, 2), (3, 1), (8, 1)]:
+            with _utils.thread_pool(n_jobs) as executor:
+                futures = [executor.submit(_hmmc.get_num_threads)
+                           for _ in range(n_jobs)]
+            assert [future.result() for future in futures] == (
+                [n_threads] * n_jobs)
+        assert _hmmc.get_num_threads() == 4
@@ -63,7 +63,8 @@ class VariationalCategoricalHMM(BaseCategoricalHMM, VariationalBaseHMM):
                  algorithm="viterbi", random_state=None,
                  n_iter=100, tol=1e-6, verbose=False,
                  params="ste", init_params="ste",
-                 implementation="log"):
+                 implementation="log", n_jobs=None, memory="full",
+                 dtype=np.float64):
         """
         Parameters
         ----------
@@ -114,6 +115,18 @@ class VariationalCategoricalHMM(BaseCategoricalHMM, VariationalBaseHMM):
             Determines if the forward-backward algorithm is implemented with
             logarithms ("log"), or using scaling ("scaling").  The default is
             to use logarithms for backwards compatability.
+
+        n_jobs : int, optional
+            Number of threads used to process multiple sequences in parallel,
+            see :class:`~hmmlearn.base._AbstractHMM`.
+
+        memory : {"full", "checkpoint"}, optional
+            Memory usage of the forward-backward algorithm, see
+            :class:`~hmmlearn.base._AbstractHMM`.
+
+        dtype : {numpy.float64, numpy.float32}, optional
+            Floating point type of the lattices and posteriors, see
+            :class:`~hmmlearn.base._AbstractHMM`.
         """
         super().__init__(
             n_components=n_components, startprob_prior=startprob_prior,
@@ -121,7 +134,8 @@ class VariationalCategoricalHMM(BaseCategoricalHMM, VariationalBaseHMM):
             algorithm=algorithm, random_state=random_state,
             n_iter=n_iter, tol=tol, verbose=verbose,
             params=params, init_params=init_params,
-            implementation=implementation
+            implementation=implementation, n_jobs=n_jobs,
+            memory=memory, dtype=dtype
         )
         self.emissionprob_prior = emissionprob_prior
         self.n_features = n_features
@@ -192,6 +206,11 @@ class VariationalCategoricalHMM(BaseCategoricalHMM, VariationalBaseHMM):
     def _compute_subnorm_log_likelihood(self, X):
         return self.emissionprob_log_subnorm_[:, X.squeeze(1)].T
 
+    def _get_estep_emission(self):
+        if self.implementation == "log":
+            return self.emissionprob_log_subnorm_
+        return np.exp(self.emissionprob_log_subnorm_)
+
     def _do_mstep(self, stats):
         """
         Perform the M-step of the VB-EM algorithm.
@@ -334,7 +353,8 @@ class VariationalGaussianHMM(BaseGaussianHMM, VariationalBaseHMM):
                  scale_prior=None, algorithm="viterbi",
                  random_state=None, n_iter=100, tol=1e-6, verbose=False,
                  params="stmc", init_params="stmc",
-                 implementation="log"):
+                 implementation="log", n_jobs=None, memory="full",
+                 dtype=np.float64):
         """
         Parameters
         ----------
@@ -407,6 +427,18 @@ class VariationalGaussianHMM(BaseGaussianHMM, VariationalBaseHMM):
             Determines if the forward-backward algorithm is implemented with
             logarithms ("log"), or using scaling ("scaling").  The default is
             to use logarithms for backwards compatability.
+
+        n_jobs : int, optional
+            Number of threads used to process multiple sequences in parallel,
+            see :class:`~hmmlearn.base._AbstractHMM`.
+
+        memory : {"full", "checkpoint"}, optional
+            Memory usage of the forward-backward algorithm, see
+            :class:`~hmmlearn.base._AbstractHMM`.
+
+        dtype : {numpy.float64, numpy.float32}, optional
+            Floating point type of the lattices and posteriors, see
+            :class:`~hmmlearn.base._AbstractHMM`.
         """
         super().__init__(
             n_components=n_components, startprob_prior=startprob_prior,
@@ -414,7 +446,8 @@ class VariationalGaussianHMM(BaseGaussianHMM, VariationalBaseHMM):
             algorithm=algorithm, random_state=random_state,
             n_iter=n_iter, tol=tol, verbose=verbose,
             params=params, init_params=init_params,
-            implementation=implementation
+            implementation=implementation, n_jobs=n_jobs,
+            memory=memory, dtype=dtype
         )
         self.covariance_type = covariance_type
         self.means_prior = means_prior
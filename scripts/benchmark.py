@@ -7,6 +7,7 @@ import collections
 import logging
 import time
 
+import hmmlearn._hmmc
 import hmmlearn.hmm
 
 import numpy as np
@@ -242,6 +243,52 @@ class GMMBenchmark(GaussianBenchmark):
         LOG.info(f"weights_={model.weights_}")
 
 
+class KernelBenchmark(Benchmark):
+    """
+    Time the fused forward-backward kernels alone (one call per iteration),
+    on a single sequence with a dense transition matrix, for increasing
+    numbers of states.
+    """
+
+    n_samples = 2000
+
+    def run(self, results_file):
+        runtimes = collections.defaultdict(dict)
+        prng = np.random.RandomState(0)
+        offsets = np.array([0, self.n_samples])
+
+        for n_components in [4, 16, 64, 256]:
+            startprob = prng.dirichlet(np.ones(n_components))
+            transmat = prng.dirichlet(np.ones(n_components), n_components)
+            frameprob = prng.random_sample((self.n_samples, n_components))
+            for implementation in ["scaling", "log"]:
+                kernel = getattr(
+                    hmmlearn._hmmc,
+                    f"forward_backward_{implementation}_multi")
+                arg = (frameprob if implementation == "scaling"
+                       else np.log(frameprob))
+                key = (f"forward_backward|{n_components}"
+                       f"|hmmlearn-{implementation}")
+                LOG.info(f"Kernels: testing {key}")
+                elapsed = []
+                for i in range(self.repeat):
+                    start = time.time()
+                    for j in range(self.n_iter):
+                        kernel(startprob, transmat, arg, offsets, True)
+                    end = time.time()
+                    elapsed.append(end-start)
+                    LOG.info(f"Kernels Took {end-start} seconds {key}")
+                elapsed = np.asarray(elapsed)
+                runtimes[key]["mean"] = elapsed.mean()
+                runtimes[key]["std"] = elapsed.std()
+
+        with open(results_file, mode="w") as fd:
+            fd.write("configuration,mean,std,n_iterations,repeat\n")
+            for key, value in runtimes.items():
+                fd.write(f"{key},{value['mean']},{value['std']},"
+                         f"{self.n_iter},{self.repeat}\n")
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--all", action="store_true")
@@ -249,6 +296,7 @@ def main():
     parser.add_argument("--gaussian", action="store_true")
     parser.add_argument("--multivariate-gaussian", action="store_true")
     parser.add_argument("--gaussian-mixture", action="store_true")
+    parser.add_argument("--kernels", action="store_true")
     parser.add_argument("--repeat", type=int, default=10)
     parser.add_argument("--verbose", action="store_true")
     parser.add_argument("--n-iter", type=int, default=100)
@@ -259,6 +307,7 @@ def main():
         args.gaussian = True
         args.multivariate_gaussian = True
         args.gaussian_mixture = True
+        args.kernels = True
 
     if args.categorical:
         bench = MultinomialBenchmark(
@@ -288,6 +337,13 @@ def main():
             verbose=args.verbose,
         )
         bench.run("gmm.benchmark.csv")
+    if args.kernels:
+        bench = KernelBenchmark(
+            repeat=args.repeat,
+            n_iter=args.n_iter,
+            verbose=args.verbose,
+        )
+        bench.run("kernels.benchmark.csv")
 
 
 if __name__ == "__main__":
@@ -25,6 +25,18 @@ class build_ext(build_ext):
             self.compiler.compiler_so.remove("-Wstrict-prototypes")
         except (AttributeError, ValueError):
             pass
+        # Multithread the kernels with OpenMP where the compiler supports it
+        # (e.g., not Apple Clang); the pragmas are ignored otherwise.
+        from pybind11.setup_helpers import has_flag
+        if self.compiler.compiler_type == "msvc":
+            openmp_flags = ["/openmp"]
+        elif has_flag(self.compiler, "-fopenmp"):
+            openmp_flags = ["-fopenmp"]
+        else:
+            openmp_flags = []
+        for ext in self.extensions:
+            ext.extra_compile_args += openmp_flags
+            ext.extra_link_args += openmp_flags
         super().build_extensions()
 
 
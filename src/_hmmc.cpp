@@ -1,11 +1,21 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/numpy.h>
+#include <algorithm>
 #include <cfenv>
+#include <cmath>
 #include <limits>
+#include <numeric>
+#include <vector>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
 
 namespace py = pybind11;
 using ssize_t = Py_ssize_t;
 
+template<typename T>
+using carray = py::array_t<T, py::array::c_style | py::array::forcecast>;
+
 double logaddexp(double a, double b)
 {
   return
@@ -14,9 +24,13 @@ double logaddexp(double a, double b)
     : std::max(a, b) + std::log1p(std::exp(-std::abs(b - a)));
 }
 
-double logsumexp(double const* v, ssize_t n)
+template<typename T>
+double logsumexp(T const* v, ssize_t n)
 {
-  auto max = *std::max_element(v, v + n);
+  if (!n) {
+    return -std::numeric_limits<double>::infinity();
+  }
+  double max = *std::max_element(v, v + n);
   if (std::isinf(max)) {
     return max;
   }
@@ -27,8 +41,7 @@ double logsumexp(double const* v, ssize_t n)
   return std::log(acc) + max;
 }
 
-py::array_t<double> log(
-  py::array_t<double, py::array::c_style | py::array::forcecast> x_)
+py::array_t<double> log(carray<double> x_)
 {
   auto n = x_.size();
   auto ptr = x_.data();
@@ -43,166 +56,1352 @@ py::array_t<double> log(
   return log.reshape(std::vector<ssize_t>(x_.shape(), x_.shape() + x_.ndim()));
 }
 
-std::tuple<double, py::array_t<double>, py::array_t<double>> forward_scaling(
-  py::array_t<double> startprob_,
-  py::array_t<double> transmat_,
-  py::array_t<double> frameprob_)
+// Return *log_x_* if it is not None (in which case it must have the shape of
+// *x_*, of which it holds precomputed logs), or else the logs of *x_*.
+carray<double> log_or(carray<double> const& x_, py::object log_x_)
 {
-  auto min_sum = 1e-300;
+  if (log_x_.is_none()) {
+    return log(x_);
+  }
+  auto log_x = log_x_.cast<carray<double>>();
+  if (log_x.ndim() != x_.ndim()
+      || !std::equal(x_.shape(), x_.shape() + x_.ndim(), log_x.shape())) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  return log_x;
+}
 
+// Validate the shapes of the model parameters against the frame
+// (log-)probabilities, and return (n_samples, n_components).
+template<typename T>
+std::pair<ssize_t, ssize_t> check_shapes(
+  carray<double> const& startprob_,
+  carray<double> const& transmat_,
+  carray<T> const& frameprob_)
+{
   auto startprob = startprob_.unchecked<1>();
   auto transmat = transmat_.unchecked<2>();
-  auto frameprob = frameprob_.unchecked<2>();
+  auto frameprob = frameprob_.template unchecked<2>();
   auto ns = frameprob.shape(0), nc = frameprob.shape(1);
   if (startprob.shape(0) != nc
       || transmat.shape(0) != nc || transmat.shape(1) != nc) {
     throw std::invalid_argument{"shape mismatch"};
   }
-  auto fwdlattice_ = py::array_t<double>{{ns, nc}};
-  auto fwd = fwdlattice_.mutable_unchecked<2>();
-  auto scaling_ = py::array_t<double>{{ns}};
-  auto scaling = scaling_.mutable_unchecked<1>();
-  auto log_prob = 0.;
-  auto nogil = py::gil_scoped_release{};
-  std::fill_n(fwd.mutable_data(0, 0), fwd.size(), 0);
-  for (auto i = 0; i < nc; ++i) {
-    fwd(0, i) = startprob(i) * frameprob(0, i);
+  return {ns, nc};
+}
+
+// Validate that *offsets_* splits *ns* samples into nonempty sequences, and
+// return the number of sequences.
+ssize_t check_offsets(carray<ssize_t> const& offsets_, ssize_t ns)
+{
+  auto offsets = offsets_.unchecked<1>();
+  auto n_seqs = offsets.shape(0) - 1;
+  if (n_seqs < 0 || offsets(0) != 0 || offsets(n_seqs) != ns) {
+    throw std::invalid_argument{"offsets must go from 0 to n_samples"};
   }
-  auto sum = std::accumulate(&fwd(0, 0), &fwd(0, nc), 0.);
-  if (sum < min_sum) {
-    throw std::range_error{"forward pass failed with underflow; "
-                           "consider using implementation='log' instead"};
+  for (auto k = 0; k < n_seqs; ++k) {
+    if (offsets(k + 1) <= offsets(k)) {
+      throw std::invalid_argument{"sequences must be nonempty"};
+    }
   }
-  auto scale = scaling(0) = 1. / sum;
-  log_prob -= std::log(scale);
-  for (auto i = 0; i < nc; ++i) {
-    fwd(0, i) *= scale;
+  return n_seqs;
+}
+
+// Validate that the *ns* symbols of *symbols_* are in [0, nf).
+void check_symbols(carray<ssize_t> const& symbols_, ssize_t ns, ssize_t nf)
+{
+  auto symbols = symbols_.unchecked<1>();
+  if (symbols.shape(0) != ns) {
+    throw std::invalid_argument{"shape mismatch"};
   }
-  for (auto t = 1; t < ns; ++t) {
-    for (auto j = 0; j < nc; ++j) {
+  for (auto t = 0; t < ns; ++t) {
+    if (symbols(t) < 0 || symbols(t) >= nf) {
+      throw std::invalid_argument{"symbol out of range"};
+    }
+  }
+}
+
+// Dense vector primitives, written so that compilers can vectorize them:
+// operands are contiguous and do not alias, and reductions use independent
+// accumulators.
+
+// Set y[0:n] += a * x[0:n].
+void axpy(
+  ssize_t n, double a, double const* __restrict x, double* __restrict y)
+{
+  for (ssize_t k = 0; k < n; ++k) {
+    y[k] += a * x[k];
+  }
+}
+
+// Return the dot product of x[0:n] and y[0:n].
+double dot(ssize_t n, double const* __restrict x, double const* __restrict y)
+{
+  double acc[4] = {0, 0, 0, 0};
+  ssize_t k = 0;
+  for (; k + 4 <= n; k += 4) {
+    acc[0] += x[k] * y[k];
+    acc[1] += x[k + 1] * y[k + 1];
+    acc[2] += x[k + 2] * y[k + 2];
+    acc[3] += x[k + 3] * y[k + 3];
+  }
+  for (; k < n; ++k) {
+    acc[0] += x[k] * y[k];
+  }
+  return (acc[0] + acc[1]) + (acc[2] + acc[3]);
+}
+
+// Set y[0:n] += a * x[0:n] * w[0:n].
+void axpy_scaled(
+  ssize_t n, double a, double const* __restrict x,
+  double const* __restrict w, double* __restrict y)
+{
+  for (ssize_t k = 0; k < n; ++k) {
+    y[k] += a * x[k] * w[k];
+  }
+}
+
+// Call f(i) for each i in [0, n), splitting the loop across OpenMP threads
+// if *parallel*.  The parallel region is only entered when needed: even
+// when disabled by an if clause, entering it costs about as much as a whole
+// step of a small model.
+template<typename F>
+void parallel_for(bool parallel, ssize_t n, F f)
+{
+  if (parallel) {
+#pragma omp parallel for
+    for (ssize_t i = 0; i < n; ++i) {
+      f(i);
+    }
+  } else {
+    for (ssize_t i = 0; i < n; ++i) {
+      f(i);
+    }
+  }
+}
+
+// The nonzero structure of a transition matrix.  If the matrix is sparse
+// enough (e.g., for left-right or banded models), the nonzero transitions are
+// listed both by row (successors of each state) and by column (predecessors
+// of each state), and the kernels only loop over them, i.e. in O(nnz) rather
+// than O(nc**2) per sample; otherwise, all pairs of states are visited, which
+// gives tighter loops.  Skipped transitions have zero probability, and thus
+// would not contribute to any result.
+//
+// The matrix-vector products below only ever walk *a* (a transition matrix,
+// stored row-major) along its rows, so that the dense loops are contiguous.
+//
+// If there are enough transitions, the loops over states within each sample
+// are split across OpenMP threads (if the extension is built with OpenMP
+// support), as many as allowed for the calling thread (by OMP_NUM_THREADS or
+// threadpoolctl, or, within the workers of an ``n_jobs`` thread pool, by
+// set_num_threads).  Each state is always handled by a single thread, so
+// that the results do not depend on the number of threads.
+class Transitions {
+  ssize_t nc_;
+  bool sparse_, parallel_;
+  std::vector<ssize_t> succ_ptr_, succ_, pred_ptr_, pred_;
+
+public:
+  Transitions(double const* transmat, ssize_t nc) : nc_{nc}
+  {
+    auto nnz = std::count_if(
+      transmat, transmat + nc * nc, [](double p) { return p != 0; });
+    sparse_ = nnz <= nc * nc / 4;
+    // Below this number of transitions, a step is too cheap to be worth
+    // dispatching to threads.
+    parallel_ = nnz >= 65536;
+    if (!sparse_) {
+      return;
+    }
+    succ_ptr_.assign(nc + 1, 0);
+    pred_ptr_.assign(nc + 1, 0);
+    for (auto i = 0; i < nc; ++i) {
+      for (auto j = 0; j < nc; ++j) {
+        if (transmat[i * nc + j] != 0) {
+          succ_.push_back(j);
+          ++pred_ptr_[j + 1];
+        }
+      }
+      succ_ptr_[i + 1] = succ_.size();
+    }
+    std::partial_sum(pred_ptr_.begin(), pred_ptr_.end(), pred_ptr_.begin());
+    pred_.resize(nnz);
+    auto pos = std::vector<ssize_t>(pred_ptr_.begin(), pred_ptr_.end() - 1);
+    for (auto i = 0; i < nc; ++i) {
+      for (auto k = succ_ptr_[i]; k < succ_ptr_[i + 1]; ++k) {
+        pred_[pos[succ_[k]]++] = i;
+      }
+    }
+  }
+
+  // Call f(j), in increasing order, for the states j reachable from i.
+  template<typename F>
+  void for_successors(ssize_t i, F f) const
+  {
+    if (sparse_) {
+      for (auto k = succ_ptr_[i]; k < succ_ptr_[i + 1]; ++k) {
+        f(succ_[k]);
+      }
+    } else {
+      for (ssize_t j = 0; j < nc_; ++j) {
+        f(j);
+      }
+    }
+  }
+
+  // Call f(i), in increasing order, for the states i from which j is
+  // reachable.
+  template<typename F>
+  void for_predecessors(ssize_t j, F f) const
+  {
+    if (sparse_) {
+      for (auto k = pred_ptr_[j]; k < pred_ptr_[j + 1]; ++k) {
+        f(pred_[k]);
+      }
+    } else {
+      for (ssize_t i = 0; i < nc_; ++i) {
+        f(i);
+      }
+    }
+  }
+
+  // Whether the loops over states should be split across threads.
+  bool parallel() const { return parallel_; }
+
+  // Return the logsumexp of v(j) over the states j reachable from i.
+  template<typename F>
+  double logsumexp_successors(ssize_t i, F v) const
+  {
+    auto max = -std::numeric_limits<double>::infinity();
+    for_successors(i, [&](ssize_t j) { max = std::max(max, v(j)); });
+    if (std::isinf(max)) {
+      return max;
+    }
+    auto acc = 0.;
+    for_successors(i, [&](ssize_t j) { acc += std::exp(v(j) - max); });
+    return std::log(acc) + max;
+  }
+
+  // Return the logsumexp of v(i) over the states i from which j is
+  // reachable.
+  template<typename F>
+  double logsumexp_predecessors(ssize_t j, F v) const
+  {
+    auto max = -std::numeric_limits<double>::infinity();
+    for_predecessors(j, [&](ssize_t i) { max = std::max(max, v(i)); });
+    if (std::isinf(max)) {
+      return max;
+    }
+    auto acc = 0.;
+    for_predecessors(j, [&](ssize_t i) { acc += std::exp(v(i) - max); });
+    return std::log(acc) + max;
+  }
+
+  // Set y = x @ a, as a sum of the rows of *a* weighted by *x*, computed
+  // by blocks of columns (one block per thread at a time).  Each y[j] is
+  // accumulated in the same order whatever the blocks, which, when
+  // multithreaded, are small enough to be spread across threads even for
+  // the smallest multithreaded models, but still span whole cache lines.
+  void vecmat(double const* a, double const* x, double* y) const
+  {
+    ssize_t block_size = parallel_ ? 32 : 256;
+    ssize_t n_blocks = (nc_ + block_size - 1) / block_size;
+    parallel_for(parallel_, n_blocks, [&](ssize_t b) {
+      auto start = b * block_size,
+           stop = std::min(start + block_size, nc_);
+      std::fill(y + start, y + stop, 0);
+      if (sparse_) {
+        for (auto j = start; j < stop; ++j) {
+          for (auto k = pred_ptr_[j]; k < pred_ptr_[j + 1]; ++k) {
+            auto i = pred_[k];
+            if (x[i] != 0) {
+              y[j] += x[i] * a[i * nc_ + j];
+            }
+          }
+        }
+      } else {
+        for (ssize_t i = 0; i < nc_; ++i) {
+          if (x[i] != 0) {
+            axpy(stop - start, x[i], a + i * nc_ + start, y + start);
+          }
+        }
+      }
+    });
+  }
+
+  // Return (a @ y)[i].
+  double dot_row(ssize_t i, double const* a, double const* y) const
+  {
+    if (sparse_) {
+      auto acc = 0.;
+      for (auto k = succ_ptr_[i]; k < succ_ptr_[i + 1]; ++k) {
+        acc += a[i * nc_ + succ_[k]] * y[succ_[k]];
+      }
+      return acc;
+    } else {
+      return dot(nc_, a + i * nc_, y);
+    }
+  }
+
+  // Set out[i, :] += f * a[i, :] * w.
+  void add_scaled_row(
+    ssize_t i, double f, double const* a, double const* w, double* out) const
+  {
+    if (sparse_) {
+      for (auto k = succ_ptr_[i]; k < succ_ptr_[i + 1]; ++k) {
+        auto j = succ_[k];
+        out[i * nc_ + j] += f * a[i * nc_ + j] * w[j];
+      }
+    } else {
+      axpy_scaled(nc_, f, a + i * nc_, w, out + i * nc_);
+    }
+  }
+};
+
+// In log space, the sums over transitions are computed as matrix-vector
+// products on the transition probabilities, after shifting the log
+// probabilities by their maximum and exponentiating them, which takes O(nc)
+// rather than O(nc**2) calls to exp and log per sample.  Terms that underflow
+// after the shift are negligible compared to any sum larger than
+// *min_shifted_sum*; smaller sums (which only occur when all large terms are
+// multiplied by zero transition probabilities) are recomputed exactly with
+// logsumexp.
+double const min_shifted_sum = 1e-200;
+
+// Set shifted = exp(v - max(v)) and return max(v), or fill *shifted* with
+// zeros (so that all sums get recomputed) if the maximum is infinite.
+template<typename T>
+double shift_exp(ssize_t nc, T const* v, double* shifted)
+{
+  double max = *std::max_element(v, v + nc);
+  if (std::isinf(max)) {
+    std::fill_n(shifted, nc, 0);
+  } else {
+    for (auto i = 0; i < nc; ++i) {
+      shifted[i] = std::exp(v[i] - max);
+    }
+  }
+  return max;
+}
+
+// The frame (log-)probabilities of a sequence, which the kernels read a row
+// (i.e. a sample) at a time: stored as C-contiguous rows, or, for
+// categorical models, looked up by the symbol of each sample in a table of
+// rows (the transposed emission (log-)probabilities), so that they need not
+// be gathered first.
+template<typename T>
+struct DenseFrames {
+  T const* data;
+  ssize_t nc;
+
+  T const* row(ssize_t t) const { return data + t * nc; }
+};
+
+template<typename T>
+struct CategoricalFrames {
+  T const* table;
+  ssize_t const* symbols;
+  ssize_t nc;
+
+  T const* row(ssize_t t) const { return table + symbols[t] * nc; }
+};
+
+template<typename T>
+DenseFrames<T> dense_frames(T const* data, ssize_t nc)
+{
+  return {data, nc};
+}
+
+// The *_impl functions below work on a single sequence (or a segment of a
+// sequence) of *ns* samples and *nc* components, stored in C-contiguous
+// buffers (except for the frame (log-)probabilities, see DenseFrames); they
+// must be called without holding the GIL.  The log space
+// implementations take both the transition probabilities and their logs, and
+// store frame log probabilities, lattices and posteriors as T (float or
+// double), but carry out all sums in double precision.
+
+// Run the forward pass (with scaling) into *fwd* and *scaling*.  If *prev*
+// is not null, the segment continues a sequence whose forward probabilities
+// at the preceding sample are *prev*, and whose log probability up to that
+// sample is *log_prob*.
+template<typename Frames>
+double forward_scaling_impl(
+  ssize_t ns, ssize_t nc,
+  double const* startprob, double const* transmat, Frames const& frames,
+  Transitions const& tr, double* fwd, double* scaling,
+  double const* prev = nullptr, double log_prob = 0)
+{
+  auto min_sum = 1e-300;
+  for (ssize_t t = 0; t < ns; ++t) {
+    auto cur = fwd + t * nc;
+    auto frameprob = frames.row(t);
+    if (t == 0 && !prev) {
       for (auto i = 0; i < nc; ++i) {
-        fwd(t, j) += fwd(t - 1, i) * transmat(i, j);
+        cur[i] = startprob[i] * frameprob[i];
+      }
+    } else {
+      tr.vecmat(transmat, t == 0 ? prev : fwd + (t - 1) * nc, cur);
+      for (auto j = 0; j < nc; ++j) {
+        cur[j] *= frameprob[j];
       }
-      fwd(t, j) *= frameprob(t, j);
     }
-    auto sum = std::accumulate(&fwd(t, 0), &fwd(t, nc), 0.);
+    auto sum = std::accumulate(cur, cur + nc, 0.);
     if (sum < min_sum) {
       throw std::range_error{"forward pass failed with underflow; "
                              "consider using implementation='log' instead"};
     }
-    auto scale = scaling(t) = 1. / sum;
+    auto scale = scaling[t] = 1. / sum;
     log_prob -= std::log(scale);
     for (auto j = 0; j < nc; ++j) {
-      fwd(t, j) *= scale;
+      cur[j] *= scale;
     }
   }
-  return {log_prob, fwdlattice_, scaling_};
+  return log_prob;
 }
 
-std::tuple<double, py::array_t<double>> forward_log(
-  py::array_t<double> startprob_,
-  py::array_t<double> transmat_,
-  py::array_t<double> log_frameprob_)
+// Run the forward pass (in log space) into *fwd*.  If *prev* is not null,
+// the segment continues a sequence whose forward log probabilities at the
+// preceding sample are *prev*.
+template<typename T, typename Frames>
+double forward_log_impl(
+  ssize_t ns, ssize_t nc,
+  double const* log_startprob, double const* transmat,
+  double const* log_transmat, Frames const& frames,
+  Transitions const& tr, T* fwd, T const* prev = nullptr)
 {
-  auto log_startprob_ = log(startprob_);
-  auto log_startprob = log_startprob_.unchecked<1>();
-  auto log_transmat_ = log(transmat_);
-  auto log_transmat = log_transmat_.unchecked<2>();
-  auto log_frameprob = log_frameprob_.unchecked<2>();
-  auto ns = log_frameprob.shape(0), nc = log_frameprob.shape(1);
-  if (log_startprob.shape(0) != nc
-      || log_transmat.shape(0) != nc || log_transmat.shape(1) != nc) {
-    throw std::invalid_argument{"shape mismatch"};
+  auto shifted = std::vector<double>(nc),
+       sums = std::vector<double>(nc);
+  for (ssize_t t = 0; t < ns; ++t) {
+    auto cur = fwd + t * nc;
+    auto log_frameprob = frames.row(t);
+    if (t == 0 && !prev) {
+      for (auto i = 0; i < nc; ++i) {
+        cur[i] = log_startprob[i] + log_frameprob[i];
+      }
+    } else {
+      auto last = t == 0 ? prev : fwd + (t - 1) * nc;
+      auto max = shift_exp(nc, last, shifted.data());
+      tr.vecmat(transmat, shifted.data(), sums.data());
+      parallel_for(tr.parallel(), nc, [&](ssize_t j) {
+        double log_sum;
+        if (sums[j] > min_shifted_sum) {
+          log_sum = std::log(sums[j]) + max;
+        } else {
+          log_sum = tr.logsumexp_predecessors(j, [&](ssize_t i) {
+            return last[i] + log_transmat[i * nc + j];
+          });
+        }
+        cur[j] = log_sum + log_frameprob[j];
+      });
+    }
   }
-  auto buf = std::vector<double>(nc);
-  auto fwdlattice_ = py::array_t<double>{{ns, nc}};
-  auto fwd = fwdlattice_.mutable_unchecked<2>();
-  auto nogil = py::gil_scoped_release{};
+  return logsumexp(fwd + (ns - 1) * nc, nc);
+}
+
+void backward_scaling_impl(
+  ssize_t ns, ssize_t nc,
+  double const* transmat, double const* frameprob, double const* scaling,
+  Transitions const& tr, double* bwd)
+{
+  auto weighted = std::vector<double>(nc);
   for (auto i = 0; i < nc; ++i) {
-    fwd(0, i) = log_startprob(i) + log_frameprob(0, i);
+    bwd[(ns - 1) * nc + i] = scaling[ns - 1];
   }
-  for (auto t = 1; t < ns; ++t) {
+  for (auto t = ns - 2; t >= 0; --t) {
+    auto next = bwd + (t + 1) * nc, cur = bwd + t * nc;
+    auto next_frameprob = frameprob + (t + 1) * nc;
     for (auto j = 0; j < nc; ++j) {
-      for (auto i = 0; i < nc; ++i) {
-        buf[i] = fwd(t - 1, i) + log_transmat(i, j);
-      }
-      fwd(t, j) = logsumexp(buf.data(), nc) + log_frameprob(t, j);
+      weighted[j] = next_frameprob[j] * next[j];
     }
+    parallel_for(tr.parallel(), nc, [&](ssize_t i) {
+      cur[i] = tr.dot_row(i, transmat, weighted.data()) * scaling[t];
+    });
   }
-  auto log_prob = logsumexp(&fwd(ns - 1, 0), nc);
-  return {log_prob, fwdlattice_};
 }
 
-py::array_t<double> backward_scaling(
-  py::array_t<double> startprob_,
-  py::array_t<double> transmat_,
-  py::array_t<double> frameprob_,
-  py::array_t<double> scaling_)
+// Set cur[i] = logsumexp_j(log_transmat[i, j] + weighted[j]), given
+// shifted = exp(weighted - max).
+template<typename T>
+void backward_log_step(
+  ssize_t nc, double const* transmat, double const* log_transmat,
+  Transitions const& tr, double const* weighted, double const* shifted,
+  double max, T* cur)
 {
-  auto startprob = startprob_.unchecked<1>();
-  auto transmat = transmat_.unchecked<2>();
-  auto frameprob = frameprob_.unchecked<2>();
-  auto scaling = scaling_.unchecked<1>();
-  auto ns = frameprob.shape(0), nc = frameprob.shape(1);
-  if (startprob.shape(0) != nc
-      || transmat.shape(0) != nc || transmat.shape(1) != nc
-      || scaling.shape(0) != ns) {
-    throw std::invalid_argument{"shape mismatch"};
-  }
-  auto bwdlattice_ = py::array_t<double>{{ns, nc}};
-  auto bwd = bwdlattice_.mutable_unchecked<2>();
-  auto nogil = py::gil_scoped_release{};
-  std::fill_n(bwd.mutable_data(0, 0), bwd.size(), 0);
+  parallel_for(tr.parallel(), nc, [&](ssize_t i) {
+    auto sum = tr.dot_row(i, transmat, shifted);
+    if (sum > min_shifted_sum) {
+      cur[i] = std::log(sum) + max;
+    } else {
+      cur[i] = tr.logsumexp_successors(i, [&](ssize_t j) {
+        return log_transmat[i * nc + j] + weighted[j];
+      });
+    }
+  });
+}
+
+template<typename T>
+void backward_log_impl(
+  ssize_t ns, ssize_t nc,
+  double const* transmat, double const* log_transmat,
+  T const* log_frameprob, Transitions const& tr, T* bwd)
+{
+  auto weighted = std::vector<double>(nc),
+       shifted = std::vector<double>(nc);
   for (auto i = 0; i < nc; ++i) {
-    bwd(ns - 1, i) = scaling(ns - 1);
+    bwd[(ns - 1) * nc + i] = 0;
   }
   for (auto t = ns - 2; t >= 0; --t) {
+    auto next = bwd + (t + 1) * nc, cur = bwd + t * nc;
+    auto next_log_frameprob = log_frameprob + (t + 1) * nc;
+    for (auto j = 0; j < nc; ++j) {
+      weighted[j] = double{next_log_frameprob[j]} + next[j];
+    }
+    auto max = shift_exp(nc, weighted.data(), shifted.data());
+    backward_log_step(
+      nc, transmat, log_transmat, tr, weighted.data(), shifted.data(), max,
+      cur);
+  }
+}
+
+// The backward sweeps of the fused forward-backward algorithm take the
+// forward lattice of a segment in *post*, and overwrite each of its rows with
+// the posteriors once the row is no longer needed, keeping only two rows of
+// backward probabilities (in *bwd*, of size 2 * nc).  *next_frameprob* holds
+// the frame (log-)probabilities of the sample following the segment, and
+// bwd[0:nc] its backward (log-)probabilities, or *next_frameprob* is null if
+// the segment ends the sequence; on return, bwd[0:nc] holds the backward
+// (log-)probabilities of the first sample of the segment.  If *xi_sum* is not
+// null, the sum over time of the transition posteriors is accumulated into it
+// (in both implementations, as probabilities).
+
+void normalize_posteriors_scaling(ssize_t nc, double* row, double const* bwd)
+{
+  for (auto i = 0; i < nc; ++i) {
+    row[i] *= bwd[i];
+  }
+  auto sum = std::accumulate(row, row + nc, 0.);
+  if (sum == 0) {
+    return;
+  }
+  for (auto i = 0; i < nc; ++i) {
+    row[i] /= sum;
+  }
+}
+
+template<typename T>
+void normalize_posteriors_log(ssize_t nc, T* row, double const* bwd)
+{
+  if (nc == 1) {
+    // Handle the degenerate case of a single state with -inf log
+    // probability, as utils.log_normalize.
+    row[0] = 1;
+    return;
+  }
+  auto max = -std::numeric_limits<double>::infinity();
+  for (auto i = 0; i < nc; ++i) {
+    max = std::max(max, row[i] + bwd[i]);
+  }
+  auto norm = max;
+  if (!std::isinf(max)) {
+    auto acc = 0.;
     for (auto i = 0; i < nc; ++i) {
+      acc += std::exp(row[i] + bwd[i] - max);
+    }
+    norm = std::log(acc) + max;
+  }
+  for (auto i = 0; i < nc; ++i) {
+    row[i] = std::exp(row[i] + bwd[i] - norm);
+  }
+}
+
+template<typename Frames>
+void backward_sweep_scaling_impl(
+  ssize_t ns, ssize_t nc,
+  double const* transmat, Frames const& frames, double const* scaling,
+  double const* next_frameprob, Transitions const& tr, double* post,
+  double* bwd, double* xi_sum)
+{
+  auto weighted = std::vector<double>(nc);
+  auto next = bwd, cur = bwd + nc;
+  for (auto t = ns - 1; t >= 0; --t) {
+    auto fwd = post + t * nc;
+    auto frameprob_t1 = t == ns - 1 ? next_frameprob : frames.row(t + 1);
+    if (!frameprob_t1) {
+      std::fill_n(cur, nc, scaling[t]);
+    } else {
+      for (auto j = 0; j < nc; ++j) {
+        weighted[j] = frameprob_t1[j] * next[j];
+      }
+      if (xi_sum) {
+        parallel_for(tr.parallel(), nc, [&](ssize_t i) {
+          if (fwd[i] != 0) {
+            tr.add_scaled_row(i, fwd[i], transmat, weighted.data(), xi_sum);
+          }
+        });
+      }
+      parallel_for(tr.parallel(), nc, [&](ssize_t i) {
+        cur[i] = tr.dot_row(i, transmat, weighted.data()) * scaling[t];
+      });
+    }
+    normalize_posteriors_scaling(nc, fwd, cur);
+    std::swap(next, cur);
+  }
+  if (next != bwd) {
+    std::copy_n(next, nc, bwd);
+  }
+}
+
+template<typename T, typename Frames>
+void backward_sweep_log_impl(
+  ssize_t ns, ssize_t nc,
+  double const* transmat, double const* log_transmat,
+  Frames const& frames, double log_prob,
+  T const* next_log_frameprob, Transitions const& tr, T* post,
+  double* bwd, double* xi_sum)
+{
+  // Transition posteriors are computed from the shifted probabilities if
+  // the shift of the row's forward log probability is below this bound, so
+  // that the terms that underflow are negligible (below exp(-400)).
+  auto max_xi_shift = 300.;
+  auto weighted = std::vector<double>(nc),
+       shifted = std::vector<double>(nc);
+  auto next = bwd, cur = bwd + nc;
+  for (auto t = ns - 1; t >= 0; --t) {
+    auto fwd = post + t * nc;
+    auto log_frameprob_t1 = t == ns - 1 ? next_log_frameprob
+                                        : frames.row(t + 1);
+    if (!log_frameprob_t1) {
+      std::fill_n(cur, nc, 0);
+    } else {
       for (auto j = 0; j < nc; ++j) {
-        bwd(t, i) += transmat(i, j) * frameprob(t + 1, j) * bwd(t + 1, j);
+        weighted[j] = log_frameprob_t1[j] + next[j];
+      }
+      auto max = shift_exp(nc, weighted.data(), shifted.data());
+      if (xi_sum && !std::isinf(max)) {
+        parallel_for(tr.parallel(), nc, [&](ssize_t i) {
+          auto shift = fwd[i] + max - log_prob;
+          if (shift == -std::numeric_limits<double>::infinity()) {
+            return;
+          } else if (shift < max_xi_shift) {
+            tr.add_scaled_row(
+              i, std::exp(shift), transmat, shifted.data(), xi_sum);
+          } else {
+            tr.for_successors(i, [&](ssize_t j) {
+              xi_sum[i * nc + j] += std::exp(fwd[i]
+                                             + log_transmat[i * nc + j]
+                                             + weighted[j]
+                                             - log_prob);
+            });
+          }
+        });
       }
-      bwd(t, i) *= scaling(t);
+      backward_log_step(
+        nc, transmat, log_transmat, tr, weighted.data(), shifted.data(), max,
+        cur);
     }
+    normalize_posteriors_log(nc, fwd, cur);
+    std::swap(next, cur);
+  }
+  if (next != bwd) {
+    std::copy_n(next, nc, bwd);
+  }
+}
+
+// The fused forward-backward implementations run the forward pass into
+// *post*, then the backward sweep on the whole sequence.
+
+template<typename Frames>
+double forward_backward_scaling_impl(
+  ssize_t ns, ssize_t nc,
+  double const* startprob, double const* transmat, Frames const& frames,
+  Transitions const& tr, double* post, double* scaling, double* bwd,
+  double* xi_sum)
+{
+  auto log_prob = forward_scaling_impl(
+    ns, nc, startprob, transmat, frames, tr, post, scaling);
+  backward_sweep_scaling_impl(
+    ns, nc, transmat, frames, scaling, nullptr, tr, post, bwd, xi_sum);
+  return log_prob;
+}
+
+// The transition posteriors of the sequence are first summed into
+// *seq_xi_sum*, then added to *xi_sum*.
+template<typename T, typename Frames>
+double forward_backward_log_impl(
+  ssize_t ns, ssize_t nc,
+  double const* log_startprob, double const* transmat,
+  double const* log_transmat, Frames const& frames,
+  Transitions const& tr, T* post, double* bwd, double* seq_xi_sum,
+  double* xi_sum)
+{
+  auto log_prob = forward_log_impl(
+    ns, nc, log_startprob, transmat, log_transmat, frames, tr, post);
+  if (xi_sum) {
+    std::fill_n(seq_xi_sum, nc * nc, 0);
+  }
+  backward_sweep_log_impl<T>(
+    ns, nc, transmat, log_transmat, frames, log_prob,
+    static_cast<T const*>(nullptr), tr, post, bwd,
+    xi_sum ? seq_xi_sum : nullptr);
+  if (xi_sum) {
+    for (auto k = 0; k < nc * nc; ++k) {
+      xi_sum[k] += seq_xi_sum[k];
+    }
+  }
+  return log_prob;
+}
+
+std::tuple<double, py::array_t<double>, py::array_t<double>> forward_scaling(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<double> frameprob_)
+{
+  auto shape = check_shapes(startprob_, transmat_, frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto fwdlattice_ = py::array_t<double>{{ns, nc}};
+  auto scaling_ = py::array_t<double>{{ns}};
+  auto startprob = startprob_.data(), transmat = transmat_.data(),
+       frameprob = frameprob_.data();
+  auto fwd = fwdlattice_.mutable_data(), scaling = scaling_.mutable_data();
+  auto log_prob = 0.;
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    log_prob = forward_scaling_impl(
+      ns, nc, startprob, transmat, dense_frames(frameprob, nc), tr, fwd,
+      scaling);
+  }
+  return {log_prob, fwdlattice_, scaling_};
+}
+
+template<typename T>
+std::tuple<double, py::array_t<T>> forward_log(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_frameprob_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto log_startprob_ = log_or(startprob_, log_startprob_in_);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto fwdlattice_ = py::array_t<T>{{ns, nc}};
+  auto log_startprob = log_startprob_.data(),
+       log_transmat = log_transmat_.data(),
+       log_frameprob = log_frameprob_.data();
+  auto fwd = fwdlattice_.mutable_data();
+  auto transmat = transmat_.data();
+  auto log_prob = 0.;
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    log_prob = forward_log_impl(
+      ns, nc, log_startprob, transmat, log_transmat,
+      dense_frames(log_frameprob, nc), tr, fwd);
+  }
+  return {log_prob, fwdlattice_};
+}
+
+py::array_t<double> backward_scaling(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<double> frameprob_,
+  carray<double> scaling_)
+{
+  auto shape = check_shapes(startprob_, transmat_, frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  if (scaling_.unchecked<1>().shape(0) != ns) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  auto bwdlattice_ = py::array_t<double>{{ns, nc}};
+  auto transmat = transmat_.data(), frameprob = frameprob_.data(),
+       scaling = scaling_.data();
+  auto bwd = bwdlattice_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    backward_scaling_impl(ns, nc, transmat, frameprob, scaling, tr, bwd);
   }
   return bwdlattice_;
 }
 
-py::array_t<double> backward_log(
-  py::array_t<double> startprob_,
-  py::array_t<double> transmat_,
-  py::array_t<double> log_frameprob_)
+template<typename T>
+py::array_t<T> backward_log(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_frameprob_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
 {
-  auto log_startprob_ = log(startprob_);
-  auto log_startprob = log_startprob_.unchecked<1>();
-  auto log_transmat_ = log(transmat_);
-  auto log_transmat = log_transmat_.unchecked<2>();
-  auto log_frameprob = log_frameprob_.unchecked<2>();
-  auto ns = log_frameprob.shape(0), nc = log_frameprob.shape(1);
-  if (log_startprob.shape(0) != nc
-      || log_transmat.shape(0) != nc || log_transmat.shape(1) != nc) {
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto bwdlattice_ = py::array_t<T>{{ns, nc}};
+  auto log_transmat = log_transmat_.data(),
+       log_frameprob = log_frameprob_.data();
+  auto transmat = transmat_.data();
+  auto bwd = bwdlattice_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    backward_log_impl(
+      ns, nc, transmat, log_transmat, log_frameprob, tr, bwd);
+  }
+  return bwdlattice_;
+}
+
+// The *_multi variants take the frame (log-)probabilities of many sequences,
+// packed into a single (n_samples, n_components) array, and an *offsets*
+// array of length n_sequences + 1 such that the k-th sequence spans the rows
+// offsets[k] to offsets[k + 1]; they process all sequences in a single call.
+
+std::tuple<py::array_t<double>, py::array_t<double>, py::array_t<double>>
+forward_scaling_multi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<double> frameprob_,
+  carray<ssize_t> offsets_)
+{
+  auto shape = check_shapes(startprob_, transmat_, frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto n_seqs = check_offsets(offsets_, ns);
+  auto log_probs_ = py::array_t<double>{{n_seqs}};
+  auto fwdlattice_ = py::array_t<double>{{ns, nc}};
+  auto scaling_ = py::array_t<double>{{ns}};
+  auto startprob = startprob_.data(), transmat = transmat_.data(),
+       frameprob = frameprob_.data();
+  auto offsets = offsets_.data();
+  auto log_probs = log_probs_.mutable_data(),
+       fwd = fwdlattice_.mutable_data(), scaling = scaling_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    for (auto k = 0; k < n_seqs; ++k) {
+      auto start = offsets[k], n = offsets[k + 1] - start;
+      log_probs[k] = forward_scaling_impl(
+        n, nc, startprob, transmat, dense_frames(frameprob + start * nc, nc),
+        tr, fwd + start * nc, scaling + start);
+    }
+  }
+  return {log_probs_, fwdlattice_, scaling_};
+}
+
+template<typename T>
+std::tuple<py::array_t<double>, py::array_t<T>> forward_log_multi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_frameprob_,
+  carray<ssize_t> offsets_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto n_seqs = check_offsets(offsets_, ns);
+  auto log_startprob_ = log_or(startprob_, log_startprob_in_);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto log_probs_ = py::array_t<double>{{n_seqs}};
+  auto fwdlattice_ = py::array_t<T>{{ns, nc}};
+  auto log_startprob = log_startprob_.data(),
+       log_transmat = log_transmat_.data(),
+       log_frameprob = log_frameprob_.data();
+  auto transmat = transmat_.data();
+  auto offsets = offsets_.data();
+  auto log_probs = log_probs_.mutable_data(),
+       fwd = fwdlattice_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    for (auto k = 0; k < n_seqs; ++k) {
+      auto start = offsets[k], n = offsets[k + 1] - start;
+      log_probs[k] = forward_log_impl(
+        n, nc, log_startprob, transmat, log_transmat,
+        dense_frames(log_frameprob + start * nc, nc), tr, fwd + start * nc);
+    }
+  }
+  return {log_probs_, fwdlattice_};
+}
+
+py::array_t<double> backward_scaling_multi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<double> frameprob_,
+  carray<double> scaling_,
+  carray<ssize_t> offsets_)
+{
+  auto shape = check_shapes(startprob_, transmat_, frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  if (scaling_.unchecked<1>().shape(0) != ns) {
     throw std::invalid_argument{"shape mismatch"};
   }
-  auto buf = std::vector<double>(nc);
+  auto n_seqs = check_offsets(offsets_, ns);
   auto bwdlattice_ = py::array_t<double>{{ns, nc}};
-  auto bwd = bwdlattice_.mutable_unchecked<2>();
-  auto nogil = py::gil_scoped_release{};
-  for (auto i = 0; i < nc; ++i) {
-    bwd(ns - 1, i) = 0;
+  auto transmat = transmat_.data(), frameprob = frameprob_.data(),
+       scaling = scaling_.data();
+  auto offsets = offsets_.data();
+  auto bwd = bwdlattice_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    for (auto k = 0; k < n_seqs; ++k) {
+      auto start = offsets[k], n = offsets[k + 1] - start;
+      backward_scaling_impl(
+        n, nc, transmat, frameprob + start * nc, scaling + start, tr,
+        bwd + start * nc);
+    }
   }
-  for (auto t = ns - 2; t >= 0; --t) {
+  return bwdlattice_;
+}
+
+template<typename T>
+py::array_t<T> backward_log_multi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_frameprob_,
+  carray<ssize_t> offsets_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto n_seqs = check_offsets(offsets_, ns);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto bwdlattice_ = py::array_t<T>{{ns, nc}};
+  auto log_transmat = log_transmat_.data(),
+       log_frameprob = log_frameprob_.data();
+  auto transmat = transmat_.data();
+  auto offsets = offsets_.data();
+  auto bwd = bwdlattice_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    for (auto k = 0; k < n_seqs; ++k) {
+      auto start = offsets[k], n = offsets[k + 1] - start;
+      backward_log_impl(
+        n, nc, transmat, log_transmat, log_frameprob + start * nc, tr,
+        bwd + start * nc);
+    }
+  }
+  return bwdlattice_;
+}
+
+// The forward_backward_*_multi functions run the fused forward-backward
+// algorithm on many sequences (delimited by *offsets*, as above), and return
+// the per-sequence log probabilities, the posteriors, and, if *compute_xi* is
+// true, the sum of the transition posteriors over all sequences (otherwise,
+// a zero array).
+
+std::tuple<py::array_t<double>, py::array_t<double>, py::array_t<double>>
+forward_backward_scaling_multi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<double> frameprob_,
+  carray<ssize_t> offsets_,
+  bool compute_xi)
+{
+  auto shape = check_shapes(startprob_, transmat_, frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto n_seqs = check_offsets(offsets_, ns);
+  auto log_probs_ = py::array_t<double>{{n_seqs}};
+  auto posteriors_ = py::array_t<double>{{ns, nc}};
+  auto xi_sum_ = py::array_t<double>{{nc, nc}};
+  auto startprob = startprob_.data(), transmat = transmat_.data(),
+       frameprob = frameprob_.data();
+  auto offsets = offsets_.data();
+  auto log_probs = log_probs_.mutable_data(),
+       post = posteriors_.mutable_data(), xi_sum = xi_sum_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    std::fill_n(xi_sum, nc * nc, 0);
+    auto scaling = std::vector<double>(ns);
+    auto bwd = std::vector<double>(2 * nc);
+    for (auto k = 0; k < n_seqs; ++k) {
+      auto start = offsets[k], n = offsets[k + 1] - start;
+      log_probs[k] = forward_backward_scaling_impl(
+        n, nc, startprob, transmat, dense_frames(frameprob + start * nc, nc),
+        tr, post + start * nc, scaling.data(), bwd.data(),
+        compute_xi ? xi_sum : nullptr);
+    }
+  }
+  return {log_probs_, posteriors_, xi_sum_};
+}
+
+template<typename T>
+std::tuple<py::array_t<double>, py::array_t<T>, py::array_t<double>>
+forward_backward_log_multi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_frameprob_,
+  carray<ssize_t> offsets_,
+  bool compute_xi,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto n_seqs = check_offsets(offsets_, ns);
+  auto log_startprob_ = log_or(startprob_, log_startprob_in_);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto log_probs_ = py::array_t<double>{{n_seqs}};
+  auto posteriors_ = py::array_t<T>{{ns, nc}};
+  auto xi_sum_ = py::array_t<double>{{nc, nc}};
+  auto log_startprob = log_startprob_.data(),
+       log_transmat = log_transmat_.data(),
+       log_frameprob = log_frameprob_.data();
+  auto transmat = transmat_.data();
+  auto offsets = offsets_.data();
+  auto log_probs = log_probs_.mutable_data(),
+       post = posteriors_.mutable_data(), xi_sum = xi_sum_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    std::fill_n(xi_sum, nc * nc, 0);
+    auto bwd = std::vector<double>(2 * nc);
+    auto seq_xi_sum = std::vector<double>(nc * nc);
+    for (auto k = 0; k < n_seqs; ++k) {
+      auto start = offsets[k], n = offsets[k + 1] - start;
+      log_probs[k] = forward_backward_log_impl(
+        n, nc, log_startprob, transmat, log_transmat,
+        dense_frames(log_frameprob + start * nc, nc), tr, post + start * nc,
+        bwd.data(), seq_xi_sum.data(), compute_xi ? xi_sum : nullptr);
+    }
+  }
+  return {log_probs_, posteriors_, xi_sum_};
+}
+
+// The fused categorical kernels run the forward-backward algorithm on
+// sequences of symbols (*symbols*, ns), reading the frame (log-)probabilities
+// of each sample from the row of its symbol in *emission* (the transposed
+// emission (log-)probabilities, nf * nc), and, if *counts* (nc * nf) is not
+// None, add the posteriors of each sequence to the counts of its symbols (as
+// add_categorical_counts) right after its backward sweep.
+
+// Return a pointer to the data of *counts_*, which must be None (in which
+// case a null pointer is returned) or a C-contiguous (nc, nf) float64 array,
+// as it is modified in place.
+double* optional_counts(py::object counts_, ssize_t nc, ssize_t nf)
+{
+  using counts_t = py::array_t<double, py::array::c_style>;
+  if (counts_.is_none()) {
+    return nullptr;
+  }
+  if (!py::isinstance<counts_t>(counts_)) {
+    throw std::invalid_argument{
+      "counts must be a C-contiguous float64 array"};
+  }
+  auto counts = counts_.cast<counts_t>();
+  if (counts.ndim() != 2 || counts.shape(0) != nc || counts.shape(1) != nf) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  return counts.mutable_data();
+}
+
+template<typename T>
+void add_counts(
+  ssize_t ns, ssize_t nc, ssize_t nf, ssize_t const* symbols, T const* post,
+  double* counts)
+{
+  for (auto t = 0; t < ns; ++t) {
+    auto x = symbols[t];
     for (auto i = 0; i < nc; ++i) {
-      for (auto j = 0; j < nc; ++j) {
-        buf[j] = log_transmat(i, j) + log_frameprob(t + 1, j) + bwd(t + 1, j);
+      counts[i * nf + x] += post[t * nc + i];
+    }
+  }
+}
+
+std::tuple<py::array_t<double>, py::array_t<double>, py::array_t<double>>
+forward_backward_categorical_scaling_multi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<double> emission_,
+  carray<ssize_t> symbols_,
+  carray<ssize_t> offsets_,
+  bool compute_xi,
+  py::object counts_)
+{
+  auto shape = check_shapes(startprob_, transmat_, emission_);
+  auto nf = shape.first, nc = shape.second, ns = symbols_.shape(0);
+  check_symbols(symbols_, ns, nf);
+  auto n_seqs = check_offsets(offsets_, ns);
+  auto counts = optional_counts(counts_, nc, nf);
+  auto log_probs_ = py::array_t<double>{{n_seqs}};
+  auto posteriors_ = py::array_t<double>{{ns, nc}};
+  auto xi_sum_ = py::array_t<double>{{nc, nc}};
+  auto startprob = startprob_.data(), transmat = transmat_.data(),
+       emission = emission_.data();
+  auto symbols = symbols_.data();
+  auto offsets = offsets_.data();
+  auto log_probs = log_probs_.mutable_data(),
+       post = posteriors_.mutable_data(), xi_sum = xi_sum_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    std::fill_n(xi_sum, nc * nc, 0);
+    auto scaling = std::vector<double>(ns);
+    auto bwd = std::vector<double>(2 * nc);
+    for (auto k = 0; k < n_seqs; ++k) {
+      auto start = offsets[k], n = offsets[k + 1] - start;
+      log_probs[k] = forward_backward_scaling_impl(
+        n, nc, startprob, transmat,
+        CategoricalFrames<double>{emission, symbols + start, nc}, tr,
+        post + start * nc, scaling.data(), bwd.data(),
+        compute_xi ? xi_sum : nullptr);
+      if (counts) {
+        add_counts(n, nc, nf, symbols + start, post + start * nc, counts);
       }
-      bwd(t, i) = logsumexp(buf.data(), nc);
     }
   }
-  return bwdlattice_;
+  return {log_probs_, posteriors_, xi_sum_};
+}
+
+template<typename T>
+std::tuple<py::array_t<double>, py::array_t<T>, py::array_t<double>>
+forward_backward_categorical_log_multi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_emission_,
+  carray<ssize_t> symbols_,
+  carray<ssize_t> offsets_,
+  bool compute_xi,
+  py::object counts_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_emission_);
+  auto nf = shape.first, nc = shape.second, ns = symbols_.shape(0);
+  check_symbols(symbols_, ns, nf);
+  auto n_seqs = check_offsets(offsets_, ns);
+  auto counts = optional_counts(counts_, nc, nf);
+  auto log_startprob_ = log_or(startprob_, log_startprob_in_);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto log_probs_ = py::array_t<double>{{n_seqs}};
+  auto posteriors_ = py::array_t<T>{{ns, nc}};
+  auto xi_sum_ = py::array_t<double>{{nc, nc}};
+  auto log_startprob = log_startprob_.data(),
+       log_transmat = log_transmat_.data();
+  auto transmat = transmat_.data();
+  auto log_emission = log_emission_.data();
+  auto symbols = symbols_.data();
+  auto offsets = offsets_.data();
+  auto log_probs = log_probs_.mutable_data(),
+       post = posteriors_.mutable_data(), xi_sum = xi_sum_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    std::fill_n(xi_sum, nc * nc, 0);
+    auto bwd = std::vector<double>(2 * nc);
+    auto seq_xi_sum = std::vector<double>(nc * nc);
+    for (auto k = 0; k < n_seqs; ++k) {
+      auto start = offsets[k], n = offsets[k + 1] - start;
+      log_probs[k] = forward_backward_log_impl(
+        n, nc, log_startprob, transmat, log_transmat,
+        CategoricalFrames<T>{log_emission, symbols + start, nc}, tr,
+        post + start * nc, bwd.data(), seq_xi_sum.data(),
+        compute_xi ? xi_sum : nullptr);
+      if (counts) {
+        add_counts(n, nc, nf, symbols + start, post + start * nc, counts);
+      }
+    }
+  }
+  return {log_probs_, posteriors_, xi_sum_};
+}
+
+// The *_segment functions run the forward pass, or the fused backward sweep,
+// on a segment of a single sequence, so that a long sequence can be processed
+// a segment at a time while only storing the forward probabilities at
+// segment boundaries.  Optional arguments may be None: *fwd_prev* for the
+// segment that starts the sequence, *next_frameprob* and *bwd_next* for the
+// segment that ends the sequence, and *xi_sum* if the transition posteriors
+// are not needed.
+
+// Return a pointer to the data of *obj*, which must be None (in which case
+// a null pointer is returned) or an array of *n* elements, which is stored in
+// *holder*.
+template<typename T>
+T const* optional_data(py::object obj, ssize_t n, carray<T>& holder)
+{
+  if (obj.is_none()) {
+    return nullptr;
+  }
+  holder = obj.cast<carray<T>>();
+  if (holder.size() != n) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  return holder.data();
+}
+
+std::tuple<double, py::array_t<double>, py::array_t<double>>
+forward_scaling_segment(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<double> frameprob_,
+  py::object fwd_prev_,
+  double log_prob)
+{
+  auto shape = check_shapes(startprob_, transmat_, frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto prev_holder = carray<double>{};
+  auto prev = optional_data(fwd_prev_, nc, prev_holder);
+  auto fwdlattice_ = py::array_t<double>{{ns, nc}};
+  auto scaling_ = py::array_t<double>{{ns}};
+  auto startprob = startprob_.data(), transmat = transmat_.data(),
+       frameprob = frameprob_.data();
+  auto fwd = fwdlattice_.mutable_data(), scaling = scaling_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    log_prob = forward_scaling_impl(
+      ns, nc, startprob, transmat, dense_frames(frameprob, nc), tr, fwd,
+      scaling, prev, log_prob);
+  }
+  return {log_prob, fwdlattice_, scaling_};
+}
+
+template<typename T>
+std::tuple<double, py::array_t<T>> forward_log_segment(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_frameprob_,
+  py::object fwd_prev_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto prev_holder = carray<T>{};
+  auto prev = optional_data(fwd_prev_, nc, prev_holder);
+  auto log_startprob_ = log_or(startprob_, log_startprob_in_);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto fwdlattice_ = py::array_t<T>{{ns, nc}};
+  auto log_startprob = log_startprob_.data(),
+       log_transmat = log_transmat_.data(),
+       log_frameprob = log_frameprob_.data();
+  auto transmat = transmat_.data();
+  auto fwd = fwdlattice_.mutable_data();
+  auto log_prob = 0.;
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    log_prob = forward_log_impl(
+      ns, nc, log_startprob, transmat, log_transmat,
+      dense_frames(log_frameprob, nc), tr, fwd, prev);
+  }
+  return {log_prob, fwdlattice_};
+}
+
+std::tuple<py::array_t<double>, py::array_t<double>, py::object>
+backward_scaling_segment(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<double> frameprob_,
+  carray<double> fwdlattice_,
+  carray<double> scaling_,
+  py::object next_frameprob_,
+  py::object bwd_next_,
+  py::object xi_sum_)
+{
+  auto shape = check_shapes(startprob_, transmat_, frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  if (fwdlattice_.size() != ns * nc || scaling_.size() != ns
+      || next_frameprob_.is_none() != bwd_next_.is_none()) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  auto next_frameprob_holder = carray<double>{},
+       bwd_next_holder = carray<double>{},
+       xi_sum_holder = carray<double>{};
+  auto next_frameprob = optional_data(
+    next_frameprob_, nc, next_frameprob_holder);
+  auto bwd_next = optional_data(bwd_next_, nc, bwd_next_holder);
+  auto xi_sum_in = optional_data(xi_sum_, nc * nc, xi_sum_holder);
+  auto posteriors_ = py::array_t<double>{{ns, nc}};
+  auto bwd_first_ = py::array_t<double>{{nc}};
+  auto xi_sum_out_ = py::array_t<double>{{nc, nc}};
+  auto transmat = transmat_.data(), frameprob = frameprob_.data(),
+       fwd = fwdlattice_.data(), scaling = scaling_.data();
+  auto post = posteriors_.mutable_data(),
+       bwd_first = bwd_first_.mutable_data(),
+       xi_sum = xi_sum_in ? xi_sum_out_.mutable_data() : nullptr;
+  {
+    py::gil_scoped_release nogil;
+    std::copy_n(fwd, ns * nc, post);
+    auto bwd = std::vector<double>(2 * nc);
+    if (bwd_next) {
+      std::copy_n(bwd_next, nc, bwd.data());
+    }
+    if (xi_sum) {
+      std::copy_n(xi_sum_in, nc * nc, xi_sum);
+    }
+    backward_sweep_scaling_impl(
+      ns, nc, transmat, dense_frames(frameprob, nc), scaling, next_frameprob,
+      Transitions{transmat, nc}, post, bwd.data(), xi_sum);
+    std::copy_n(bwd.data(), nc, bwd_first);
+  }
+  return {posteriors_, bwd_first_,
+          xi_sum ? py::object{xi_sum_out_} : py::none{}};
+}
+
+template<typename T>
+std::tuple<py::array_t<T>, py::array_t<double>, py::object>
+backward_log_segment(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_frameprob_,
+  carray<T> fwdlattice_,
+  double log_prob,
+  py::object next_log_frameprob_,
+  py::object bwd_next_,
+  py::object xi_sum_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  if (fwdlattice_.size() != ns * nc
+      || next_log_frameprob_.is_none() != bwd_next_.is_none()) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  auto next_log_frameprob_holder = carray<T>{};
+  auto bwd_next_holder = carray<double>{},
+       xi_sum_holder = carray<double>{};
+  auto next_log_frameprob = optional_data(
+    next_log_frameprob_, nc, next_log_frameprob_holder);
+  auto bwd_next = optional_data(bwd_next_, nc, bwd_next_holder);
+  auto xi_sum_in = optional_data(xi_sum_, nc * nc, xi_sum_holder);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto posteriors_ = py::array_t<T>{{ns, nc}};
+  auto bwd_first_ = py::array_t<double>{{nc}};
+  auto xi_sum_out_ = py::array_t<double>{{nc, nc}};
+  auto transmat = transmat_.data(), log_transmat = log_transmat_.data(),
+       log_frameprob = log_frameprob_.data(), fwd = fwdlattice_.data();
+  auto post = posteriors_.mutable_data(),
+       bwd_first = bwd_first_.mutable_data(),
+       xi_sum = xi_sum_in ? xi_sum_out_.mutable_data() : nullptr;
+  {
+    py::gil_scoped_release nogil;
+    std::copy_n(fwd, ns * nc, post);
+    auto bwd = std::vector<double>(2 * nc);
+    if (bwd_next) {
+      std::copy_n(bwd_next, nc, bwd.data());
+    }
+    if (xi_sum) {
+      std::copy_n(xi_sum_in, nc * nc, xi_sum);
+    }
+    backward_sweep_log_impl(
+      ns, nc, transmat, log_transmat, dense_frames(log_frameprob, nc),
+      log_prob, next_log_frameprob, Transitions{transmat, nc}, post,
+      bwd.data(), xi_sum);
+    std::copy_n(bwd.data(), nc, bwd_first);
+  }
+  return {posteriors_, bwd_first_,
+          xi_sum ? py::object{xi_sum_out_} : py::none{}};
 }
 
 py::array_t<double> compute_scaling_xi_sum(
   py::array_t<double> fwdlattice_,
-  py::array_t<double> transmat_,
+  carray<double> transmat_,
   py::array_t<double> bwdlattice_,
   py::array_t<double> frameprob_)
 {
@@ -219,28 +1418,30 @@ py::array_t<double> compute_scaling_xi_sum(
   auto xi_sum_ = py::array_t<double>{{nc, nc}};
   auto xi_sum = xi_sum_.mutable_unchecked<2>();
   std::fill_n(xi_sum.mutable_data(0, 0), xi_sum.size(), 0);
-  auto nogil = py::gil_scoped_release{};
+  py::gil_scoped_release nogil;
+  auto tr = Transitions{transmat_.data(), nc};
   for (auto t = 0; t < ns - 1; ++t) {
-    for (auto i = 0; i < nc; ++i) {
-      for (auto j = 0; j < nc; ++j) {
+    parallel_for(tr.parallel(), nc, [&](ssize_t i) {
+      tr.for_successors(i, [&](ssize_t j) {
         xi_sum(i, j) += fwd(t, i)
                         * transmat(i, j)
                         * frameprob(t + 1, j)
                         * bwd(t + 1, j);
-      }
-    }
+      });
+    });
   }
   return xi_sum_;
 }
 
 py::array_t<double> compute_log_xi_sum(
   py::array_t<double> fwdlattice_,
-  py::array_t<double> transmat_,
+  carray<double> transmat_,
   py::array_t<double> bwdlattice_,
-  py::array_t<double> log_frameprob_)
+  py::array_t<double> log_frameprob_,
+  py::object log_transmat_in_)
 {
   auto fwd = fwdlattice_.unchecked<2>();
-  auto log_transmat_ = log(transmat_);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
   auto log_transmat = log_transmat_.unchecked<2>();
   auto bwd = bwdlattice_.unchecked<2>();
   auto log_frameprob = log_frameprob_.unchecked<2>();
@@ -255,75 +1456,510 @@ py::array_t<double> compute_log_xi_sum(
   auto log_xi_sum = log_xi_sum_.mutable_unchecked<2>();
   std::fill_n(log_xi_sum.mutable_data(0, 0), log_xi_sum.size(),
               -std::numeric_limits<double>::infinity());
-  auto nogil = py::gil_scoped_release{};
+  py::gil_scoped_release nogil;
+  auto tr = Transitions{transmat_.data(), nc};
   for (auto t = 0; t < ns - 1; ++t) {
-    for (auto i = 0; i < nc; ++i) {
-      for (auto j = 0; j < nc; ++j) {
+    parallel_for(tr.parallel(), nc, [&](ssize_t i) {
+      tr.for_successors(i, [&](ssize_t j) {
         auto log_xi = fwd(t, i)
                       + log_transmat(i, j)
                       + log_frameprob(t + 1, j)
                       + bwd(t + 1, j)
                       - log_prob;
         log_xi_sum(i, j) = logaddexp(log_xi_sum(i, j), log_xi);
-      }
-    }
+      });
+    });
   }
   return log_xi_sum_;
 }
 
-std::tuple<double, py::array_t<ssize_t>> viterbi(
-  py::array_t<double> startprob_,
-  py::array_t<double> transmat_,
-  py::array_t<double> log_frameprob_)
+// Decode a sequence of *ns* samples into *state_sequence*, using *lattice*
+// (ns * nc) as scratch space for the Viterbi lattice, and return the log
+// probability of the decoded state sequence.
+template<typename T>
+double viterbi_impl(
+  ssize_t ns, ssize_t nc,
+  double const* log_startprob, double const* log_transmat,
+  T const* log_frameprob, Transitions const& tr, double* lattice,
+  ssize_t* state_sequence)
 {
-  auto log_startprob_ = log(startprob_);
-  auto log_startprob = log_startprob_.unchecked<1>();
-  auto log_transmat_ = log(transmat_);
-  auto log_transmat = log_transmat_.unchecked<2>();
-  auto log_frameprob = log_frameprob_.unchecked<2>();
-  auto ns = log_frameprob.shape(0), nc = log_frameprob.shape(1);
-  if (log_startprob.shape(0) != nc
-      || log_transmat.shape(0) != nc || log_transmat.shape(1) != nc) {
-    throw std::invalid_argument{"shape mismatch"};
-  }
-  auto state_sequence_ = py::array_t<ssize_t>{{ns}};
-  auto viterbi_lattice_ = py::array_t<double>{{ns, nc}};
-  auto state_sequence = state_sequence_.mutable_unchecked<1>();
-  auto viterbi_lattice = viterbi_lattice_.mutable_unchecked<2>();
-  auto nogil = py::gil_scoped_release{};
   for (auto i = 0; i < nc; ++i) {
-    viterbi_lattice(0, i) = log_startprob(i) + log_frameprob(0, i);
+    lattice[i] = log_startprob[i] + log_frameprob[i];
   }
   for (auto t = 1; t < ns; ++t) {
-    for (auto i = 0; i < nc; ++i) {
+    auto last = lattice + (t - 1) * nc, cur = lattice + t * nc;
+    parallel_for(tr.parallel(), nc, [&](ssize_t i) {
       auto max = -std::numeric_limits<double>::infinity();
-      for (auto j = 0; j < nc; ++j) {
-        max = std::max(max, viterbi_lattice(t - 1, j) + log_transmat(j, i));
-      }
-      viterbi_lattice(t, i) = max + log_frameprob(t, i);
-    }
+      tr.for_predecessors(i, [&](ssize_t j) {
+        max = std::max(max, last[j] + log_transmat[j * nc + i]);
+      });
+      cur[i] = max + log_frameprob[t * nc + i];
+    });
   }
-  auto row = &viterbi_lattice(ns - 1, 0);
-  auto prev = state_sequence(ns - 1) = std::max_element(row, row + nc) - row;
+  auto row = lattice + (ns - 1) * nc;
+  auto prev = state_sequence[ns - 1] = std::max_element(row, row + nc) - row;
   auto log_prob = row[prev];
   for (auto t = ns - 2; t >= 0; --t) {
     auto max = std::make_pair(-std::numeric_limits<double>::infinity(), 0);
+    auto cur = lattice + t * nc;
+    tr.for_predecessors(prev, [&](ssize_t i) {
+      max = std::max(max, {cur[i] + log_transmat[i * nc + prev], i});
+    });
+    state_sequence[t] = prev = max.second;
+  }
+  return log_prob;
+}
+
+template<typename T>
+std::tuple<double, py::array_t<ssize_t>> viterbi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_frameprob_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto log_startprob_ = log_or(startprob_, log_startprob_in_);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto state_sequence_ = py::array_t<ssize_t>{{ns}};
+  auto log_startprob = log_startprob_.data(),
+       log_transmat = log_transmat_.data(), transmat = transmat_.data();
+  auto log_frameprob = log_frameprob_.data();
+  auto state_sequence = state_sequence_.mutable_data();
+  auto log_prob = 0.;
+  {
+    py::gil_scoped_release nogil;
+    auto lattice = std::vector<double>(ns * nc);
+    log_prob = viterbi_impl(
+      ns, nc, log_startprob, log_transmat, log_frameprob,
+      Transitions{transmat, nc}, lattice.data(), state_sequence);
+  }
+  return {log_prob, state_sequence_};
+}
+
+// Decode many sequences (delimited by *offsets*, as for the *_multi
+// functions above), and return the per-sequence log probabilities of the
+// decoded state sequences and their concatenation.
+template<typename T>
+std::tuple<py::array_t<double>, py::array_t<ssize_t>> viterbi_multi(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<T> log_frameprob_,
+  carray<ssize_t> offsets_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto n_seqs = check_offsets(offsets_, ns);
+  auto log_startprob_ = log_or(startprob_, log_startprob_in_);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto log_probs_ = py::array_t<double>{{n_seqs}};
+  auto state_sequence_ = py::array_t<ssize_t>{{ns}};
+  auto log_startprob = log_startprob_.data(),
+       log_transmat = log_transmat_.data(), transmat = transmat_.data();
+  auto log_frameprob = log_frameprob_.data();
+  auto offsets = offsets_.data();
+  auto log_probs = log_probs_.mutable_data();
+  auto state_sequence = state_sequence_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    auto lattice = std::vector<double>{};
+    for (auto k = 0; k < n_seqs; ++k) {
+      auto start = offsets[k], n = offsets[k + 1] - start;
+      lattice.resize(n * nc);
+      log_probs[k] = viterbi_impl(
+        n, nc, log_startprob, log_transmat, log_frameprob + start * nc, tr,
+        lattice.data(), state_sequence + start);
+    }
+  }
+  return {log_probs_, state_sequence_};
+}
+
+// Run the Viterbi recursion on a chunk of a sequence.  If *viterbi_prev* is
+// not None, the chunk continues a sequence whose last row of the Viterbi
+// lattice is *viterbi_prev*.  Return the last row of the Viterbi lattice for
+// the chunk, and the backpointers: backpointers[t, j] is the best state at
+// the sample preceding t for a path ending in state j at t (or -1 for the
+// first sample of the sequence).  Ties are broken as in the traceback of
+// `viterbi`.
+std::tuple<py::array_t<double>, py::array_t<ssize_t>> viterbi_segment(
+  carray<double> startprob_,
+  carray<double> transmat_,
+  carray<double> log_frameprob_,
+  py::object viterbi_prev_,
+  py::object log_startprob_in_,
+  py::object log_transmat_in_)
+{
+  auto shape = check_shapes(startprob_, transmat_, log_frameprob_);
+  auto ns = shape.first, nc = shape.second;
+  auto prev_holder = carray<double>{};
+  auto prev = optional_data(viterbi_prev_, nc, prev_holder);
+  if (!ns && !prev) {
+    throw std::invalid_argument{"empty sequence"};
+  }
+  auto log_startprob_ = log_or(startprob_, log_startprob_in_);
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto viterbi_last_ = py::array_t<double>{{nc}};
+  auto backpointers_ = py::array_t<ssize_t>{{ns, nc}};
+  auto transmat = transmat_.data(),
+       log_startprob = log_startprob_.data(),
+       log_transmat = log_transmat_.data(),
+       log_frameprob = log_frameprob_.data();
+  auto viterbi_last = viterbi_last_.mutable_data();
+  auto backpointers = backpointers_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{transmat, nc};
+    auto buf = std::vector<double>(2 * nc);
+    auto last = buf.data(), cur = buf.data() + nc;
+    if (prev) {
+      std::copy_n(prev, nc, last);
+    }
+    for (ssize_t t = 0; t < ns; ++t) {
+      if (t == 0 && !prev) {
+        for (auto i = 0; i < nc; ++i) {
+          cur[i] = log_startprob[i] + log_frameprob[i];
+          backpointers[i] = -1;
+        }
+      } else {
+        parallel_for(tr.parallel(), nc, [&](ssize_t j) {
+          auto max = std::make_pair(
+            -std::numeric_limits<double>::infinity(), 0);
+          tr.for_predecessors(j, [&](ssize_t i) {
+            max = std::max(max, {last[i] + log_transmat[i * nc + j], i});
+          });
+          cur[j] = max.first + log_frameprob[t * nc + j];
+          backpointers[t * nc + j] = max.second;
+        });
+      }
+      std::swap(last, cur);
+    }
+    std::copy_n(last, nc, viterbi_last);
+  }
+  return {viterbi_last_, backpointers_};
+}
+
+// The window of the fixed-lag smoother: *n_ring* pending samples held in
+// ring buffers of *ring_.shape[0]* rows (the first of them at row *head*,
+// wrapping around), followed by the samples of a chunk, stored contiguously.
+// row(t) returns the data of the t-th sample of the window.
+class FixedLagWindow {
+  double const* ring_;
+  double const* chunk_;
+  ssize_t cap_, head_, n_ring_, nc_;
+
+public:
+  FixedLagWindow(
+    carray<double> const& ring, ssize_t head, ssize_t n_ring,
+    carray<double> const& chunk, ssize_t nc)
+    : ring_{ring.data()}, chunk_{chunk.data()}, cap_{ring.shape(0)},
+      head_{head}, n_ring_{n_ring}, nc_{nc}
+  {
+    if (ring.ndim() != 2 || ring.shape(1) != nc
+        || chunk.ndim() != 2 || chunk.shape(1) != nc) {
+      throw std::invalid_argument{"shape mismatch"};
+    }
+    if (n_ring < 0 || n_ring > cap_ || (cap_ && (head < 0 || head >= cap_))) {
+      throw std::invalid_argument{"invalid ring buffer position"};
+    }
+  }
+
+  double const* row(ssize_t t) const
+  {
+    return t < n_ring_ ? ring_ + (head_ + t) % cap_ * nc_
+                       : chunk_ + (t - n_ring_) * nc_;
+  }
+};
+
+// Fixed-lag smoothing over a window (see FixedLagWindow) of *ns* samples,
+// with normalized forward probabilities *fwd* and (rescaled) frame
+// probabilities *frameprob*.  Return the posteriors of the first *n_out*
+// samples of the window, the k-th one being conditioned on the samples up to
+// min(k + lag, ns - 1).
+py::array_t<double> fixed_lag_smoothing_scaling(
+  carray<double> transmat_,
+  carray<double> ring_frameprob_,
+  carray<double> ring_fwdlattice_,
+  ssize_t head,
+  ssize_t n_ring,
+  carray<double> frameprob_,
+  carray<double> fwdlattice_,
+  ssize_t lag,
+  ssize_t n_out)
+{
+  auto transmat = transmat_.unchecked<2>();
+  auto nc = transmat.shape(0);
+  auto frameprob = FixedLagWindow{
+    ring_frameprob_, head, n_ring, frameprob_, nc};
+  auto fwd = FixedLagWindow{ring_fwdlattice_, head, n_ring, fwdlattice_, nc};
+  auto ns = n_ring + frameprob_.shape(0);
+  if (transmat.shape(1) != nc
+      || ring_fwdlattice_.shape(0) != ring_frameprob_.shape(0)
+      || fwdlattice_.shape(0) != frameprob_.shape(0)) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  if (lag < 0 || n_out < 0 || n_out > ns) {
+    throw std::invalid_argument{"invalid lag or number of outputs"};
+  }
+  auto posteriors_ = py::array_t<double>{{n_out, nc}};
+  auto tm = transmat_.data();
+  auto post = posteriors_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{tm, nc};
+    auto buf = std::vector<double>(2 * nc);
+    for (ssize_t k = 0; k < n_out; ++k) {
+      auto next = buf.data(), cur = buf.data() + nc;
+      std::fill_n(next, nc, 1);
+      for (auto t = std::min(k + lag, ns - 1); t > k; --t) {
+        auto fp = frameprob.row(t);
+        parallel_for(tr.parallel(), nc, [&](ssize_t i) {
+          cur[i] = 0;
+          tr.for_successors(i, [&](ssize_t j) {
+            cur[i] += tm[i * nc + j] * fp[j] * next[j];
+          });
+        });
+        auto sum = std::accumulate(cur, cur + nc, 0.);
+        for (auto i = 0; sum > 0 && i < nc; ++i) {
+          cur[i] /= sum;
+        }
+        std::swap(next, cur);
+      }
+      auto row = post + k * nc;
+      std::copy_n(fwd.row(k), nc, row);
+      normalize_posteriors_scaling(nc, row, next);
+    }
+  }
+  return posteriors_;
+}
+
+// Likewise, in log space: *fwd* and *frameprob* hold forward and frame log
+// probabilities.
+py::array_t<double> fixed_lag_smoothing_log(
+  carray<double> transmat_,
+  carray<double> ring_log_frameprob_,
+  carray<double> ring_fwdlattice_,
+  ssize_t head,
+  ssize_t n_ring,
+  carray<double> log_frameprob_,
+  carray<double> fwdlattice_,
+  ssize_t lag,
+  ssize_t n_out,
+  py::object log_transmat_in_)
+{
+  auto transmat = transmat_.unchecked<2>();
+  auto nc = transmat.shape(0);
+  auto log_frameprob = FixedLagWindow{
+    ring_log_frameprob_, head, n_ring, log_frameprob_, nc};
+  auto fwd = FixedLagWindow{ring_fwdlattice_, head, n_ring, fwdlattice_, nc};
+  auto ns = n_ring + log_frameprob_.shape(0);
+  if (transmat.shape(1) != nc
+      || ring_fwdlattice_.shape(0) != ring_log_frameprob_.shape(0)
+      || fwdlattice_.shape(0) != log_frameprob_.shape(0)) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  if (lag < 0 || n_out < 0 || n_out > ns) {
+    throw std::invalid_argument{"invalid lag or number of outputs"};
+  }
+  auto log_transmat_ = log_or(transmat_, log_transmat_in_);
+  auto posteriors_ = py::array_t<double>{{n_out, nc}};
+  auto tm = transmat_.data(), log_tm = log_transmat_.data();
+  auto post = posteriors_.mutable_data();
+  {
+    py::gil_scoped_release nogil;
+    auto tr = Transitions{tm, nc};
+    auto buf = std::vector<double>(2 * nc),
+         weighted = std::vector<double>(nc),
+         shifted = std::vector<double>(nc);
+    for (ssize_t k = 0; k < n_out; ++k) {
+      auto next = buf.data(), cur = buf.data() + nc;
+      std::fill_n(next, nc, 0);
+      for (auto t = std::min(k + lag, ns - 1); t > k; --t) {
+        auto lfp = log_frameprob.row(t);
+        for (auto j = 0; j < nc; ++j) {
+          weighted[j] = lfp[j] + next[j];
+        }
+        auto max = shift_exp(nc, weighted.data(), shifted.data());
+        backward_log_step(
+          nc, tm, log_tm, tr, weighted.data(), shifted.data(), max, cur);
+        std::swap(next, cur);
+      }
+      auto row = post + k * nc;
+      std::copy_n(fwd.row(k), nc, row);
+      normalize_posteriors_log(nc, row, next);
+    }
+  }
+  return posteriors_;
+}
+
+// Sample the state sequences of *uniforms.shape[0]* Markov chains of
+// *uniforms.shape[1]* steps, given the cumulative distributions of the first
+// state (*startprob_cdf*) and of the transitions (*transmat_cdf*, row-wise),
+// and one uniform draw in [0, 1) per step.  Each draw selects the first state
+// whose cumulative probability exceeds it (or, if rounding makes the total
+// probability smaller than the draw, the last state of nonzero probability).
+py::array_t<ssize_t> sample_states(
+  carray<double> startprob_cdf_,
+  carray<double> transmat_cdf_,
+  carray<double> uniforms_)
+{
+  auto startprob_cdf = startprob_cdf_.unchecked<1>();
+  auto transmat_cdf = transmat_cdf_.unchecked<2>();
+  auto uniforms = uniforms_.unchecked<2>();
+  auto nc = startprob_cdf.shape(0);
+  auto n_seqs = uniforms.shape(0), ns = uniforms.shape(1);
+  if (transmat_cdf.shape(0) != nc || transmat_cdf.shape(1) != nc) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  auto state_sequences_ = py::array_t<ssize_t>{{n_seqs, ns}};
+  auto state_sequences = state_sequences_.mutable_data();
+  auto cdf0 = startprob_cdf_.data(), cdf = transmat_cdf_.data(),
+       u = uniforms_.data();
+  {
+    py::gil_scoped_release nogil;
+    auto draw = [](double const* row, ssize_t nc, double u) -> ssize_t {
+      auto last = std::lower_bound(row, row + nc, row[nc - 1]);
+      return std::min(std::upper_bound(row, row + nc, u), last) - row;
+    };
+    for (auto k = 0; k < n_seqs * ns; ++k) {
+      state_sequences[k] =
+        k % ns == 0 ? draw(cdf0, nc, u[k])
+        : draw(cdf + state_sequences[k - 1] * nc, nc, u[k]);
+    }
+  }
+  return state_sequences_;
+}
+
+// Add the posteriors of each sample (*posteriors*, ns * nc) to the counts of
+// its symbol (*symbols*, ns) in each state, i.e. the expected emission counts
+// of a categorical model, to *counts* (nc * nf, modified in place).  Unlike a
+// bincount, this only touches the entries of the observed symbols.
+void add_categorical_counts(
+  py::array_t<double, py::array::c_style> counts_,
+  carray<ssize_t> symbols_,
+  carray<double> posteriors_)
+{
+  auto counts = counts_.mutable_unchecked<2>();
+  auto symbols = symbols_.unchecked<1>();
+  auto posteriors = posteriors_.unchecked<2>();
+  auto nc = counts.shape(0), nf = counts.shape(1), ns = symbols.shape(0);
+  if (posteriors.shape(0) != ns || posteriors.shape(1) != nc) {
+    throw std::invalid_argument{"shape mismatch"};
+  }
+  check_symbols(symbols_, ns, nf);
+  py::gil_scoped_release nogil;
+  for (auto t = 0; t < ns; ++t) {
+    auto x = symbols(t);
     for (auto i = 0; i < nc; ++i) {
-      max = std::max(max, {viterbi_lattice(t, i) + log_transmat(i, prev), i});
+      counts(i, x) += posteriors(t, i);
     }
-    state_sequence(t) = prev = max.second;
   }
-  return {log_prob, state_sequence_};
+}
+
+// The log space kernels optionally take the logs of the start and transition
+// probabilities, as precomputed (e.g. once per EM iteration) by the caller.
+//
+// Register the log space kernels for frame log probabilities of type T.
+// Overloads are tried in registration order, first without conversions,
+// so the float overloads are only selected if the frame log probabilities
+// are already a C-contiguous float32 array (and the model parameters are
+// C-contiguous float64 arrays); otherwise, the arguments are converted to
+// the double overloads.
+template<typename T>
+void def_log_kernels(py::module_& m)
+{
+  using namespace pybind11::literals;
+  m
+    .def("forward_log", forward_log<T>, "startprob"_a, "transmat"_a,
+         "log_frameprob"_a, "log_startprob"_a = py::none(),
+         "log_transmat"_a = py::none())
+    .def("backward_log", backward_log<T>, "startprob"_a, "transmat"_a,
+         "log_frameprob"_a, "log_startprob"_a = py::none(),
+         "log_transmat"_a = py::none())
+    .def("forward_log_multi", forward_log_multi<T>, "startprob"_a,
+         "transmat"_a, "log_frameprob"_a, "offsets"_a,
+         "log_startprob"_a = py::none(), "log_transmat"_a = py::none())
+    .def("backward_log_multi", backward_log_multi<T>, "startprob"_a,
+         "transmat"_a, "log_frameprob"_a, "offsets"_a,
+         "log_startprob"_a = py::none(), "log_transmat"_a = py::none())
+    .def("forward_backward_log_multi", forward_backward_log_multi<T>,
+         "startprob"_a, "transmat"_a, "log_frameprob"_a, "offsets"_a,
+         "compute_xi"_a, "log_startprob"_a = py::none(),
+         "log_transmat"_a = py::none())
+    .def("forward_backward_categorical_log_multi",
+         forward_backward_categorical_log_multi<T>, "startprob"_a,
+         "transmat"_a, "log_emission"_a, "symbols"_a, "offsets"_a,
+         "compute_xi"_a, "counts"_a = py::none(),
+         "log_startprob"_a = py::none(), "log_transmat"_a = py::none())
+    .def("forward_log_segment", forward_log_segment<T>, "startprob"_a,
+         "transmat"_a, "log_frameprob"_a, "fwd_prev"_a,
+         "log_startprob"_a = py::none(), "log_transmat"_a = py::none())
+    .def("backward_log_segment", backward_log_segment<T>, "startprob"_a,
+         "transmat"_a, "log_frameprob"_a, "fwdlattice"_a, "log_prob"_a,
+         "next_log_frameprob"_a, "bwd_next"_a, "xi_sum"_a,
+         "log_startprob"_a = py::none(), "log_transmat"_a = py::none())
+    .def("viterbi", viterbi<T>, "startprob"_a, "transmat"_a,
+         "log_frameprob"_a, "log_startprob"_a = py::none(),
+         "log_transmat"_a = py::none())
+    .def("viterbi_multi", viterbi_multi<T>, "startprob"_a, "transmat"_a,
+         "log_frameprob"_a, "offsets"_a, "log_startprob"_a = py::none(),
+         "log_transmat"_a = py::none())
+    ;
+}
+
+// Return the number of OpenMP threads available to the calling thread.
+int get_num_threads()
+{
+#ifdef _OPENMP
+  return omp_get_max_threads();
+#else
+  return 1;
+#endif
+}
+
+// Set the number of OpenMP threads available to the calling thread (only).
+void set_num_threads(int n_threads)
+{
+#ifdef _OPENMP
+  omp_set_num_threads(std::max(n_threads, 1));
+#endif
 }
 
 PYBIND11_MODULE(_hmmc, m) {
+  using namespace pybind11::literals;
   m
     .def("forward_scaling", forward_scaling)
-    .def("forward_log", forward_log)
     .def("backward_scaling", backward_scaling)
-    .def("backward_log", backward_log)
+    .def("forward_scaling_multi", forward_scaling_multi)
+    .def("backward_scaling_multi", backward_scaling_multi)
+    .def("forward_backward_scaling_multi", forward_backward_scaling_multi)
+    .def("forward_backward_categorical_scaling_multi",
+         forward_backward_categorical_scaling_multi, "startprob"_a,
+         "transmat"_a, "emission"_a, "symbols"_a, "offsets"_a,
+         "compute_xi"_a, "counts"_a = py::none())
+    .def("forward_scaling_segment", forward_scaling_segment)
+    .def("backward_scaling_segment", backward_scaling_segment)
     .def("compute_scaling_xi_sum", compute_scaling_xi_sum)
-    .def("compute_log_xi_sum", compute_log_xi_sum)
-    .def("viterbi", viterbi)
+    .def("compute_log_xi_sum", compute_log_xi_sum, "fwdlattice"_a,
+         "transmat"_a, "bwdlattice"_a, "log_frameprob"_a,
+         "log_transmat"_a = py::none())
+    .def("viterbi_segment", viterbi_segment, "startprob"_a, "transmat"_a,
+         "log_frameprob"_a, "viterbi_prev"_a, "log_startprob"_a = py::none(),
+         "log_transmat"_a = py::none())
+    .def("fixed_lag_smoothing_scaling", fixed_lag_smoothing_scaling)
+    .def("fixed_lag_smoothing_log", fixed_lag_smoothing_log, "transmat"_a,
+         "ring_log_frameprob"_a, "ring_fwdlattice"_a, "head"_a, "n_ring"_a,
+         "log_frameprob"_a, "fwdlattice"_a, "lag"_a, "n_out"_a,
+         "log_transmat"_a = py::none())
+    .def("sample_states", sample_states)
+    .def("add_categorical_counts", add_categorical_counts,
+         "counts"_a.noconvert(), "symbols"_a, "posteriors"_a)
+    .def("get_num_threads", get_num_threads)
+    .def("set_num_threads", set_num_threads)
     ;
+  def_log_kernels<double>(m);
+  def_log_kernels<float>(m);
 }